@@ -0,0 +1,311 @@
+"""
+パイプラインのベンチマーク
+
+データ生成・ファイル書き出し・GCSアップロード・BigQueryロードの各ステージを個別に計測し、
+結果をJSONで保存する。アップロードとロードはプロセス内で起動したstub_server（GCSのJSON APIと
+BigQueryのロードジョブAPIのスタブ）に対してHTTPで実行するため、GCPの認証情報は不要。
+
+使い方:
+    python benchmark.py --scale 100000 --output results/benchmark.json
+    python benchmark.py --scale 100000 --baseline results/benchmark.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def start_stub_server(upload_latency=0.0, load_latency=0.0):
+    """
+    stub_server（GCS・BigQueryのスタブ）を空いているポートでバックグラウンドのスレッドに起動する
+
+    Returns:
+        ThreadingHTTPServer: 起動したサーバー（終了時にshutdown()・server_close()を呼ぶ）
+    """
+    from stub_server import create_server
+
+    server = create_server(port=0, job_latency=load_latency, upload_latency=upload_latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_benchmark(scale, output_format, server, repeat=1, poll_interval=0.01, verbose=False, compression='none'):
+    """
+    各ステージをrepeat回計測し、結果をdictで返す
+
+    config（と各モジュールの `from config import *`）は最初のimport時に環境変数を読むため、
+    呼び出し前にstart_stub_server()で起動したサーバーのアドレスと件数・出力先を
+    _configure_environment()で設定しておくこと。
+    """
+    state = server.RequestHandlerClass.state
+    runs = []
+    for iteration in range(repeat):
+        output = None if verbose else io.StringIO()
+        with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+            runs.append(_run_stages(output_format, compression, state, poll_interval))
+        print(f"Run {iteration + 1}/{repeat}: " + ", ".join(
+            f"{stage} {result['seconds']:.2f}s" for stage, result in runs[-1].items()))
+
+    from config import NUM_USERS, NUM_PRODUCTS, NUM_ORDERS, NUM_ACCESS_LOGS, GENERATOR_ENGINE, \
+        RANDOM_SEED, UPLOAD_MAX_WORKERS, LOAD_MAX_CONCURRENT_JOBS, COMPACT_DTYPES
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {
+            'scale': scale,
+            'rows': {
+                'users': NUM_USERS,
+                'products': NUM_PRODUCTS,
+                'orders': NUM_ORDERS,
+                'access_logs': NUM_ACCESS_LOGS
+            },
+            'output_format': output_format,
+            'compression': compression,
+            'generator_engine': GENERATOR_ENGINE,
+            'compact_dtypes': COMPACT_DTYPES,
+            'random_seed': RANDOM_SEED,
+            'repeat': repeat,
+            'upload_max_workers': UPLOAD_MAX_WORKERS,
+            'upload_latency': state.upload_latency,
+            'load_max_concurrent_jobs': LOAD_MAX_CONCURRENT_JOBS,
+            'load_latency': state.job_latency,
+            'poll_interval': poll_interval
+        },
+        'summary': {
+            stage: {
+                'median_seconds': statistics.median(run[stage]['seconds'] for run in runs),
+                'min_seconds': min(run[stage]['seconds'] for run in runs)
+            }
+            for stage in runs[0]
+        },
+        'runs': runs
+    }
+
+
+def _run_stages(output_format, compression, state, poll_interval):
+    """
+    生成 → 書き出し → アップロード → ロードを1回実行し、ステージごとの計測結果を返す
+
+    アップロード・ロードのrequestsはそのステージでスタブサーバーが受けたHTTPリクエストの件数。
+    """
+    from config import RAW_DATA_DIR
+    from data_generator import SampleDataGenerator
+    from bigquery_schemas import BigQuerySchemas
+    from output_writers import find_table_files
+    from gcs_client import GCSClient
+    from bigquery_client import BigQueryClient
+
+    stages = {}
+    generator = SampleDataGenerator(output_format=output_format, compression=compression)
+
+    # 1. データ生成（メモリ上）
+    # frame_bytesは生成したDataFrameのメモリ使用量（COMPACT_DTYPESの効果の確認用）
+    tables = {}
+    for table_name, generate, frames in [
+        ('users', generator.generate_users, lambda: [generator.users_df]),
+        ('products', generator.generate_products, lambda: [generator.products_df]),
+        ('orders', generator.generate_orders, lambda: [generator.orders_df, generator.order_items_df]),
+        ('access_logs', generator.generate_access_logs, lambda: [generator.access_logs])
+    ]:
+        start_time = time.perf_counter()
+        generate()
+        tables[table_name] = {
+            'seconds': time.perf_counter() - start_time,
+            'rows': sum(len(frame) for frame in frames()),
+            'frame_bytes': sum(int(frame.memory_usage(deep=True).sum())
+                               for frame in frames() if hasattr(frame, 'memory_usage'))
+        }
+    stages['generate'] = _stage_result(
+        sum(table['seconds'] for table in tables.values()),
+        rows=sum(table['rows'] for table in tables.values()),
+        frame_bytes=sum(table['frame_bytes'] for table in tables.values()),
+        tables=tables)
+
+    # 2. ファイル書き出し
+    start_time = time.perf_counter()
+    generator.save_to_files()
+    elapsed = time.perf_counter() - start_time
+    files = {
+        table_name: find_table_files(table_name, output_format, compression)
+        for table_name in BigQuerySchemas.get_available_tables()
+    }
+    file_sizes = {file_name: os.path.getsize(f'{RAW_DATA_DIR}/{file_name}')
+                  for file_names in files.values() for file_name in file_names}
+    stages['serialize'] = _stage_result(
+        elapsed, rows=stages['generate']['rows'], size_bytes=sum(file_sizes.values()), files=file_sizes)
+
+    # 3. GCSアップロード（スタブサーバー）
+    gcs_client = GCSClient()
+    gcs_client.setup_gcs_bucket()
+    requests_before = state.stats['requests']
+    start_time = time.perf_counter()
+    gcs_uris = gcs_client.upload_files_to_gcs(
+        [(f'{RAW_DATA_DIR}/{file_name}', f'raw/{file_name}') for file_name in file_sizes])
+    stages['upload'] = _stage_result(
+        time.perf_counter() - start_time, size_bytes=sum(file_sizes.values()), files=len(gcs_uris),
+        requests=state.stats['requests'] - requests_before)
+
+    # 4. BigQueryロード（スタブサーバーのロードジョブ）
+    bigquery_client = BigQueryClient()
+    bigquery_client.setup_bigquery_dataset()
+    schemas = BigQuerySchemas.get_schemas()
+    load_specs = [
+        {
+            'gcs_uri': [gcs_uris[f'{RAW_DATA_DIR}/{file_name}'] for file_name in file_names],
+            'table_name': table_name,
+            'schema': schemas[table_name]
+        }
+        for table_name, file_names in files.items()
+    ]
+    requests_before = state.stats['requests']
+    start_time = time.perf_counter()
+    results = bigquery_client.load_tables_from_gcs(load_specs, poll_interval=poll_interval)
+    failed = [result['table_name'] for result in results if result['error']]
+    if failed:
+        raise RuntimeError(f"Stub load jobs failed for: {', '.join(failed)}")
+    stages['load'] = _stage_result(
+        time.perf_counter() - start_time,
+        rows=sum(result['rows'] for result in results),
+        jobs=len(results),
+        requests=state.stats['requests'] - requests_before)
+
+    # 次の繰り返しに備えてスタブサーバーのオブジェクトとジョブを解放
+    with state.lock:
+        state.objects.clear()
+        state.jobs.clear()
+    return stages
+
+
+def _stage_result(seconds, rows=None, size_bytes=None, **details):
+    """ステージの計測結果（所要時間と、行数・バイト数があればそのスループット）"""
+    result = {'seconds': seconds}
+    if rows is not None:
+        result['rows'] = rows
+        result['rows_per_second'] = rows / seconds if seconds > 0 else None
+    if size_bytes is not None:
+        result['bytes'] = size_bytes
+        result['mib_per_second'] = size_bytes / seconds / 1024 / 1024 if seconds > 0 else None
+    result.update(details)
+    return result
+
+
+def compare_results(baseline, current):
+    """ベースラインの結果と比較し、ステージごとの中央値の変化を表示"""
+    print(f"\nComparison with baseline ({baseline.get('git_commit') or 'unknown commit'}):")
+    for stage, summary in current['summary'].items():
+        if stage not in baseline.get('summary', {}):
+            continue
+        before = baseline['summary'][stage]['median_seconds']
+        after = summary['median_seconds']
+        change = (after - before) / before * 100 if before > 0 else 0.0
+        print(f"  {stage:<10} {before:8.3f}s → {after:8.3f}s ({change:+.1f}%)")
+
+    # 生成したDataFrameのメモリ使用量（中央値ではなく1回目の値。生成は毎回同じデータになる）
+    before_bytes = baseline.get('runs', [{}])[0].get('generate', {}).get('frame_bytes')
+    after_bytes = current['runs'][0]['generate'].get('frame_bytes')
+    if before_bytes and after_bytes:
+        print(f"  {'memory':<10} {before_bytes / 1024 / 1024:7.1f}M → {after_bytes / 1024 / 1024:7.1f}M "
+              f"({(after_bytes - before_bytes) / before_bytes * 100:+.1f}%)")
+
+    if baseline.get('parameters', {}).get('scale') != current['parameters']['scale']:
+        print("⚠️  Baseline was measured with a different scale factor")
+
+
+def _git_commit():
+    """現在のgitコミット（取得できない場合はNone）"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _configure_environment(scale, data_dir, server):
+    """テーブルごとの件数・出力先と、GCS・BigQueryの接続先（スタブサーバー）を環境変数で設定（configのimport前に呼ぶ）"""
+    for name in ['NUM_USERS', 'NUM_PRODUCTS', 'NUM_ORDERS', 'NUM_ACCESS_LOGS']:
+        os.environ[name] = str(scale)
+    os.environ['DATA_DIR'] = data_dir
+    address = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    os.environ['STORAGE_EMULATOR_HOST'] = address
+    os.environ['BIGQUERY_API_ENDPOINT'] = address
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="パイプラインの各ステージのベンチマーク")
+    parser.add_argument(
+        '--scale', type=int, default=10000,
+        help="各テーブルの行数（デフォルト: 10000）")
+    parser.add_argument(
+        '--format', dest='output_format', choices=['csv', 'parquet'], default='csv',
+        help="出力ファイルの形式（デフォルト: csv）")
+    parser.add_argument(
+        '--compression', choices=['none', 'gzip'], default='none',
+        help="CSV/NDJSONの圧縮（デフォルト: none）")
+    parser.add_argument(
+        '--repeat', type=int, default=1,
+        help="計測の繰り返し回数（サマリーは中央値と最小値）")
+    parser.add_argument(
+        '--output', default='benchmark_results.json',
+        help="結果のJSONファイルのパス（デフォルト: benchmark_results.json）")
+    parser.add_argument(
+        '--baseline',
+        help="比較対象とする過去の結果のJSONファイル")
+    parser.add_argument(
+        '--data-dir',
+        help="生成ファイルの出力先（デフォルト: 一時ディレクトリ、終了時に削除）")
+    parser.add_argument(
+        '--upload-latency', type=float, default=0.0,
+        help="GCSへの書き込み（アップロード・compose）1件ごとに加える待ち時間（秒）")
+    parser.add_argument(
+        '--load-latency', type=float, default=0.0,
+        help="ロードジョブ1件が完了するまでの時間（秒）")
+    parser.add_argument(
+        '--poll-interval', type=float, default=0.01,
+        help="ロードジョブの状態を確認する間隔（秒）")
+    parser.add_argument(
+        '--verbose', action='store_true',
+        help="各ステージのログを表示する")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='bigquery-importer-benchmark-')
+    server = start_stub_server(upload_latency=args.upload_latency, load_latency=args.load_latency)
+    _configure_environment(args.scale, data_dir, server)
+
+    print(f"🏁 Benchmarking {args.scale} rows per table "
+          f"({args.output_format}, compression: {args.compression}, data dir: {data_dir})")
+    try:
+        results = run_benchmark(
+            args.scale, args.output_format, server, repeat=args.repeat,
+            poll_interval=args.poll_interval, verbose=args.verbose, compression=args.compression)
+    finally:
+        server.shutdown()
+        server.server_close()
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            compare_results(json.load(f), results)
@@ -1,20 +1,42 @@
-from google.cloud import bigquery
-from google.cloud.exceptions import NotFound
-import pandas as pd
 import json
 import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from config import *
+from bigquery_schemas import BigQuerySchemas
+from query_cache import QueryCache
+from transport import get_shared_transport
 
 
 class BigQueryClient:
     """BigQuery専用クライアント"""
 
-    def __init__(self):
-        self.bigquery_client = bigquery.Client(project=GCP_PROJECT_ID)
+    def __init__(self, bigquery_client=None, query_cache=None, read_client=None,
+                 maximum_bytes_billed=QUERY_MAXIMUM_BYTES_BILLED, transport=None):
+        # bigquery_client・read_clientを渡すとそれを使う（ベンチマークでのスタブ等）
+        # google.cloud.bigquery（pandas・pyarrowも読み込まれる）はクライアントを作成するときに読み込む
+        # HTTPセッションはGCSClientと共有し、ロードジョブの投入・状態確認はTransportの再試行方針で再試行する
+        self.transport = transport or get_shared_transport()
+        if bigquery_client is None:
+            from google.cloud import bigquery
+            client_options = {'api_endpoint': BIGQUERY_API_ENDPOINT} if BIGQUERY_API_ENDPOINT else None
+            bigquery_client = bigquery.Client(project=GCP_PROJECT_ID, credentials=self.transport.credentials,
+                                              _http=self.transport.session, client_options=client_options)
+        self.bigquery_client = bigquery_client
+        self.maximum_bytes_billed = maximum_bytes_billed  # 0またはNoneで無制限
+        self.read_client = read_client  # Storage Read APIのクライアント（初回の読み出し時に作成）
         self.dataset = None
+        if query_cache is None and QUERY_CACHE_ENABLED:
+            query_cache = QueryCache(self.bigquery_client)
+        self.query_cache = query_cache
 
     def setup_bigquery_dataset(self):
         """BigQueryデータセットへのアクセス確認（Terraformで事前作成されている前提）"""
+        from google.cloud.exceptions import NotFound
+
         dataset_id = f"{GCP_PROJECT_ID}.{BIGQUERY_DATASET}"
 
         try:
@@ -31,19 +53,15 @@ class BigQueryClient:
 
     def upload_csv_to_bigquery(self, csv_file_path, table_name, schema=None):
         """CSVファイルをBigQueryにロード"""
+        from google.cloud import bigquery
+
         if not self.dataset:
             raise ValueError(
                 "BigQuery dataset not initialized. Call setup_bigquery_dataset() first.")
 
         table_id = f"{GCP_PROJECT_ID}.{BIGQUERY_DATASET}.{table_name}"
 
-        job_config = bigquery.LoadJobConfig(
-            source_format=bigquery.SourceFormat.CSV,
-            skip_leading_rows=1,
-            autodetect=True if schema is None else False,
-            schema=schema,
-            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
-        )
+        job_config = self._create_load_job_config(bigquery.SourceFormat.CSV, schema, table_name=table_name)
 
         with open(csv_file_path, "rb") as source_file:
             job = self.bigquery_client.load_table_from_file(
@@ -58,20 +76,16 @@ class BigQueryClient:
         return table
 
     def load_csv_from_gcs_to_bigquery(self, gcs_uri, table_name, schema=None):
-        """GCS上のCSVファイルをBigQueryにロード"""
+        """GCS上のCSVファイル（URIのリストまたはワイルドカード指定で複数ファイルも可）をBigQueryにロード"""
+        from google.cloud import bigquery
+
         if not self.dataset:
             raise ValueError(
                 "BigQuery dataset not initialized. Call setup_bigquery_dataset() first.")
 
         table_id = f"{GCP_PROJECT_ID}.{BIGQUERY_DATASET}.{table_name}"
 
-        job_config = bigquery.LoadJobConfig(
-            source_format=bigquery.SourceFormat.CSV,
-            skip_leading_rows=1,
-            autodetect=True if schema is None else False,
-            schema=schema,
-            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
-        )
+        job_config = self._create_load_job_config(bigquery.SourceFormat.CSV, schema, table_name=table_name)
 
         # GCS URIから直接ロード（ファイルを読み込む必要なし！）
         load_job = self.bigquery_client.load_table_from_uri(
@@ -86,20 +100,43 @@ class BigQueryClient:
         return table
 
     def load_json_from_gcs_to_bigquery(self, gcs_uri, table_name, schema=None):
-        """GCS上のJSONファイルをBigQueryにロード"""
+        """GCS上のJSONファイル（URIのリストまたはワイルドカード指定で複数ファイルも可）をBigQueryにロード"""
+        from google.cloud import bigquery
+
         if not self.dataset:
             raise ValueError(
                 "BigQuery dataset not initialized. Call setup_bigquery_dataset() first.")
 
         table_id = f"{GCP_PROJECT_ID}.{BIGQUERY_DATASET}.{table_name}"
 
-        job_config = bigquery.LoadJobConfig(
-            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
-            autodetect=True if schema is None else False,
-            schema=schema,
-            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+        job_config = self._create_load_job_config(
+            bigquery.SourceFormat.NEWLINE_DELIMITED_JSON, schema, table_name=table_name)
+
+        # GCS URIから直接ロード
+        load_job = self.bigquery_client.load_table_from_uri(
+            gcs_uri, table_id, job_config=job_config
         )
 
+        load_job.result()  # ジョブの完了を待機
+
+        table = self.bigquery_client.get_table(table_id)
+        print(f"Loaded {table.num_rows} rows from {gcs_uri} to {table_id}")
+
+        return table
+
+    def load_parquet_from_gcs_to_bigquery(self, gcs_uri, table_name, schema=None):
+        """GCS上のParquetファイル（URIのリストまたはワイルドカード指定で複数ファイルも可）をBigQueryにロード"""
+        from google.cloud import bigquery
+
+        if not self.dataset:
+            raise ValueError(
+                "BigQuery dataset not initialized. Call setup_bigquery_dataset() first.")
+
+        table_id = f"{GCP_PROJECT_ID}.{BIGQUERY_DATASET}.{table_name}"
+
+        # Parquetは型情報を持つため、日付・タイムスタンプの文字列解釈が不要
+        job_config = self._create_load_job_config(bigquery.SourceFormat.PARQUET, schema, table_name=table_name)
+
         # GCS URIから直接ロード
         load_job = self.bigquery_client.load_table_from_uri(
             gcs_uri, table_id, job_config=job_config
@@ -112,20 +149,194 @@ class BigQueryClient:
 
         return table
 
+    def load_tables_from_gcs(self, load_specs, max_concurrent_jobs=LOAD_MAX_CONCURRENT_JOBS,
+                             poll_interval=LOAD_POLL_INTERVAL):
+        """
+        複数テーブルのロードジョブをまとめて投入し、完了をまとめて待機
+
+        同時に実行するジョブ数はmax_concurrent_jobsまでとし、完了したジョブから順に次のジョブを投入する。
+        ジョブが失敗しても他のジョブは継続し、結果はテーブルごとに返す。
+        ジョブの投入・状態確認の一時的なエラー（429・5xx・接続エラー）は期限まで再試行し、
+        それでも失敗したジョブはそのテーブルの失敗として扱う。
+
+        Args:
+            load_specs: dictのリスト（'gcs_uri', 'table_name', 'schema'、省略可能な 'write_disposition'）。
+                パーティション・クラスタリングはBigQuerySchemasのテーブルごとの宣言に従う。
+                'gcs_uri' はURI・URIのリスト・ワイルドカード（gs://bucket/raw/orders/part-*.csv）のいずれかで、
+                複数ファイルは1つのロードジョブでまとめて取り込む（BigQueryがファイル単位で並列に読み込む）。
+                ソース形式はURIの拡張子（.csv / .json / .parquet、gzip圧縮時は末尾に .gz）から判定する
+            max_concurrent_jobs: 同時に実行するロードジョブの最大数
+            poll_interval: ジョブ状態を確認する間隔（秒）
+
+        Returns:
+            list: テーブルごとの結果（table_name, gcs_uri, job_id, rows, seconds, error）
+        """
+        if not self.dataset:
+            raise ValueError(
+                "BigQuery dataset not initialized. Call setup_bigquery_dataset() first.")
+
+        pending = list(load_specs)
+        running = []
+        results = []
+
+        while pending or running:
+            # 空きがあればジョブを投入
+            while pending and len(running) < max_concurrent_jobs:
+                spec = pending.pop(0)
+                start_time = time.perf_counter()
+                try:
+                    job = self._submit_load_job(spec)
+                except Exception as e:
+                    results.append(self._load_result(spec, None, start_time, str(e)))
+                    continue
+                running.append((job, spec, start_time))
+
+            if not running:
+                continue
+
+            time.sleep(poll_interval)
+
+            still_running = []
+            for job, spec, start_time in running:
+                try:
+                    done = self.transport.call('job_poll', job.done, retry=None)
+                except Exception as e:
+                    results.append(self._load_result(spec, job, start_time, f"Failed to get job state: {e}"))
+                    continue
+                if done:
+                    error = job.error_result['message'] if job.error_result else None
+                    results.append(self._load_result(spec, job, start_time, error))
+                else:
+                    still_running.append((job, spec, start_time))
+            running = still_running
+
+        failed = [result for result in results if result['error']]
+        print(f"Load jobs completed: {len(results) - len(failed)} succeeded, {len(failed)} failed")
+
+        return results
+
+    def _submit_load_job(self, spec):
+        """
+        ロード仕様からロードジョブを投入（完了は待たない）
+
+        ジョブIDを先に決めておき、投入の応答が失われて再試行した結果が409（同じIDのジョブが既にある）の場合は
+        既に投入されたジョブを取得する。同じロードが二重に実行されることはない。
+        """
+        from google.api_core.exceptions import Conflict
+        from google.cloud import bigquery
+
+        table_id = f"{GCP_PROJECT_ID}.{BIGQUERY_DATASET}.{spec['table_name']}"
+        source_format = self.get_source_format(spec['gcs_uri'])
+        job_config = self._create_load_job_config(
+            source_format,
+            spec.get('schema'),
+            write_disposition=spec.get('write_disposition', bigquery.WriteDisposition.WRITE_TRUNCATE),
+            table_name=spec['table_name']
+        )
+
+        job_id = f"load_{spec['table_name']}_{uuid.uuid4().hex}"
+        # 再試行はTransportで行う（回数を数えるため、ライブラリの再試行と二重にしない）
+        try:
+            return self.transport.call(
+                'job_insert', self.bigquery_client.load_table_from_uri,
+                spec['gcs_uri'], table_id, job_id=job_id, job_config=job_config, retry=None
+            )
+        except Conflict:
+            return self.transport.call(
+                'job_insert', self.bigquery_client.get_job,
+                job_id, location=getattr(self.dataset, 'location', None), retry=None
+            )
+
+    @staticmethod
+    def _load_result(spec, job, start_time, error):
+        """ロードジョブ1件分の結果を作成して表示"""
+        result = {
+            'table_name': spec['table_name'],
+            'gcs_uri': spec['gcs_uri'],
+            'job_id': job.job_id if job else None,
+            'rows': job.output_rows if job and not error else None,
+            'seconds': time.perf_counter() - start_time,
+            'error': error
+        }
+
+        if error:
+            print(f"❌ Load failed for {result['table_name']} ({result['job_id']}): {error}")
+        else:
+            print(f"Loaded {result['rows']} rows from {BigQueryClient._describe_uris(result['gcs_uri'])} "
+                  f"to {result['table_name']} in {result['seconds']:.1f}s")
+
+        return result
+
+    @staticmethod
+    def _describe_uris(gcs_uri):
+        """表示用のURI（リストの場合は先頭のURIとファイル数）"""
+        if isinstance(gcs_uri, str):
+            return gcs_uri
+        return gcs_uri[0] if len(gcs_uri) == 1 else f"{gcs_uri[0]} and {len(gcs_uri) - 1} more files"
+
+    @staticmethod
+    def get_source_format(gcs_uri):
+        """
+        URIの拡張子からBigQueryのソース形式を判定（gzip圧縮された .csv.gz / .json.gz はそのままロードできる）
+
+        URIのリストの場合は先頭のURIで判定する（1つのロードジョブのファイルは同じ形式である必要がある）。
+        """
+        from google.cloud import bigquery
+
+        if not isinstance(gcs_uri, str):
+            gcs_uri = gcs_uri[0]
+
+        if gcs_uri.endswith('.gz'):
+            gcs_uri = gcs_uri[:-len('.gz')]
+        if gcs_uri.endswith('.parquet'):
+            return bigquery.SourceFormat.PARQUET
+        if gcs_uri.endswith('.json'):
+            return bigquery.SourceFormat.NEWLINE_DELIMITED_JSON
+        return bigquery.SourceFormat.CSV
+
+    @staticmethod
+    def _create_load_job_config(source_format, schema=None,
+                                write_disposition='WRITE_TRUNCATE',
+                                table_name=None):
+        """
+        ロード用のジョブ設定を作成
+
+        table_nameを指定すると、BigQuerySchemasで宣言されたパーティション列（日単位の時間パーティション）と
+        クラスタリング列を設定する。
+        """
+        from google.cloud import bigquery
+
+        partition_field = BigQuerySchemas.get_partition_field(table_name) if table_name else None
+        clustering_fields = BigQuerySchemas.get_clustering_fields(table_name) if table_name else None
+        options = {
+            'source_format': source_format,
+            'schema': schema,
+            'write_disposition': write_disposition
+        }
+        if partition_field:
+            options['time_partitioning'] = bigquery.TimePartitioning(
+                type_=bigquery.TimePartitioningType.DAY, field=partition_field)
+        if clustering_fields:
+            options['clustering_fields'] = clustering_fields
+        if source_format == bigquery.SourceFormat.CSV:
+            options['skip_leading_rows'] = 1
+        if source_format != bigquery.SourceFormat.PARQUET:
+            options['autodetect'] = schema is None
+
+        return bigquery.LoadJobConfig(**options)
+
     def upload_json_to_bigquery(self, json_file_path, table_name, schema=None):
         """JSONファイルをBigQueryにロード"""
+        from google.cloud import bigquery
+
         if not self.dataset:
             raise ValueError(
                 "BigQuery dataset not initialized. Call setup_bigquery_dataset() first.")
 
         table_id = f"{GCP_PROJECT_ID}.{BIGQUERY_DATASET}.{table_name}"
 
-        job_config = bigquery.LoadJobConfig(
-            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
-            autodetect=True if schema is None else False,
-            schema=schema,
-            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
-        )
+        job_config = self._create_load_job_config(
+            bigquery.SourceFormat.NEWLINE_DELIMITED_JSON, schema, table_name=table_name)
 
         with open(json_file_path, "rb") as source_file:
             job = self.bigquery_client.load_table_from_file(
@@ -140,14 +351,203 @@ class BigQueryClient:
         return table
 
     def run_query(self, query):
-        """BigQueryクエリの実行"""
-        query_job = self.bigquery_client.query(query)
+        """BigQueryクエリの実行（課金バイト数の上限を超えるクエリはエラー）"""
+        query_job = self.bigquery_client.query(query, job_config=self._query_job_config())
         results = query_job.result()
         return results
 
-    def query_to_dataframe(self, query):
-        """BigQueryクエリの結果をDataFrameで取得"""
-        return self.bigquery_client.query(query).to_dataframe()
+    def estimate_query(self, query):
+        """
+        クエリをドライランし、実行した場合の読み取りバイト数を見積もる（課金されない）
+
+        Returns:
+            dict: bytes_processed, estimated_cost_usd（オンデマンド料金での概算）,
+                referenced_tables, exceeds_limit（課金バイト数の上限を超えるか）
+        """
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+        query_job = self.bigquery_client.query(query, job_config=job_config)
+        bytes_processed = query_job.total_bytes_processed or 0
+
+        return {
+            'bytes_processed': bytes_processed,
+            'estimated_cost_usd': bytes_processed / 1024 ** 4 * QUERY_PRICE_PER_TIB,
+            'referenced_tables': [
+                f"{table.project}.{table.dataset_id}.{table.table_id}"
+                for table in query_job.referenced_tables
+            ],
+            'exceeds_limit': bool(self.maximum_bytes_billed) and bytes_processed > self.maximum_bytes_billed
+        }
+
+    def list_table_names(self, dataset_name):
+        """データセット内のテーブル名の一覧（データセットがまだない場合は空のset）"""
+        from google.cloud.exceptions import NotFound
+
+        try:
+            return {table.table_id for table in self.bigquery_client.list_tables(f"{GCP_PROJECT_ID}.{dataset_name}")}
+        except NotFound:
+            return set()
+
+    def _query_job_config(self):
+        """課金バイト数の上限を設定したクエリジョブの設定"""
+        from google.cloud import bigquery
+
+        return bigquery.QueryJobConfig(maximum_bytes_billed=self.maximum_bytes_billed or None)
+
+    def query_to_dataframe(self, query, use_cache=True):
+        """
+        BigQueryクエリの結果をDataFrameで取得
+
+        クエリキャッシュが有効な場合、同じSQL（コメント・空白の違いは無視）の結果を
+        参照テーブルが更新されるまでローカルから返し、BigQueryへのクエリ（課金）を省略する。
+        """
+        if not self.query_cache or not use_cache:
+            return self.bigquery_client.query(query, job_config=self._query_job_config()).to_dataframe()
+
+        table = self.query_cache.get(query)
+        if table is None:
+            query_job = self.bigquery_client.query(query, job_config=self._query_job_config())
+            table = query_job.to_arrow()
+            self.query_cache.put(query, table, query_job.referenced_tables, query_job.started)
+
+        return self._arrow_to_dataframe(table)
+
+    def read_table_batches(self, table_name, columns=None, row_filter=None,
+                           max_streams=STORAGE_READ_MAX_STREAMS):
+        """
+        テーブルをStorage Read APIでArrowのRecordBatchとして順に読み出す
+
+        結果全体をメモリに載せずに、大きなテーブルをバッチ単位で処理できる。
+
+        Args:
+            table_name: テーブル名（データセット内の名前、または 'project.dataset.table'）
+            columns: 読み出すカラム名のリスト（省略時は全カラム）
+            row_filter: 行の絞り込み条件（SQLのWHERE句の式、例: "device_type = 'mobile'"）
+            max_streams: 並列に読み出すストリーム数の上限。2以上では行の順序は保証されない
+
+        Yields:
+            pyarrow.RecordBatch
+        """
+        from google.cloud import bigquery
+
+        if '.' not in table_name:
+            table_name = f"{GCP_PROJECT_ID}.{BIGQUERY_DATASET}.{table_name}"
+        table = bigquery.TableReference.from_string(table_name)
+        yield from self._read_batches(table, columns, row_filter, max_streams)
+
+    def query_batches(self, query, columns=None, row_filter=None, max_streams=STORAGE_READ_MAX_STREAMS):
+        """
+        クエリを実行し、結果をStorage Read APIでArrowのRecordBatchとして順に読み出す
+
+        クエリの完了を待ってから結果の一時テーブルを読み出す。
+        ORDER BYの順序を保つ必要がある場合はmax_streams=1で呼び出す。
+        引数はread_table_batches()と同じ。
+        """
+        query_job = self.bigquery_client.query(query, job_config=self._query_job_config())
+        query_job.result()  # ジョブの完了を待機（行はここでは取得しない）
+        if query_job.destination is None:
+            return
+        yield from self._read_batches(query_job.destination, columns, row_filter, max_streams)
+
+    def _read_batches(self, table, columns, row_filter, max_streams):
+        """読み出しセッションを作成し、各ストリームのRecordBatchを返す"""
+        from google.cloud.bigquery_storage import types
+
+        if self.read_client is None:
+            from google.cloud import bigquery_storage
+            self.read_client = bigquery_storage.BigQueryReadClient()
+
+        requested_session = types.ReadSession(
+            table=table.to_bqstorage(),
+            data_format=types.DataFormat.ARROW,
+            read_options=types.ReadSession.TableReadOptions(
+                selected_fields=columns or [],
+                row_restriction=row_filter or ''
+            )
+        )
+        session = self.read_client.create_read_session(
+            parent=f"projects/{self.bigquery_client.project}",
+            read_session=requested_session,
+            max_stream_count=max_streams
+        )
+
+        # 条件に一致する行がない場合、ストリームは作成されない
+        if len(session.streams) <= 1:
+            for stream in session.streams:
+                yield from self._read_stream(session, stream.name)
+            return
+
+        yield from self._read_streams_in_parallel(session)
+
+    def _read_stream(self, session, stream_name):
+        """1ストリーム分のRecordBatchを返す"""
+        reader = self.read_client.read_rows(stream_name)
+        for page in reader.rows(session).pages:
+            yield page.to_arrow()
+
+    def _read_streams_in_parallel(self, session, queue_size=STORAGE_READ_QUEUE_SIZE):
+        """
+        全ストリームをスレッドで並列に読み出し、読み出せたRecordBatchから順に返す
+
+        未消費のバッチはqueue_size件までに抑え、それ以上は読み出しスレッドを待たせる。
+        呼び出し側が途中で読み出しをやめた場合は、各スレッドも次のバッチで終了する。
+        """
+        batches = queue.Queue(maxsize=queue_size)
+        stopped = threading.Event()
+        finished = object()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def read(stream_name):
+            try:
+                for batch in self._read_stream(session, stream_name):
+                    if not put(batch):
+                        return
+            except Exception as e:
+                put(e)
+            finally:
+                put(finished)
+
+        executor = ThreadPoolExecutor(max_workers=len(session.streams))
+        for stream in session.streams:
+            executor.submit(read, stream.name)
+
+        remaining = len(session.streams)
+        try:
+            while remaining:
+                item = batches.get()
+                if item is finished:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stopped.set()
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def _arrow_to_dataframe(table):
+        """ArrowテーブルをRowIterator.to_dataframe()と同じ型（NULL許容の整数・真偽値、db-dtypesの日付・時刻）で変換"""
+        import db_dtypes
+        import pandas as pd
+        import pyarrow as pa
+
+        types = {
+            pa.bool_(): pd.BooleanDtype(),
+            pa.int64(): pd.Int64Dtype(),
+            pa.date32(): db_dtypes.DateDtype(),
+            pa.time64('us'): db_dtypes.TimeDtype(),
+        }
+        return table.to_pandas(types_mapper=types.get)
 
 
 if __name__ == "__main__":
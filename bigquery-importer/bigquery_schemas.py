@@ -1,73 +1,128 @@
-from google.cloud import bigquery
+from functools import lru_cache
 
 
 class BigQuerySchemas:
     """BigQueryテーブルのスキーマ定義を管理するクラス"""
 
+    # 日単位の時間パーティションに使うカラム（差分ロードの単位）
+    PARTITION_FIELDS = {
+        'orders': 'order_date',
+        'access_logs': 'timestamp',
+    }
+
+    # クラスタリングに使うカラム（マートでの絞り込み・結合に使う順。最大4カラム）
+    CLUSTERING_FIELDS = {
+        'users': ['user_id'],
+        'products': ['category', 'product_id'],
+        'orders': ['status', 'user_id'],
+        'order_items': ['product_id', 'order_id'],
+        'access_logs': ['user_id', 'session_id'],
+    }
+
+    # テーブル名 → カラム定義 (名前, 型, モード)。SchemaFieldへの変換は初回の取得時に一度だけ行う
+    TABLE_FIELDS = {
+        'users': [
+            ("user_id", "STRING", "REQUIRED"),
+            ("name", "STRING", "REQUIRED"),
+            ("email", "STRING", "REQUIRED"),
+            ("age", "INTEGER", "NULLABLE"),
+            ("gender", "STRING", "NULLABLE"),
+            ("registration_date", "DATE", "NULLABLE"),
+            ("city", "STRING", "NULLABLE"),
+            ("prefecture", "STRING", "NULLABLE"),
+        ],
+        'products': [
+            ("product_id", "STRING", "REQUIRED"),
+            ("name", "STRING", "REQUIRED"),
+            ("category", "STRING", "NULLABLE"),
+            ("price", "INTEGER", "NULLABLE"),
+            ("created_date", "DATE", "NULLABLE"),
+            ("brand", "STRING", "NULLABLE"),
+            ("rating", "FLOAT", "NULLABLE"),
+        ],
+        'orders': [
+            ("order_id", "STRING", "REQUIRED"),
+            ("user_id", "STRING", "REQUIRED"),
+            ("order_date", "TIMESTAMP", "NULLABLE"),
+            ("total_amount", "INTEGER", "NULLABLE"),
+            ("status", "STRING", "NULLABLE"),
+            ("payment_method", "STRING", "NULLABLE"),
+        ],
+        'order_items': [
+            ("order_item_id", "STRING", "REQUIRED"),
+            ("order_id", "STRING", "REQUIRED"),
+            ("product_id", "STRING", "REQUIRED"),
+            ("quantity", "INTEGER", "NULLABLE"),
+            ("unit_price", "INTEGER", "NULLABLE"),
+        ],
+        'access_logs': [
+            ("timestamp", "TIMESTAMP", "NULLABLE"),
+            ("user_id", "STRING", "NULLABLE"),
+            ("page_url", "STRING", "NULLABLE"),
+            ("session_id", "STRING", "NULLABLE"),
+            ("user_agent", "STRING", "NULLABLE"),
+            ("ip_address", "STRING", "NULLABLE"),
+            ("referrer", "STRING", "NULLABLE"),
+            ("device_type", "STRING", "NULLABLE"),
+        ]
+    }
+
     @staticmethod
     def get_schemas():
-        """BigQueryテーブルのスキーマ定義を返す"""
-        schemas = {
-            'users': [
-                bigquery.SchemaField("user_id", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("name", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("email", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("age", "INTEGER", mode="NULLABLE"),
-                bigquery.SchemaField("gender", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField("registration_date",
-                                     "DATE", mode="NULLABLE"),
-                bigquery.SchemaField("city", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField("prefecture", "STRING", mode="NULLABLE"),
-            ],
-            'products': [
-                bigquery.SchemaField("product_id", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("name", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("category", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField("price", "INTEGER", mode="NULLABLE"),
-                bigquery.SchemaField("created_date", "DATE", mode="NULLABLE"),
-                bigquery.SchemaField("brand", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField("rating", "FLOAT", mode="NULLABLE"),
-            ],
-            'orders': [
-                bigquery.SchemaField("order_id", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("user_id", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField(
-                    "order_date", "TIMESTAMP", mode="NULLABLE"),
-                bigquery.SchemaField(
-                    "total_amount", "INTEGER", mode="NULLABLE"),
-                bigquery.SchemaField("status", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField(
-                    "payment_method", "STRING", mode="NULLABLE"),
-            ],
-            'order_items': [
-                bigquery.SchemaField(
-                    "order_item_id", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("order_id", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("product_id", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("quantity", "INTEGER", mode="NULLABLE"),
-                bigquery.SchemaField("unit_price", "INTEGER", mode="NULLABLE"),
-            ],
-            'access_logs': [
-                bigquery.SchemaField(
-                    "timestamp", "TIMESTAMP", mode="NULLABLE"),
-                bigquery.SchemaField("user_id", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField("page_url", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField("session_id", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField("user_agent", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField("ip_address", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField("referrer", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField("device_type", "STRING", mode="NULLABLE"),
-            ]
-        }
-        return schemas
+        """BigQueryテーブルのスキーマ定義を返す（テーブル名 → SchemaFieldのリスト）"""
+        return {table_name: list(schema) for table_name, schema in _build_schemas().items()}
 
     @staticmethod
     def get_schema_for_table(table_name):
         """特定のテーブルのスキーマを取得"""
-        schemas = BigQuerySchemas.get_schemas()
-        return schemas.get(table_name)
+        schema = _build_schemas().get(table_name)
+        return list(schema) if schema is not None else None
+
+    @staticmethod
+    def get_partition_field(table_name):
+        """特定のテーブルのパーティション列を取得（パーティションなしの場合はNone）"""
+        return BigQuerySchemas.PARTITION_FIELDS.get(table_name)
+
+    @staticmethod
+    def get_clustering_fields(table_name):
+        """特定のテーブルのクラスタリング列を取得（クラスタリングなしの場合はNone）"""
+        return BigQuerySchemas.CLUSTERING_FIELDS.get(table_name)
+
+    @staticmethod
+    def get_arrow_schema(table_name):
+        """特定のテーブルのスキーマをParquet出力用のArrowスキーマに変換"""
+        return _build_arrow_schema(table_name)
 
     @staticmethod
     def get_available_tables():
         """利用可能なテーブル名のリストを取得"""
-        return list(BigQuerySchemas.get_schemas().keys())
+        return list(BigQuerySchemas.TABLE_FIELDS)
+
+
+@lru_cache(maxsize=None)
+def _build_schemas():
+    """TABLE_FIELDSからSchemaFieldのリストを作成（google.cloud.bigqueryの読み込みを含め、プロセスで一度だけ）"""
+    from google.cloud import bigquery
+
+    return {
+        table_name: tuple(bigquery.SchemaField(name, field_type, mode=mode) for name, field_type, mode in fields)
+        for table_name, fields in BigQuerySchemas.TABLE_FIELDS.items()
+    }
+
+
+@lru_cache(maxsize=None)
+def _build_arrow_schema(table_name):
+    """TABLE_FIELDSからArrowスキーマを作成（テーブルごとに一度だけ。google.cloud.bigqueryは読み込まない）"""
+    import pyarrow as pa
+
+    arrow_types = {
+        'STRING': pa.string(),
+        'INTEGER': pa.int64(),
+        'FLOAT': pa.float64(),
+        'DATE': pa.date32(),
+        'TIMESTAMP': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([
+        pa.field(name, arrow_types[field_type], nullable=mode != 'REQUIRED')
+        for name, field_type, mode in BigQuerySchemas.TABLE_FIELDS[table_name]
+    ])
@@ -8,20 +8,136 @@ GCP_PROJECT_ID = os.getenv('GCP_PROJECT_ID', 'your-project-id')
 GCS_BUCKET_NAME = os.getenv('GCS_BUCKET_NAME', 'your-bucket-name')
 BIGQUERY_DATASET = os.getenv('BIGQUERY_DATASET', 'ecommerce_data')
 
+# GCS Upload Configuration
+UPLOAD_MAX_WORKERS = int(os.getenv('UPLOAD_MAX_WORKERS', '8'))  # 並列アップロード数
+# このサイズ以上のファイルはパートに分割して並列アップロードし、サーバー側で結合（composite object）
+COMPOSITE_UPLOAD_THRESHOLD = int(os.getenv('COMPOSITE_UPLOAD_THRESHOLD', str(256 * 1024 * 1024)))
+COMPOSITE_PART_SIZE = int(os.getenv('COMPOSITE_PART_SIZE', str(64 * 1024 * 1024)))
+COMPOSITE_UPLOAD_WORKERS = int(os.getenv('COMPOSITE_UPLOAD_WORKERS', '8'))
+COMPOSITE_UPLOAD_RETRIES = int(os.getenv('COMPOSITE_UPLOAD_RETRIES', '2'))  # 失敗したパートのみ再送する回数
+
+# BigQuery Load Configuration
+LOAD_MAX_CONCURRENT_JOBS = int(os.getenv('LOAD_MAX_CONCURRENT_JOBS', '5'))  # 同時実行するロードジョブ数
+LOAD_POLL_INTERVAL = float(os.getenv('LOAD_POLL_INTERVAL', '1.0'))  # ジョブ状態の確認間隔（秒）
+
+# HTTP Transport Configuration
+# GCS・BigQueryクライアントで共有するHTTPセッションの接続プールのサイズ（ホストごとに保持する接続数）
+HTTP_POOL_SIZE = int(os.getenv(
+    'HTTP_POOL_SIZE', str(max(UPLOAD_MAX_WORKERS, COMPOSITE_UPLOAD_WORKERS) + LOAD_MAX_CONCURRENT_JOBS)))
+# 一時的なエラー（429・5xx・接続エラー）の再試行。待ち時間は指数的に増やし、0〜上限の範囲でランダムにずらす
+RETRY_INITIAL_DELAY = float(os.getenv('RETRY_INITIAL_DELAY', '0.5'))  # 1回目の待ち時間の上限（秒）
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '30.0'))  # 1回あたりの待ち時間の上限（秒）
+RETRY_MULTIPLIER = float(os.getenv('RETRY_MULTIPLIER', '2.0'))
+RETRY_DEADLINE = float(os.getenv('RETRY_DEADLINE', '300.0'))  # 1操作あたり、再試行を続ける時間の上限（秒）
+# BigQuery APIの接続先（ローカルのスタブサーバー等。未設定の場合は本番のAPI）
+# GCSは STORAGE_EMULATOR_HOST で接続先を変更する。どちらかを設定した場合は認証なしで接続する
+BIGQUERY_API_ENDPOINT = os.getenv('BIGQUERY_API_ENDPOINT')
+
+# BigQuery Query Configuration
+# クエリごとの課金バイト数の上限（超えるクエリはBigQueryが実行前にエラーにする。0で無制限）
+QUERY_MAXIMUM_BYTES_BILLED = int(os.getenv('QUERY_MAXIMUM_BYTES_BILLED', str(10 * 1024 * 1024 * 1024)))
+# ドライランの見積もり金額の計算に使うオンデマンド料金（USD / TiB）
+QUERY_PRICE_PER_TIB = float(os.getenv('QUERY_PRICE_PER_TIB', '6.25'))
+
+# BigQuery Storage Read API
+# read_table_batches / query_batches で並列に読み出すストリーム数（1ならテーブルの行順を保つ）
+STORAGE_READ_MAX_STREAMS = int(os.getenv('STORAGE_READ_MAX_STREAMS', '1'))
+# 複数ストリームの読み出し時に、消費されるのを待つRecordBatchの最大数（メモリ使用量の上限）
+STORAGE_READ_QUEUE_SIZE = int(os.getenv('STORAGE_READ_QUEUE_SIZE', '8'))
+
 # Data Configuration
-DATA_DIR = '/app/data'
+DATA_DIR = os.getenv('DATA_DIR', '/app/data')
 RAW_DATA_DIR = f'{DATA_DIR}/raw'
 PROCESSED_DATA_DIR = f'{DATA_DIR}/processed'
+STATE_DIR = f'{DATA_DIR}/state'
+WATERMARK_FILE = f'{STATE_DIR}/watermarks.json'  # 差分ロードのテーブルごとの取り込み済み日付
+MANIFEST_FILE = f'{STATE_DIR}/manifest.json'  # アップロード・ロード済みファイルの記録
+
+# dbt Project
+DBT_PROJECT_DIR = os.getenv('DBT_PROJECT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dbt'))
+DBT_TARGET_DATASET = os.getenv('DBT_TARGET_DATASET', 'ecommerce_data_mart')  # profiles.yml の dataset
 
 # Sample Data Configuration
-NUM_USERS = 1000
-NUM_PRODUCTS = 100
-NUM_ORDERS = 5000
-NUM_ACCESS_LOGS = 10000
+NUM_USERS = int(os.getenv('NUM_USERS', '1000'))
+NUM_PRODUCTS = int(os.getenv('NUM_PRODUCTS', '100'))
+NUM_ORDERS = int(os.getenv('NUM_ORDERS', '5000'))
+NUM_ACCESS_LOGS = int(os.getenv('NUM_ACCESS_LOGS', '10000'))
 
 # Date Range for Sample Data
 START_DATE = '2023-01-01'
 END_DATE = '2024-01-31'
 
+# Output Format
+# 'csv': CSV（アクセスログはNDJSON） / 'parquet': BigQuerySchemasの型に沿ったParquet
+OUTPUT_FORMAT = os.getenv('OUTPUT_FORMAT', 'csv')
+PARQUET_COMPRESSION = os.getenv('PARQUET_COMPRESSION', 'snappy')  # 'snappy' または 'zstd'
+# 'gzip' の場合、CSV/NDJSONをgzip圧縮した *.gz ファイルとして書き出し、そのままアップロード・ロードする
+# （Parquetは PARQUET_COMPRESSION で内部的に圧縮されるため対象外）
+OUTPUT_COMPRESSION = os.getenv('OUTPUT_COMPRESSION', 'none')
+# レベル1でも元の約1/4まで縮み、レベル6より圧縮時間が大幅に短い
+GZIP_COMPRESSION_LEVEL = int(os.getenv('GZIP_COMPRESSION_LEVEL', '1'))
+# CSV/NDJSONはWRITE_BATCH_SIZE行ごとにエンコードし、大きなバッファ経由で書き込む
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '50000'))
+WRITE_BUFFER_SIZE = int(os.getenv('WRITE_BUFFER_SIZE', str(8 * 1024 * 1024)))
+
+# Data Generation Engine
+# 'numpy': NumPy配列でまとめて生成（高速） / 'python': 1行ずつ生成する従来方式
+GENERATOR_ENGINE = os.getenv('GENERATOR_ENGINE', 'numpy')
+RANDOM_SEED = int(os.getenv('RANDOM_SEED', '42'))
+# Fakerの値（氏名・市区町村・会社名など）を事前生成しておくプールのサイズ
+VALUE_POOL_SIZE = int(os.getenv('VALUE_POOL_SIZE', '10000'))
+# true の場合、numpyエンジンのDataFrameを省メモリの型で保持する
+# （種類の少ない文字列はcategory、整数は値の範囲に合う幅、IDは整数の代理キーにして書き出す時に 'user_000123' 形式にする）
+COMPACT_DTYPES = os.getenv('COMPACT_DTYPES', 'true').lower() == 'true'
+
+# Streaming Generation
+# true の場合、各テーブルをチャンク単位で生成してファイルに直接追記（メモリ使用量を一定に保つ）
+STREAMING_GENERATION = os.getenv('STREAMING_GENERATION', 'false').lower() == 'true'
+STREAMING_CHUNK_SIZE = int(os.getenv('STREAMING_CHUNK_SIZE', '100000'))
+
+# Parallel Generation
+# true の場合、注文・アクセスログをシャードに分割してプロセスプールで並列生成
+# （出力はシャード数のみで決まり、ワーカー数には依存しない）
+PARALLEL_GENERATION = os.getenv('PARALLEL_GENERATION', 'false').lower() == 'true'
+GENERATION_SHARDS = int(os.getenv('GENERATION_SHARDS', '16'))
+GENERATION_WORKERS = int(os.getenv('GENERATION_WORKERS', str(os.cpu_count() or 1)))
+
+# Sharded Output
+# true の場合、各テーブルを raw/<table>/part-00000.csv ... のシャードに分けて書き出し、
+# シャードを並列にアップロードしたうえで、テーブルごとに1つのロードジョブで全シャードを取り込む
+# （並列生成ではワーカーごとにシャードを書き出すため、常にこの形式になる）
+SHARDED_OUTPUT = os.getenv('SHARDED_OUTPUT', 'false').lower() == 'true' or PARALLEL_GENERATION
+# 1シャードあたりの圧縮前のデータ量の目安（バイト）
+OUTPUT_SHARD_SIZE = int(os.getenv('OUTPUT_SHARD_SIZE', str(128 * 1024 * 1024)))
+
+# Pipelined Execution
+# true の場合、生成・アップロード・ロードをテーブル単位の依存関係（DAG）で重ねて実行する
+# （ファイルが書き終わったテーブルからアップロードし、アップロードが終わったテーブルからロードする）
+PIPELINED_EXECUTION = os.getenv('PIPELINED_EXECUTION', 'false').lower() == 'true'
+# リソースごとの同時実行タスク数
+SCHEDULER_GENERATE_WORKERS = int(os.getenv('SCHEDULER_GENERATE_WORKERS', '1'))
+SCHEDULER_UPLOAD_WORKERS = int(os.getenv('SCHEDULER_UPLOAD_WORKERS', str(UPLOAD_MAX_WORKERS)))
+SCHEDULER_LOAD_WORKERS = int(os.getenv('SCHEDULER_LOAD_WORKERS', str(LOAD_MAX_CONCURRENT_JOBS)))
+
+# Pipeline Metrics
+# 実行ごとにステージ・テーブル単位の計測値を書き出す（'json' または Prometheusのtextfile形式の 'prometheus'）
+METRICS_DIR = os.getenv('METRICS_DIR', f'{DATA_DIR}/metrics')
+METRICS_FORMAT = os.getenv('METRICS_FORMAT', 'json')
+# tracemallocでステージ・テーブルごとのピークメモリを計測する
+# （Fakerなどメモリ確保の多い処理が数倍遅くなるため既定では無効。無効時もプロセスの最大RSSは記録する）
+METRICS_TRACE_MEMORY = os.getenv('METRICS_TRACE_MEMORY', 'false').lower() == 'true'
+PROFILE_DIR = f'{METRICS_DIR}/profiles'  # --profile 指定時のcProfile出力先
+
+
 
 
+# Query Result Cache
+# query_to_dataframe の結果を正規化したSQLごとにメモリとディスク（Parquet）へ保存し、
+# 参照テーブルが更新されるかTTLを過ぎるまで再利用する
+QUERY_CACHE_ENABLED = os.getenv('QUERY_CACHE_ENABLED', 'true').lower() == 'true'
+QUERY_CACHE_DIR = os.getenv('QUERY_CACHE_DIR', f'{DATA_DIR}/query_cache')
+QUERY_CACHE_MEMORY_MAX_BYTES = int(os.getenv('QUERY_CACHE_MEMORY_MAX_BYTES', str(512 * 1024 * 1024)))
+QUERY_CACHE_DISK_MAX_BYTES = int(os.getenv('QUERY_CACHE_DISK_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))
+QUERY_CACHE_TTL_SECONDS = int(os.getenv('QUERY_CACHE_TTL_SECONDS', '3600'))
+# 参照テーブルの最終更新日時を再確認するまでの秒数（その間はテーブル情報を取得しない）
+QUERY_CACHE_METADATA_TTL_SECONDS = int(os.getenv('QUERY_CACHE_METADATA_TTL_SECONDS', '30'))
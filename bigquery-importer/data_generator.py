@@ -1,22 +1,172 @@
 import pandas as pd
-import json
+import numpy as np
 from faker import Faker
 from datetime import datetime, timedelta
 import random
 import os
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ProcessPoolExecutor
 from config import *
+from instrumentation import thread_cpu_seconds
+from output_writers import TableWriter, ShardedTableWriter, get_output_file_name, remove_shard_files, \
+    format_surrogate_ids, ORDER_ITEM_ID_BASE, OUTPUT_FORMATS, COMPRESSIONS
+from value_pools import FakerValuePool, choice, choice_categorical, concat, random_dates, random_datetimes, \
+    random_uuid4, random_ipv4
 
 fake = Faker('ja_JP')  # 日本のデータを生成
-Faker.seed(42)  # 再現可能性のためのシード値設定
+Faker.seed(RANDOM_SEED)  # 再現可能性のためのシード値設定
+random.seed(RANDOM_SEED)
+
+ORDER_STATUSES = ['完了', '処理中', 'キャンセル', '返品']
+PAYMENT_METHODS = ['クレジットカード', '銀行振込', 'コンビニ決済', '代金引換']
+
+PAGES = [
+    '/home', '/products', '/product/{product_id}', '/cart',
+    '/checkout', '/user/profile', '/search', '/category/{category}',
+    '/login', '/register', '/about', '/contact'
+]
+
+GENDERS = ['男性', '女性', 'その他']
+
+# 生成単位 → 書き出すテーブル（外部キーの参照元から順に生成する）
+GENERATION_UNITS = {
+    'users': ('users',),
+    'products': ('products',),
+    'orders': ('orders', 'order_items'),
+    'access_logs': ('access_logs',),
+}
+
+CATEGORIES = ['エレクトロニクス', 'ファッション', '本・雑誌', 'ホーム&キッチン',
+              'スポーツ・アウトドア', '美容・健康', 'おもちゃ・ゲーム', '食品・飲料']
+
+PRODUCT_NAMES = {
+    'エレクトロニクス': ['スマートフォン', 'ノートPC', 'タブレット', 'イヤホン', 'デジタルカメラ'],
+    'ファッション': ['Tシャツ', 'ジーンズ', 'スニーカー', 'バッグ', 'アクセサリー'],
+    '本・雑誌': ['小説', '技術書', '雑誌', 'マンガ', '実用書'],
+    'ホーム&キッチン': ['調理器具', '食器', '掃除用品', 'インテリア', '家電'],
+    'スポーツ・アウトドア': ['ランニングシューズ', 'トレーニングウェア', 'アウトドアグッズ', 'スポーツ用品'],
+    '美容・健康': ['化粧品', 'スキンケア', 'サプリメント', 'ヘアケア'],
+    'おもちゃ・ゲーム': ['ボードゲーム', 'おもちゃ', 'パズル', 'ゲーム'],
+    '食品・飲料': ['お茶', 'コーヒー', 'お菓子', '調味料', '冷凍食品']
+}
+
+PRODUCT_GRADES = ['プレミアム', 'スタンダード', 'ライト', 'プロ']
+
+REFERRERS = [None, 'https://google.com', 'https://yahoo.co.jp', 'direct']
+
+DEVICE_TYPES = ['desktop', 'mobile', 'tablet']
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 14_7_1 like Mac OS X)',
+    'Mozilla/5.0 (Android 11; Mobile; rv:68.0) Gecko/68.0 Firefox/88.0'
+]
+
+
+def _frame_bytes(data):
+    """DataFrameのメモリ使用量（文字列の中身を含む）。DataFrame以外はNone"""
+    if not isinstance(data, pd.DataFrame):
+        return None
+    return int(data.memory_usage(deep=True).sum())
+
+
+def _shard_seed(seed, shard_index):
+    """ベースのシードとシャード番号からシャード固有のシードを導出"""
+    seed_sequence = np.random.SeedSequence(seed, spawn_key=(shard_index,))
+    return int(seed_sequence.generate_state(1)[0])
+
+
+def _shard_ranges(total, num_shards):
+    """total件をnum_shards個に分割し (開始位置, 件数) のリストを返す"""
+    bounds = [total * k // num_shards for k in range(num_shards + 1)]
+    return [(bounds[k], bounds[k + 1] - bounds[k]) for k in range(num_shards)]
+
+
+def _generate_shard(task):
+    """1シャード分の注文・アクセスログを生成してシャード専用のファイルに書き出す（ワーカープロセスで実行）"""
+    shard_index = task['shard_index']
+    chunk_size = task['chunk_size']
+
+    # ワーカーは複数のシャードを順に処理するため、シャードごとに乱数状態を初期化
+    # （pythonエンジンはFaker・random・商品の抽出（DataFrame.sample）でNumPyのグローバルな乱数を使う）
+    fake.seed_instance(task['seed'])
+    random.seed(task['seed'])
+    np.random.seed(task['seed'])
+
+    # 親プロセスと同じエンジンで、ユーザーID・商品IDと同じ表現（整数の代理キーか文字列か）で生成する
+    generator = SampleDataGenerator(engine=task['engine'], seed=task['seed'], output_format=task['output_format'],
+                                    compression=task['compression'], sharded=True, compact=task['compact'])
+    generator.user_ids = task['user_ids']
+    generator.products_df = task['products_df']
+
+    order_start, num_orders = task['order_range']
+    # シャードごとの接頭辞（例: orders/part-00003-00000.csv）で、他のワーカーのファイルと重ならない
+    shard_prefix = f'{shard_index:05d}-'
+    with generator._open_writer('orders', shard_prefix) as orders_writer, \
+            generator._open_writer('order_items', shard_prefix) as items_writer:
+        for orders_chunk, items_chunk in generator.iter_orders_chunks(chunk_size, order_start + 1, num_orders):
+            orders_writer.write(orders_chunk)
+            items_writer.write(items_chunk)
+
+    with generator._open_writer('access_logs', shard_prefix) as logs_writer:
+        for logs_chunk in generator.iter_access_logs_chunks(chunk_size, task['num_logs']):
+            logs_writer.write(logs_chunk)
+
+    counts = {
+        'orders': orders_writer.rows_written,
+        'order_items': items_writer.rows_written,
+        'access_logs': logs_writer.rows_written
+    }
+    uncompressed_bytes = {
+        'orders': orders_writer.uncompressed_bytes,
+        'order_items': items_writer.uncompressed_bytes,
+        'access_logs': logs_writer.uncompressed_bytes
+    }
+    print(f"Shard {shard_index:05d} completed: {counts['orders']} orders, {counts['access_logs']} access logs")
+    return counts, uncompressed_bytes
+
 
 class SampleDataGenerator:
-    def __init__(self):
+    def __init__(self, engine=GENERATOR_ENGINE, seed=RANDOM_SEED, output_format=OUTPUT_FORMAT,
+                 compression=OUTPUT_COMPRESSION, sharded=SHARDED_OUTPUT, compact=COMPACT_DTYPES):
+        if engine not in ('numpy', 'python'):
+            raise ValueError(f"Unknown generator engine: {engine}")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+
+        self.engine = engine
+        self.seed = seed
+        self.output_format = output_format
+        self.compression = compression
+        self.sharded = sharded  # Trueの場合、テーブルを <table>/part-*.<拡張子> のシャードに分けて書き出す
+        # Trueの場合、numpyエンジンのDataFrameをcategory・幅の狭い整数・整数のIDで保持する
+        # （pythonエンジンのIDは 'user_000123' 形式の文字列のため対象外）
+        self.compact = compact and engine == 'numpy'
+        self.rng = np.random.default_rng(seed)
+        self.pools = FakerValuePool(fake, self.rng)
         self.users_df = None
         self.products_df = None
         self.orders_df = None
         self.order_items_df = None
         self.access_logs = []
         
+        # 外部キー用に常駐させるユーザーID（ストリーミング時はusers_dfの代わりに保持）
+        self.user_ids = None
+        self.row_counts = {}
+        self.peak_memory = {}
+        self.table_seconds = {}
+        self.table_cpu_seconds = {}
+        # 他のテーブルと同じ処理で生成され、所要時間・CPU時間・ピークメモリを共有するテーブル → 共有元の生成単位
+        self.shared_measurements = {}
+        self.uncompressed_bytes = {}  # テーブルごとの圧縮前のCSV/NDJSONのバイト数
+        self.frame_bytes = {}  # テーブルごとのDataFrameのメモリ使用量（一括生成時のみ）
+
         # データディレクトリの作成
         os.makedirs(RAW_DATA_DIR, exist_ok=True)
         os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
@@ -25,36 +175,69 @@ class SampleDataGenerator:
         """ユーザーデータの生成"""
         print("Generating users data...")
         
-        users_data = []
-        for i in range(NUM_USERS):
-            user = {
-                'user_id': f'user_{i+1:06d}',
-                'name': fake.name(),
-                'email': fake.email(),
-                'age': random.randint(18, 80),
-                'gender': random.choice(['男性', '女性', 'その他']),
-                'registration_date': fake.date_between(
-                    start_date=datetime.strptime(START_DATE, '%Y-%m-%d'),
-                    end_date=datetime.strptime(END_DATE, '%Y-%m-%d')
-                ),
-                'city': fake.city(),
-                'prefecture': fake.prefecture()
-            }
-            users_data.append(user)
-        
-        self.users_df = pd.DataFrame(users_data)
+        self.users_df = self._build_users_chunk(0, NUM_USERS)
+        self.user_ids = self.users_df['user_id'].to_numpy()
         return self.users_df
+
+    def iter_users_chunks(self, chunk_size=STREAMING_CHUNK_SIZE):
+        """ユーザーデータをchunk_size行ずつ生成（ユーザーIDのみ保持）"""
+        user_id_chunks = []
+        for start in range(0, NUM_USERS, chunk_size):
+            stop = min(start + chunk_size, NUM_USERS)
+            chunk = self._build_users_chunk(start, stop)
+            user_id_chunks.append(chunk['user_id'].to_numpy())
+            yield chunk
+
+        self.user_ids = np.concatenate(user_id_chunks)
+
+    def _build_users_chunk(self, start, stop):
+        """start番目からstop番目までのユーザーをDataFrameで生成"""
+        if self.engine == 'python':
+            return pd.DataFrame([self._build_user(i) for i in range(start, stop)])
+
+        # 値プールとNumPy配列による一括生成
+        size = stop - start
+        user_numbers = np.arange(start + 1, stop + 1)
+        return pd.DataFrame({
+            'user_id': self._ids('user_id', user_numbers),
+            'name': self.pools.sample('name', size),
+            # プールの値は重複するため、ユーザー番号を付けてメールアドレスを一意にする
+            'email': concat(self.pools.sample('user_name', size), user_numbers,
+                            '@', self.pools.sample('free_email_domain', size)),
+            'age': self._narrow(self.rng.integers(18, 80, size=size, endpoint=True), np.int8),
+            'gender': self._choice(GENDERS, size),
+            'registration_date': random_dates(self.rng, START_DATE, END_DATE, size),
+            'city': self.pools.sample('city', size),
+            'prefecture': self._category(self.pools.sample('prefecture', size))
+        })
+
+    def _build_user(self, i):
+        """ユーザー1行分のデータを生成"""
+        return {
+            'user_id': f'user_{i+1:06d}',
+            'name': fake.name(),
+            'email': fake.email(),
+            'age': random.randint(18, 80),
+            'gender': random.choice(GENDERS),
+            'registration_date': fake.date_between(
+                start_date=datetime.strptime(START_DATE, '%Y-%m-%d'),
+                end_date=datetime.strptime(END_DATE, '%Y-%m-%d')
+            ),
+            'city': fake.city(),
+            'prefecture': fake.prefecture()
+        }
     
     def generate_products(self):
         """商品データの生成"""
         print("Generating products data...")
         
-        categories = ['エレクトロニクス', 'ファッション', '本・雑誌', 'ホーム&キッチン', 
-                     'スポーツ・アウトドア', '美容・健康', 'おもちゃ・ゲーム', '食品・飲料']
-        
+        if self.engine == 'numpy':
+            self.products_df = self._build_products_numpy()
+            return self.products_df
+
         products_data = []
         for i in range(NUM_PRODUCTS):
-            category = random.choice(categories)
+            category = random.choice(CATEGORIES)
             product = {
                 'product_id': f'prod_{i+1:06d}',
                 'name': self._generate_product_name(category),
@@ -72,45 +255,68 @@ class SampleDataGenerator:
         self.products_df = pd.DataFrame(products_data)
         return self.products_df
     
+    def _build_products_numpy(self):
+        """値プールとNumPy配列で商品データを一括生成"""
+        rng = self.rng
+        size = NUM_PRODUCTS
+
+        category_idx = rng.integers(0, len(CATEGORIES), size=size)
+        categories = self._from_codes(category_idx, CATEGORIES)
+
+        # カテゴリごとに候補リストから基本商品名を抽出
+        base_names = np.empty(size, dtype=object)
+        for code, category in enumerate(CATEGORIES):
+            mask = category_idx == code
+            base_names[mask] = choice(rng, PRODUCT_NAMES[category], int(mask.sum()))
+
+        names = concat(self.pools.sample('company', size), ' ', base_names, ' ',
+                       choice(rng, PRODUCT_GRADES, size))
+
+        return pd.DataFrame({
+            'product_id': self._ids('product_id', np.arange(1, size + 1)),
+            'name': names,
+            'category': categories,
+            'price': self._narrow(rng.integers(500, 50000, size=size, endpoint=True), np.int32),
+            'created_date': random_dates(rng, START_DATE, END_DATE, size),
+            'brand': self.pools.sample('company', size),
+            'rating': np.round(rng.uniform(3.0, 5.0, size=size), 1)
+        })
+
     def _generate_product_name(self, category):
         """カテゴリに応じた商品名の生成"""
-        product_names = {
-            'エレクトロニクス': ['スマートフォン', 'ノートPC', 'タブレット', 'イヤホン', 'デジタルカメラ'],
-            'ファッション': ['Tシャツ', 'ジーンズ', 'スニーカー', 'バッグ', 'アクセサリー'],
-            '本・雑誌': ['小説', '技術書', '雑誌', 'マンガ', '実用書'],
-            'ホーム&キッチン': ['調理器具', '食器', '掃除用品', 'インテリア', '家電'],
-            'スポーツ・アウトドア': ['ランニングシューズ', 'トレーニングウェア', 'アウトドアグッズ', 'スポーツ用品'],
-            '美容・健康': ['化粧品', 'スキンケア', 'サプリメント', 'ヘアケア'],
-            'おもちゃ・ゲーム': ['ボードゲーム', 'おもちゃ', 'パズル', 'ゲーム'],
-            '食品・飲料': ['お茶', 'コーヒー', 'お菓子', '調味料', '冷凍食品']
-        }
-        base_name = random.choice(product_names[category])
-        return f"{fake.company()} {base_name} {random.choice(['プレミアム', 'スタンダード', 'ライト', 'プロ'])}"
+        base_name = random.choice(PRODUCT_NAMES[category])
+        return f"{fake.company()} {base_name} {random.choice(PRODUCT_GRADES)}"
     
     def generate_orders(self):
         """注文データの生成"""
         print("Generating orders data...")
         
-        if self.users_df is None:
+        if self.user_ids is None:
             raise ValueError("Users data must be generated first")
         
+        self.orders_df, self.order_items_df = self._build_orders_chunk(1, NUM_ORDERS)
+        return self.orders_df, self.order_items_df
+
+    def _build_orders_python(self, first_order_number, num_orders):
+        """注文データを1行ずつ生成（pythonエンジン）"""
         orders_data = []
         order_items_data = []
+        user_ids = self.user_ids.tolist()
         
-        for i in range(NUM_ORDERS):
-            user_id = random.choice(self.users_df['user_id'].tolist())
+        for order_number in range(first_order_number, first_order_number + num_orders):
+            user_id = random.choice(user_ids)
             order_date = fake.date_time_between(
                 start_date=datetime.strptime(START_DATE, '%Y-%m-%d'),
                 end_date=datetime.strptime(END_DATE, '%Y-%m-%d')
             )
             
             order = {
-                'order_id': f'order_{i+1:08d}',
+                'order_id': f'order_{order_number:08d}',
                 'user_id': user_id,
                 'order_date': order_date,
                 'total_amount': 0,  # 後で計算
-                'status': random.choice(['完了', '処理中', 'キャンセル', '返品']),
-                'payment_method': random.choice(['クレジットカード', '銀行振込', 'コンビニ決済', '代金引換'])
+                'status': random.choice(ORDER_STATUSES),
+                'payment_method': random.choice(PAYMENT_METHODS)
             }
             
             # 注文アイテムの生成（1-5個のアイテム）
@@ -123,7 +329,7 @@ class SampleDataGenerator:
                 unit_price = product['price']
                 
                 order_item = {
-                    'order_item_id': f'item_{i+1:08d}_{j+1:02d}',
+                    'order_item_id': f'item_{order_number:08d}_{j+1:02d}',
                     'order_id': order['order_id'],
                     'product_id': product['product_id'],
                     'quantity': quantity,
@@ -135,106 +341,413 @@ class SampleDataGenerator:
             order['total_amount'] = total_amount
             orders_data.append(order)
         
-        self.orders_df = pd.DataFrame(orders_data)
-        self.order_items_df = pd.DataFrame(order_items_data)
-        
-        return self.orders_df, self.order_items_df
+        return pd.DataFrame(orders_data), pd.DataFrame(order_items_data)
+
+    def iter_orders_chunks(self, chunk_size=STREAMING_CHUNK_SIZE, first_order_number=1, num_orders=NUM_ORDERS):
+        """注文データをchunk_size注文ずつ生成し (orders, order_items) を返す"""
+        if self.user_ids is None:
+            raise ValueError("Users data must be generated first")
+
+        for start in range(0, num_orders, chunk_size):
+            chunk_orders = min(chunk_size, num_orders - start)
+            yield self._build_orders_chunk(first_order_number + start, chunk_orders)
+
+    def _build_orders_chunk(self, first_order_number, num_orders):
+        """注文データをNumPy配列でまとめて生成（1行ずつのループなし。pythonエンジンは1行ずつ生成）"""
+        if self.engine == 'python':
+            return self._build_orders_python(first_order_number, num_orders)
+
+        rng = self.rng
+
+        product_ids = self.products_df['product_id'].to_numpy()
+        product_prices = self.products_df['price'].to_numpy(dtype=np.int64)
+
+        # 注文単位の属性を一括で抽選
+        order_dates = random_datetimes(rng, START_DATE, END_DATE, num_orders)
+        user_idx = rng.integers(0, len(self.user_ids), size=num_orders)
+        status_idx = rng.integers(0, len(ORDER_STATUSES), size=num_orders)
+        payment_idx = rng.integers(0, len(PAYMENT_METHODS), size=num_orders)
+        num_items = rng.integers(1, 5, size=num_orders, endpoint=True)
+
+        # 注文アイテム単位の属性を一括で抽選（1-5個のアイテム）
+        num_order_items = int(num_items.sum())
+        item_offsets = np.cumsum(num_items) - num_items
+        item_order_idx = np.repeat(np.arange(num_orders), num_items)
+        item_seq = np.arange(num_order_items) - np.repeat(item_offsets, num_items) + 1
+        product_idx = rng.integers(0, len(product_ids), size=num_order_items)
+        quantities = rng.integers(1, 3, size=num_order_items, endpoint=True)
+        unit_prices = product_prices[product_idx]
+
+        # 注文ごとの合計金額（アイテム行のグループ集計）
+        total_amount = np.add.reduceat(unit_prices * quantities, item_offsets)
+
+        order_numbers = np.arange(first_order_number, first_order_number + num_orders)
+        order_ids = self._ids('order_id', order_numbers)
+
+        orders_df = pd.DataFrame({
+            'order_id': order_ids,
+            'user_id': self.user_ids[user_idx],
+            'order_date': pd.to_datetime(order_dates),
+            'total_amount': self._narrow(total_amount, np.int32),
+            'status': self._from_codes(status_idx, ORDER_STATUSES),
+            'payment_method': self._from_codes(payment_idx, PAYMENT_METHODS)
+        })
+
+        order_items_df = pd.DataFrame({
+            'order_item_id': self._ids('order_item_id',
+                                       order_numbers[item_order_idx] * ORDER_ITEM_ID_BASE + item_seq),
+            'order_id': order_ids[item_order_idx],
+            'product_id': product_ids[product_idx],
+            'quantity': self._narrow(quantities, np.int8),
+            'unit_price': self._narrow(unit_prices, np.int32)
+        })
+
+        return orders_df, order_items_df
     
     def generate_access_logs(self):
         """アクセスログデータの生成"""
         print("Generating access logs data...")
         
-        if self.users_df is None:
+        if self.user_ids is None:
             raise ValueError("Users data must be generated first")
         
-        pages = [
-            '/home', '/products', '/product/{product_id}', '/cart', 
-            '/checkout', '/user/profile', '/search', '/category/{category}',
-            '/login', '/register', '/about', '/contact'
-        ]
+        access_logs_data = self._build_access_logs_chunk(NUM_ACCESS_LOGS)
         
-        user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-            'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36',
-            'Mozilla/5.0 (iPhone; CPU iPhone OS 14_7_1 like Mac OS X)',
-            'Mozilla/5.0 (Android 11; Mobile; rv:68.0) Gecko/68.0 Firefox/88.0'
-        ]
+        self.access_logs = access_logs_data
+        return access_logs_data
         
-        access_logs_data = []
+    def iter_access_logs_chunks(self, chunk_size=STREAMING_CHUNK_SIZE, num_logs=NUM_ACCESS_LOGS):
+        """アクセスログをchunk_size件ずつ生成"""
+        if self.user_ids is None:
+            raise ValueError("Users data must be generated first")
         
-        for i in range(NUM_ACCESS_LOGS):
-            user_id = random.choice(self.users_df['user_id'].tolist()) if random.random() > 0.1 else None
+        for start in range(0, num_logs, chunk_size):
+            chunk_logs = min(chunk_size, num_logs - start)
+            yield self._build_access_logs_chunk(chunk_logs)
+
+    def _build_access_logs_chunk(self, num_logs):
+        """アクセスログをnum_logs件生成（NumPyエンジンは列単位のDataFrame、pythonエンジンは辞書のリストで返す）"""
+        if self.engine == 'python':
+            build_log = self._access_log_builder()
+            return [build_log() for _ in range(num_logs)]
+
+        # 値プールとNumPy配列による列単位の一括生成
+        rng = self.rng
+
+        user_ids = self.user_ids[rng.integers(0, len(self.user_ids), size=num_logs)]
+        anonymous = rng.random(num_logs) <= 0.1
+        if self.compact:
+            user_ids = pd.arrays.IntegerArray(user_ids.astype(np.int32), anonymous)
+        else:
+            user_ids = user_ids.astype(object)
+            user_ids[anonymous] = None
+
+        timestamps = random_datetimes(rng, START_DATE, END_DATE, num_logs, unit='us')
+
+        page_urls = choice(rng, PAGES, num_logs)
+        product_pages = page_urls == '/product/{product_id}'
+        category_pages = page_urls == '/category/{category}'
+        product_ids = self.products_df['product_id'].to_numpy()
+        page_urls[product_pages] = concat('/product/', format_surrogate_ids(
+            'product_id', product_ids[rng.integers(0, len(product_ids), size=int(product_pages.sum()))]))
+        page_urls[category_pages] = concat(
+            '/category/', choice(rng, self.products_df['category'].unique(), int(category_pages.sum())))
+
+        columns = {
+            'timestamp': np.datetime_as_string(timestamps, unit='us').astype(object),
+            'user_id': user_ids,
+            'page_url': page_urls,
+            'session_id': random_uuid4(rng, num_logs),
+            'user_agent': self._choice(USER_AGENTS, num_logs),
+            'ip_address': random_ipv4(rng, num_logs),
+            'referrer': self._choice(REFERRERS, num_logs),
+            'device_type': self._choice(DEVICE_TYPES, num_logs)
+        }
+        return pd.DataFrame(columns)
+
+    def _access_log_builder(self):
+        """アクセスログ1件を生成する関数を返す（参照リストは一度だけ作成）"""
+        user_ids = self.user_ids.tolist()
+        product_ids = self.products_df['product_id'].tolist()
+        categories = self.products_df['category'].unique()
+
+        def build_log():
+            user_id = random.choice(user_ids) if random.random() > 0.1 else None
             timestamp = fake.date_time_between(
                 start_date=datetime.strptime(START_DATE, '%Y-%m-%d'),
                 end_date=datetime.strptime(END_DATE, '%Y-%m-%d')
             )
             
-            page_url = random.choice(pages)
+            page_url = random.choice(PAGES)
             if '{product_id}' in page_url:
-                page_url = page_url.replace('{product_id}', random.choice(self.products_df['product_id'].tolist()))
+                page_url = page_url.replace('{product_id}', random.choice(product_ids))
             elif '{category}' in page_url:
-                page_url = page_url.replace('{category}', random.choice(self.products_df['category'].unique()))
+                page_url = page_url.replace('{category}', random.choice(categories))
             
-            log = {
+            return {
                 'timestamp': timestamp.isoformat(),
                 'user_id': user_id,
                 'page_url': page_url,
                 'session_id': fake.uuid4(),
-                'user_agent': random.choice(user_agents),
+                'user_agent': random.choice(USER_AGENTS),
                 'ip_address': fake.ipv4(),
-                'referrer': random.choice([None, 'https://google.com', 'https://yahoo.co.jp', 'direct']),
-                'device_type': random.choice(['desktop', 'mobile', 'tablet'])
+                'referrer': random.choice(REFERRERS),
+                'device_type': random.choice(DEVICE_TYPES)
             }
-            access_logs_data.append(log)
         
-        self.access_logs = access_logs_data
-        return access_logs_data
+        return build_log
     
     def save_to_files(self):
         """データをファイルに保存"""
         print("Saving data to files...")
         
-        # CSV ファイルとして保存
-        if self.users_df is not None:
-            self.users_df.to_csv(f'{RAW_DATA_DIR}/users.csv', index=False, encoding='utf-8')
-            print(f"Saved users data: {len(self.users_df)} records")
-        
-        if self.products_df is not None:
-            self.products_df.to_csv(f'{RAW_DATA_DIR}/products.csv', index=False, encoding='utf-8')
-            print(f"Saved products data: {len(self.products_df)} records")
-        
-        if self.orders_df is not None:
-            self.orders_df.to_csv(f'{RAW_DATA_DIR}/orders.csv', index=False, encoding='utf-8')
-            print(f"Saved orders data: {len(self.orders_df)} records")
-        
-        if self.order_items_df is not None:
-            self.order_items_df.to_csv(f'{RAW_DATA_DIR}/order_items.csv', index=False, encoding='utf-8')
-            print(f"Saved order items data: {len(self.order_items_df)} records")
-        
-        # JSON ファイルとして保存（アクセスログ）
-        if self.access_logs:
-            with open(f'{RAW_DATA_DIR}/access_logs.json', 'w', encoding='utf-8') as f:
-                for log in self.access_logs:
-                    f.write(json.dumps(log, ensure_ascii=False) + '\n')
-            print(f"Saved access logs: {len(self.access_logs)} records")
+        # CSV（アクセスログはNDJSON）またはParquetファイルとして保存
+        tables = [
+            ('users', self.users_df, 'users data'),
+            ('products', self.products_df, 'products data'),
+            ('orders', self.orders_df, 'orders data'),
+            ('order_items', self.order_items_df, 'order items data'),
+            ('access_logs', self.access_logs if len(self.access_logs) else None, 'access logs')
+        ]
+
+        for table_name, data, label in tables:
+            if data is None:
+                continue
+            with self._open_writer(table_name) as writer:
+                writer.write(data)
+            self.uncompressed_bytes[table_name] = writer.uncompressed_bytes
+            print(f"Saved {label}: {len(data)} records")
     
-    def generate_all_data(self):
+    def generate_all_data(self, streaming=STREAMING_GENERATION, parallel=PARALLEL_GENERATION):
         """全てのサンプルデータを生成"""
+        if parallel:
+            return self.generate_all_data_parallel()
+        if streaming:
+            return self.generate_all_data_streaming()
+
         print("Starting sample data generation...")
         
-        self.generate_users()
-        self.generate_products()
-        self.generate_orders()
-        self.generate_access_logs()
+        with self._measure_table('users'):
+            self.generate_users()
+        with self._measure_table('products'):
+            self.generate_products()
+        with self._measure_table('orders'):
+            self.generate_orders()
+        self._share_measurement('order_items', 'orders')
+        with self._measure_table('access_logs'):
+            self.generate_access_logs()
         self.save_to_files()
-        
+
+        tables = {
+            'users': self.users_df,
+            'products': self.products_df,
+            'orders': self.orders_df,
+            'order_items': self.order_items_df,
+            'access_logs': self.access_logs
+        }
+        self.row_counts = {table_name: len(data) for table_name, data in tables.items()}
+        self.frame_bytes = {table_name: _frame_bytes(data) for table_name, data in tables.items()
+                            if _frame_bytes(data) is not None}
+
         print("\nData generation completed!")
-        print(f"Users: {len(self.users_df)}")
-        print(f"Products: {len(self.products_df)}")
-        print(f"Orders: {len(self.orders_df)}")
-        print(f"Order Items: {len(self.order_items_df)}")
-        print(f"Access Logs: {len(self.access_logs)}")
+        for table_name, count in self.row_counts.items():
+            frame_bytes = self.frame_bytes.get(table_name)
+            memory_text = f" ({frame_bytes / 1024 / 1024:.1f} MiB in memory)" if frame_bytes is not None else ""
+            print(f"{table_name}: {count}{memory_text}")
+
+    def generate_all_data_streaming(self, chunk_size=STREAMING_CHUNK_SIZE):
+        """
+        全てのサンプルデータをチャンク単位で生成し、そのままファイルに追記
+
+        メモリに常駐するのは外部キーに必要なユーザーIDと商品テーブルのみ。
+        テーブルごとのピークメモリ（tracemalloc計測）をself.peak_memoryに記録する。
+        """
+        print(f"Starting streaming sample data generation (chunk size: {chunk_size})...")
+
+        # パイプラインの計測で既に有効な場合はそのまま使う
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+        try:
+            for unit in GENERATION_UNITS:
+                self.generate_table_file(unit, chunk_size)
+        finally:
+            if started_tracemalloc:
+                tracemalloc.stop()
+
+        print("\nData generation completed!")
+        for table_name, count in self.row_counts.items():
+            peak = self.peak_memory.get(table_name)
+            peak_text = f" (peak memory: {peak / 1024 / 1024:.1f} MiB)" if peak is not None else ""
+            print(f"{table_name}: {count}{peak_text}")
+
+        return self.row_counts
+
+    def generate_table_file(self, unit, chunk_size=STREAMING_CHUNK_SIZE):
+        """
+        生成単位（GENERATION_UNITSのキー）1つ分のテーブルをチャンク単位で生成し、ファイルに書き出す
+
+        外部キーの参照元のため、GENERATION_UNITSの順（users → products → orders → access_logs）に呼び出すこと。
+
+        Returns:
+            tuple: 書き出したテーブル名（ordersはorder_itemsも同時に書き出す）
+        """
+        if unit not in GENERATION_UNITS:
+            raise ValueError(f"Unknown generation unit: {unit}")
+
+        with self._measure_table(unit), ExitStack() as stack:
+            writers = {table_name: stack.enter_context(self._open_writer(table_name))
+                       for table_name in GENERATION_UNITS[unit]}
+            if unit == 'users':
+                for users_chunk in self.iter_users_chunks(chunk_size):
+                    writers['users'].write(users_chunk)
+            elif unit == 'products':
+                # 小さなディメンションなので一括生成して保持
+                writers['products'].write(self.generate_products())
+            elif unit == 'orders':
+                # 同じチャンクから2ファイルに追記
+                for orders_chunk, items_chunk in self.iter_orders_chunks(chunk_size):
+                    writers['orders'].write(orders_chunk)
+                    writers['order_items'].write(items_chunk)
+            else:
+                for logs_chunk in self.iter_access_logs_chunks(chunk_size):
+                    writers['access_logs'].write(logs_chunk)
+
+        for table_name, writer in writers.items():
+            self.row_counts[table_name] = writer.rows_written
+            self.uncompressed_bytes[table_name] = writer.uncompressed_bytes
+            if table_name != unit:
+                # order_itemsはordersと同じチャンクで生成されるため計測値も共通
+                self._share_measurement(table_name, unit)
+
+        return GENERATION_UNITS[unit]
+
+    def generate_all_data_parallel(self, num_shards=GENERATION_SHARDS, max_workers=GENERATION_WORKERS,
+                                   chunk_size=STREAMING_CHUNK_SIZE):
+        """
+        注文・アクセスログをnum_shards個のシャードに分割し、プロセスプールで並列生成
+
+        各シャードはRANDOM_SEEDとシャード番号から導出したシードを使い、
+        専用のファイル（例: orders/part-00003-00000.csv）に書き出す。出力は常にシャード形式になる。
+        シャード数が同じであれば、ワーカー数に関係なく出力は同一になる。
+        """
+        print(f"Starting parallel sample data generation "
+              f"({num_shards} shards, {max_workers} workers)...")
+
+        # ユーザー・商品は外部キーの参照元なので親プロセスで生成
+        self.sharded = True
+        with self._measure_table('users'):
+            self.generate_users()
+        with self._measure_table('products'):
+            self.generate_products()
+        self.save_to_files()
+
+        order_ranges = _shard_ranges(NUM_ORDERS, num_shards)
+        log_ranges = _shard_ranges(NUM_ACCESS_LOGS, num_shards)
+        # ワーカーは自分のシャードだけを書き換えるため、前回の実行のシャードはここでまとめて削除
+        for table_name in ('orders', 'order_items', 'access_logs'):
+            remove_shard_files(table_name, self.output_format, self.compression)
+        tasks = [
+            {
+                'shard_index': shard_index,
+                'seed': _shard_seed(self.seed, shard_index),
+                'engine': self.engine,
+                'user_ids': self.user_ids,
+                'products_df': self.products_df,
+                'order_range': order_ranges[shard_index],
+                'num_logs': log_ranges[shard_index][1],
+                'chunk_size': chunk_size,
+                'output_format': self.output_format,
+                'compression': self.compression,
+                'compact': self.compact
+            }
+            for shard_index in range(num_shards)
+        ]
+
+        self.row_counts = {
+            'users': len(self.users_df),
+            'products': len(self.products_df),
+            'orders': 0,
+            'order_items': 0,
+            'access_logs': 0
+        }
+        # シャードのテーブルはワーカーで並行して生成されるため、プール全体の所要時間を各テーブルに記録する
+        # （ピークメモリはワーカープロセスのため計測できない）
+        with self._measure_table('shards'), ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for shard_counts, shard_bytes in executor.map(_generate_shard, tasks):
+                for table_name, count in shard_counts.items():
+                    self.row_counts[table_name] += count
+                    self.uncompressed_bytes[table_name] = \
+                        self.uncompressed_bytes.get(table_name, 0) + shard_bytes[table_name]
+        self.peak_memory.pop('shards', None)
+        for table_name in ('orders', 'order_items', 'access_logs'):
+            self._share_measurement(table_name, 'shards')
+
+        print("\nData generation completed!")
+        for table_name, count in self.row_counts.items():
+            print(f"{table_name}: {count}")
+
+        return self.row_counts
+
+    def _open_writer(self, table_name, shard_prefix=''):
+        """テーブルの出力ファイル（output_formatに応じた拡張子。シャード形式ではOUTPUT_SHARD_SIZEごとに分割）へのライターを作成"""
+        if self.sharded:
+            return ShardedTableWriter(table_name, self.output_format, self.compression, shard_prefix=shard_prefix)
+        file_name = get_output_file_name(table_name, self.output_format, self.compression)
+        return TableWriter(table_name, f'{RAW_DATA_DIR}/{file_name}', self.output_format, self.compression)
+
+    def _ids(self, column_name, numbers):
+        """IDカラムの値（compactの場合は整数の代理キー、それ以外は 'user_000123' 形式の文字列）"""
+        if self.compact:
+            return np.asarray(numbers).astype(np.int64 if column_name == 'order_item_id' else np.int32)
+        return np.asarray(format_surrogate_ids(column_name, np.asarray(numbers)), dtype=object)
+
+    def _narrow(self, values, dtype):
+        """compactの場合、整数の配列を値の範囲に合う幅の型にする"""
+        return values.astype(dtype) if self.compact else values
+
+    def _choice(self, values, size):
+        """候補リストからsize件をランダムに抽出（compactの場合はCategorical）"""
+        if self.compact:
+            return choice_categorical(self.rng, values, size)
+        return choice(self.rng, values, size)
+
+    def _from_codes(self, codes, values):
+        """候補のインデックスの配列を値に変換（compactの場合はCategorical）"""
+        if self.compact:
+            return pd.Categorical.from_codes(codes, categories=values)
+        return np.array(values, dtype=object)[codes]
+
+    def _category(self, values):
+        """値プールから抽出した種類の少ない文字列の配列（compactの場合はCategorical）"""
+        return pd.Categorical(values) if self.compact else values
+
+    @contextmanager
+    def _measure_table(self, table_name):
+        """
+        テーブル単位の所要時間・CPU時間（このスレッドと子プロセスの分）と、
+        tracemalloc有効時はピークメモリ（ピークをリセットして計測）を記録
+        """
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        start_time = time.perf_counter()
+        start_cpu = thread_cpu_seconds()
+        try:
+            yield
+        finally:
+            self.table_seconds[table_name] = time.perf_counter() - start_time
+            self.table_cpu_seconds[table_name] = thread_cpu_seconds() - start_cpu
+            if tracing:
+                self.peak_memory[table_name] = tracemalloc.get_traced_memory()[1]
+
+    def _share_measurement(self, table_name, unit):
+        """unitの計測値をtable_nameにも記録し、共有していることをshared_measurementsに残す"""
+        self.table_seconds[table_name] = self.table_seconds[unit]
+        self.table_cpu_seconds[table_name] = self.table_cpu_seconds[unit]
+        if unit in self.peak_memory:
+            self.peak_memory[table_name] = self.peak_memory[unit]
+        self.shared_measurements[table_name] = unit
 
 if __name__ == "__main__":
     generator = SampleDataGenerator()
@@ -0,0 +1,174 @@
+import ast
+import glob
+import os
+import re
+from config import *
+
+# モデルを読み込むディレクトリ（dbt/models 配下、参照される側から順に）
+MODEL_LAYERS = ('staging', 'intermediate', 'marts')
+
+JINJA_CALL = re.compile(r'\{\{\s*(\w+)\((.*?)\)\s*\}\}', re.DOTALL)
+JINJA_THIS = re.compile(r'\{\{\s*this\s*\}\}')
+# {% if is_incremental() %} ... {% else %} ... {% endif %}（入れ子は非対応）
+INCREMENTAL_BLOCK = re.compile(
+    r'\{%-?\s*if\s+is_incremental\(\)\s*-?%\}(.*?)(?:\{%-?\s*else\s*-?%\}(.*?))?\{%-?\s*endif\s*-?%\}', re.DOTALL)
+JINJA_TAG = re.compile(r'\{%.*?%\}', re.DOTALL)
+
+
+class DbtModel:
+    """dbtモデル1件（SQLファイル）の定義"""
+
+    def __init__(self, name, layer, path, sql):
+        self.name = name
+        self.layer = layer
+        self.path = path
+        self.sql = sql
+        self.config = {}
+        self.refs = []
+        self.sources = []
+
+        for function, args, kwargs in _jinja_calls(sql):
+            if function == 'config':
+                self.config.update(kwargs)
+            elif function == 'ref' and args[0] not in self.refs:
+                self.refs.append(args[0])
+            elif function == 'source' and (args[0], args[1]) not in self.sources:
+                self.sources.append((args[0], args[1]))
+
+    @property
+    def materialized(self):
+        return self.config.get('materialized', 'view')  # dbtのデフォルト
+
+    @property
+    def partition_field(self):
+        """partition_byで指定したパーティション列（指定なしの場合はNone）"""
+        return (self.config.get('partition_by') or {}).get('field')
+
+
+def load_models(project_dir=DBT_PROJECT_DIR, layers=MODEL_LAYERS):
+    """
+    dbtプロジェクトのモデルを依存関係の順（参照先のモデルが先）で読み込む
+
+    Returns:
+        dict: モデル名 → DbtModel
+    """
+    models = {}
+    for layer in layers:
+        for path in sorted(glob.glob(f'{project_dir}/models/{layer}/*.sql')):
+            with open(path, encoding='utf-8') as f:
+                sql = f.read()
+            name = os.path.splitext(os.path.basename(path))[0]
+            models[name] = DbtModel(name, layer, path, sql)
+
+    ordered = {}
+
+    def visit(name, path=()):
+        if name in ordered:
+            return
+        if name in path:
+            raise ValueError(f"Circular reference between dbt models: {' -> '.join(path + (name,))}")
+        for ref in models[name].refs:
+            if ref not in models:
+                raise ValueError(f"Model '{name}' references unknown model '{ref}'")
+            visit(ref, path + (name,))
+        ordered[name] = models[name]
+
+    for name in models:
+        visit(name)
+    return ordered
+
+
+def load_project_vars(project_dir=DBT_PROJECT_DIR):
+    """dbt_project.yml の vars（1階層の key: value のみ）を読み込む"""
+    project_vars = {}
+    in_vars = False
+    with open(f'{project_dir}/dbt_project.yml', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            if not line[0].isspace():
+                in_vars = line.startswith('vars:')
+                continue
+            match = re.match(r'\s+(\w+):\s*(.+?)\s*$', line)
+            if in_vars and match:
+                value = match.group(2).strip('\'"')
+                project_vars[match.group(1)] = int(value) if value.isdigit() else value
+    return project_vars
+
+
+def render_model(model, models, source_relation, ref_relation, incremental=False, project_vars=None):
+    """
+    モデルのSQLのJinja（config / ref / source / var / this / is_incremental()）を展開
+
+    Args:
+        model: 展開するDbtModel
+        models: load_models()の結果
+        source_relation: (ソース名, テーブル名) → SQL上の参照を返す関数
+        ref_relation: 参照先のDbtModel → SQL上の参照を返す関数（{{ this }} にも使う）
+        incremental: Trueの場合は {% if is_incremental() %} の中身を、Falseの場合は {% else %} の中身を残す
+        project_vars: var()の値（省略時はdbt_project.ymlのvars）
+
+    Returns:
+        str: 実行可能なSQL
+    """
+    if project_vars is None:
+        project_vars = load_project_vars(os.path.dirname(os.path.dirname(os.path.dirname(model.path))))
+
+    def replace_block(match):
+        return match.group(1) if incremental else (match.group(2) or '')
+
+    def replace_call(match):
+        function, args, kwargs = _parse_call(match.group(1), match.group(2))
+        if function == 'config':
+            return ''
+        if function == 'ref':
+            return ref_relation(models[args[0]])
+        if function == 'source':
+            return source_relation(args[0], args[1])
+        if function == 'var' and (args[0] in project_vars or len(args) > 1):
+            return str(project_vars.get(args[0], args[1] if len(args) > 1 else None))
+        raise ValueError(f"Unsupported Jinja call in {model.path}: {match.group(0)}")
+
+    sql = INCREMENTAL_BLOCK.sub(replace_block, model.sql)
+    unsupported = JINJA_TAG.search(sql)
+    if unsupported:
+        raise ValueError(f"Unsupported Jinja tag in {model.path}: {unsupported.group(0)}")
+
+    sql = JINJA_THIS.sub(lambda match: ref_relation(model), sql)
+    return JINJA_CALL.sub(replace_call, sql).strip()
+
+
+def render_for_bigquery(model, models, existing_tables=None):
+    """
+    BigQueryでそのまま実行・ドライランできるSQLに展開（incrementalモデルは全件で作り直す場合のSQL）
+
+    ソースはローデータのデータセットのテーブル、table / incrementalモデルはdbtの出力データセットのテーブルを参照し、
+    viewモデルはサブクエリとして埋め込む（ビューを作成する前でも、実行時と同じ読み取り量を見積もれる）。
+
+    Args:
+        existing_tables: dbtの出力データセットに作成済みのテーブル名。指定した場合、まだ作成されていない
+            table / incrementalモデルも全件で作り直す場合のSQLをサブクエリとして埋め込む（省略時は全て作成済みとみなす）
+    """
+    def source_relation(source_name, table_name):
+        return f'`{GCP_PROJECT_ID}.{BIGQUERY_DATASET}.{table_name}`'
+
+    def ref_relation(ref_model):
+        if ref_model.materialized == 'view' or (existing_tables is not None and ref_model.name not in existing_tables):
+            # 行末のコメントで閉じ括弧が無効にならないよう改行で囲む
+            return f'(\n{render_for_bigquery(ref_model, models, existing_tables)}\n)'
+        return f'`{GCP_PROJECT_ID}.{DBT_TARGET_DATASET}.{ref_model.name}`'
+
+    return render_model(model, models, source_relation, ref_relation)
+
+
+def _jinja_calls(sql):
+    for match in JINJA_CALL.finditer(sql):
+        yield _parse_call(match.group(1), match.group(2))
+
+
+def _parse_call(function, arguments):
+    """Jinja呼び出しの引数をリテラルとして解釈"""
+    call = ast.parse(f'f({arguments})', mode='eval').body
+    args = [ast.literal_eval(arg) for arg in call.args]
+    kwargs = {keyword.arg: ast.literal_eval(keyword.value) for keyword in call.keywords}
+    return function, args, kwargs
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+dbtモデルのスキャン量見積もりスクリプト
+staging / intermediate / marts の各モデルをBigQueryでドライランし、読み取りバイト数の多い順に表示
+（incrementalモデルは全件で作り直す場合の読み取り量で見積もる）
+"""
+
+import argparse
+import json
+import sys
+from bigquery_client import BigQueryClient
+from dbt_models import MODEL_LAYERS, load_models, render_for_bigquery
+from config import *
+
+
+def main(layers=MODEL_LAYERS, maximum_bytes_billed=QUERY_MAXIMUM_BYTES_BILLED, output=None):
+    """
+    dbtモデルごとのスキャン量を見積もって順位付け
+
+    viewモデル（staging）と、まだ作成されていないtable / incrementalモデル（intermediate）は
+    参照するマートのクエリに埋め込んで見積もるため、dbtを実行する前のデータセットでも読み取り量がわかる。
+    incrementalモデルは全件で作り直す場合（初回・--full-refresh）のSQLをドライランするため、
+    差分の実行より大きい上限の見積もりになる。
+
+    Returns:
+        bool: 全モデルの見積もりに成功し、上限を超えるモデルがない場合True
+    """
+    print("=== dbt Model Scan Cost Estimation ===\n")
+
+    models = load_models()
+    bigquery_client = BigQueryClient(query_cache=False, maximum_bytes_billed=maximum_bytes_billed)
+    existing_tables = bigquery_client.list_table_names(DBT_TARGET_DATASET)
+    not_built = [model.name for model in models.values()
+                 if model.materialized != 'view' and model.name not in existing_tables]
+    if not_built:
+        print(f"Not yet built in {DBT_TARGET_DATASET} (inlined into the models that reference them): "
+              f"{', '.join(not_built)}\n")
+
+    estimates = []
+    failed = []
+    for model in models.values():
+        if model.layer not in layers:
+            continue
+        try:
+            estimate = bigquery_client.estimate_query(render_for_bigquery(model, models, existing_tables))
+        except Exception as e:
+            print(f"❌ Dry run failed for {model.name}: {e}")
+            failed.append(model.name)
+            continue
+        estimates.append({'model': model.name, 'layer': model.layer, **estimate})
+
+    estimates.sort(key=lambda estimate: estimate['bytes_processed'], reverse=True)
+
+    print(f"{'rank':>4}  {'model':<28} {'layer':<8} {'MiB scanned':>12} {'USD':>10}")
+    for rank, estimate in enumerate(estimates, 1):
+        marker = '  ⚠️  exceeds limit' if estimate['exceeds_limit'] else ''
+        print(f"{rank:>4}  {estimate['model']:<28} {estimate['layer']:<8} "
+              f"{estimate['bytes_processed'] / 1024 / 1024:>12.2f} {estimate['estimated_cost_usd']:>10.6f}{marker}")
+
+    total_bytes = sum(estimate['bytes_processed'] for estimate in estimates)
+    print(f"\nTotal: {total_bytes / 1024 / 1024:.2f} MiB scanned, "
+          f"{sum(estimate['estimated_cost_usd'] for estimate in estimates):.6f} USD")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(estimates, f, ensure_ascii=False, indent=2)
+        print(f"Estimates written to {output}")
+
+    over_limit = [estimate['model'] for estimate in estimates if estimate['exceeds_limit']]
+    if over_limit:
+        print(f"❌ {len(over_limit)} model(s) exceed the limit of {maximum_bytes_billed} bytes: {', '.join(over_limit)}")
+    return not failed and not over_limit
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="dbt Model Scan Cost Estimation")
+    parser.add_argument(
+        '--layer', dest='layers', action='append', choices=MODEL_LAYERS,
+        help="見積もるモデルのディレクトリ（複数指定可、デフォルト: staging・intermediate・marts の全て）")
+    parser.add_argument(
+        '--maximum-bytes-billed', type=int, default=QUERY_MAXIMUM_BYTES_BILLED,
+        help="超えたモデルを失敗とするバイト数（デフォルト: config.QUERY_MAXIMUM_BYTES_BILLED、0で無制限）")
+    parser.add_argument(
+        '--output',
+        help="見積もり結果を書き出すJSONファイルのパス")
+    args = parser.parse_args()
+    success = main(layers=args.layers or MODEL_LAYERS, maximum_bytes_billed=args.maximum_bytes_billed,
+                   output=args.output)
+    sys.exit(0 if success else 1)
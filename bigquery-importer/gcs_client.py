@@ -1,18 +1,52 @@
-from google.cloud import storage
-from google.cloud.exceptions import NotFound
+from concurrent.futures import ThreadPoolExecutor
+import base64
 import os
+import time
 from config import *
+from transport import get_shared_transport
+
+
+COMPOSE_MAX_SOURCES = 32  # GCSのcompose 1回で結合できる最大オブジェクト数
+
+CONTENT_TYPES = {
+    '.csv': 'text/csv',
+    '.json': 'application/x-ndjson',
+    '.parquet': 'application/vnd.apache.parquet',
+    # gzipファイルはContent-Encoding: gzipを付けず、圧縮ファイルそのものとして保存する。
+    # Content-Encodingを付けるとGCSが読み出し時に展開（decompressive transcoding）するため
+    '.gz': 'application/gzip',
+}
+
+
+def get_content_type(file_path):
+    """ファイルの拡張子からアップロード時のContent-Typeを判定"""
+    return CONTENT_TYPES.get(os.path.splitext(file_path)[1], 'application/octet-stream')
 
 
 class GCSClient:
     """Google Cloud Storage専用クライアント"""
 
-    def __init__(self):
-        self.storage_client = storage.Client(project=GCP_PROJECT_ID)
+    def __init__(self, max_workers=UPLOAD_MAX_WORKERS, storage_client=None, transport=None):
+        # 並列アップロードの全スレッドがTransportのコネクションプール（BigQueryClientと共有）を使い回す
+        # アップロード・compose・オブジェクトの確認はライブラリの再試行を無効にし（retry=None）、
+        # 一時的なエラーの再試行はTransportで行う（再試行の回数を数え、期限を揃えるため）
+        # storage_clientを渡すとそれを使う（ベンチマークでのローカルの代替バケット等）
+        # google.cloud.storageはクライアントを作成するときに読み込む（importだけのCLIの起動を速くする）
+        self.max_workers = max_workers
+        self.transport = transport or get_shared_transport()
+        if storage_client is None:
+            from google.cloud import storage
+            storage_client = storage.Client(project=GCP_PROJECT_ID, credentials=self.transport.credentials,
+                                            _http=self.transport.session)
+        self.storage_client = storage_client
         self.bucket = None
+        self.upload_stats = []
+        self.generations = {}  # GCSパス → アップロードしたオブジェクトの世代番号
 
     def setup_gcs_bucket(self):
         """GCSバケットの作成またはアクセス確認"""
+        from google.cloud.exceptions import NotFound
+
         try:
             self.bucket = self.storage_client.bucket(GCS_BUCKET_NAME)
             self.bucket.reload()  # バケットが存在するかチェック
@@ -30,13 +64,225 @@ class GCSClient:
             raise ValueError(
                 "GCS bucket not initialized. Call setup_gcs_bucket() first.")
 
+        size_bytes = os.path.getsize(local_file_path)
+        if size_bytes >= COMPOSITE_UPLOAD_THRESHOLD:
+            return self.upload_large_file_to_gcs(local_file_path, gcs_file_path)
+
+        start_time = time.perf_counter()
         blob = self.bucket.blob(gcs_file_path)
-        blob.upload_from_filename(local_file_path)
-        print(
-            f"Uploaded {local_file_path} to gs://{GCS_BUCKET_NAME}/{gcs_file_path}")
+        self.transport.call('upload', blob.upload_from_filename, local_file_path,
+                            content_type=get_content_type(local_file_path), retry=None)
+        elapsed = time.perf_counter() - start_time
 
+        self._record_upload(local_file_path, gcs_file_path, size_bytes, elapsed, blob.generation)
         return f"gs://{GCS_BUCKET_NAME}/{gcs_file_path}"
 
+    def upload_large_file_to_gcs(self, local_file_path, gcs_file_path,
+                                 part_size=COMPOSITE_PART_SIZE, max_workers=COMPOSITE_UPLOAD_WORKERS):
+        """
+        大きなファイルを範囲ごとに分割して並列アップロードし、サーバー側で1つのオブジェクトに結合
+
+        パートは一時オブジェクト（<gcs_file_path>.parts/00000 ...）として保存される。
+        既にアップロード済みでサイズとCRC32Cが一致するパートは再送しないため、
+        途中で失敗しても再実行時は失敗したパートだけがアップロードされる。
+        """
+        if not self.bucket:
+            raise ValueError(
+                "GCS bucket not initialized. Call setup_gcs_bucket() first.")
+
+        start_time = time.perf_counter()
+        size_bytes = os.path.getsize(local_file_path)
+        parts_prefix = f"{gcs_file_path}.parts/"
+        parts = [
+            (f"{parts_prefix}{index:05d}", offset, min(part_size, size_bytes - offset))
+            for index, offset in enumerate(range(0, size_bytes, part_size))
+        ]
+
+        # アップロード済みのパートを確認（前回の実行の続きから再開）
+        uploaded = {blob.name: blob for blob in self.transport.call(
+            'list_blobs', lambda: list(self.bucket.list_blobs(prefix=parts_prefix, retry=None)))}
+        pending = [
+            part for part in parts
+            if not self._is_part_uploaded(uploaded.get(part[0]), local_file_path, part[1], part[2])
+        ]
+        if len(pending) < len(parts):
+            print(f"Resuming upload of {local_file_path}: "
+                  f"{len(parts) - len(pending)}/{len(parts)} parts already uploaded")
+
+        for attempt in range(COMPOSITE_UPLOAD_RETRIES + 1):
+            if not pending:
+                break
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    (part, executor.submit(self._upload_part, local_file_path, *part))
+                    for part in pending
+                ]
+                failed = []
+                for part, future in futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"⚠️  Part upload failed ({part[0]}, attempt {attempt + 1}): {e}")
+                        failed.append(part)
+            pending = failed
+
+        if pending:
+            raise RuntimeError(
+                f"Failed to upload {len(pending)} parts of {local_file_path}. "
+                f"Re-run to resume the remaining parts.")
+
+        # サーバー側で結合し、一時オブジェクトを削除
+        part_blobs = [self.bucket.blob(name) for name, _, _ in parts]
+        destination_blob = self.bucket.blob(gcs_file_path)
+        destination_blob.content_type = get_content_type(local_file_path)
+        temporary_blobs = self._compose_parts(part_blobs, destination_blob, parts_prefix)
+        self.bucket.delete_blobs(temporary_blobs, on_error=lambda blob: None)
+
+        elapsed = time.perf_counter() - start_time
+        self._record_upload(local_file_path, gcs_file_path, size_bytes, elapsed, destination_blob.generation)
+        return f"gs://{GCS_BUCKET_NAME}/{gcs_file_path}"
+
+    def _upload_part(self, local_file_path, part_name, offset, length):
+        """ファイルの指定範囲を一時オブジェクトとしてアップロード（再試行のたびにファイルを開き直す）"""
+        def upload():
+            with open(local_file_path, 'rb') as f:
+                f.seek(offset)
+                self.bucket.blob(part_name).upload_from_file(f, size=length, rewind=False, retry=None)
+
+        self.transport.call('upload_part', upload)
+
+    @staticmethod
+    def _is_part_uploaded(blob, local_file_path, offset, length):
+        """アップロード済みのパートがローカルの範囲と一致するか（サイズとCRC32Cで確認）"""
+        import google_crc32c
+
+        if blob is None or blob.size != length:
+            return False
+
+        checksum = google_crc32c.Checksum()
+        with open(local_file_path, 'rb') as f:
+            f.seek(offset)
+            remaining = length
+            while remaining > 0:
+                data = f.read(min(remaining, 8 * 1024 * 1024))
+                checksum.update(data)
+                remaining -= len(data)
+
+        return blob.crc32c == base64.b64encode(checksum.digest()).decode('ascii')
+
+    def _compose_parts(self, part_blobs, destination_blob, parts_prefix):
+        """
+        パートをdestination_blobに結合し、削除対象の一時オブジェクトのリストを返す
+
+        GCSのcomposeは1回あたり最大32オブジェクトのため、それを超える場合は段階的に結合する。
+        """
+        temporary_blobs = list(part_blobs)
+        level = 0
+        while len(part_blobs) > COMPOSE_MAX_SOURCES:
+            next_level = []
+            for i in range(0, len(part_blobs), COMPOSE_MAX_SOURCES):
+                intermediate = self.bucket.blob(
+                    f"{parts_prefix}compose-{level}-{i // COMPOSE_MAX_SOURCES:05d}")
+                self.transport.call('compose', intermediate.compose, part_blobs[i:i + COMPOSE_MAX_SOURCES],
+                                    retry=None)
+                next_level.append(intermediate)
+            temporary_blobs.extend(next_level)
+            part_blobs = next_level
+            level += 1
+
+        self.transport.call('compose', destination_blob.compose, part_blobs, retry=None)
+        return temporary_blobs
+
+    def get_generation(self, gcs_file_path):
+        """GCS上のオブジェクトの現在の世代番号を返す（存在しない場合はNone）"""
+        if not self.bucket:
+            raise ValueError(
+                "GCS bucket not initialized. Call setup_gcs_bucket() first.")
+
+        blob = self.transport.call('get_blob', self.bucket.get_blob, gcs_file_path, retry=None)
+        return blob.generation if blob else None
+
+    def _record_upload(self, local_file_path, gcs_file_path, size_bytes, elapsed, generation):
+        """アップロード1件分のスループットと世代番号を記録・表示"""
+        self.generations[gcs_file_path] = generation
+        throughput = size_bytes / elapsed / 1024 / 1024 if elapsed > 0 else 0.0
+        self.upload_stats.append({
+            'local_path': local_file_path,
+            'gcs_path': gcs_file_path,
+            'bytes': size_bytes,
+            'seconds': elapsed,
+            'mib_per_second': throughput
+        })
+        print(
+            f"Uploaded {local_file_path} to gs://{GCS_BUCKET_NAME}/{gcs_file_path} "
+            f"({size_bytes / 1024 / 1024:.1f} MiB in {elapsed:.2f}s, {throughput:.1f} MiB/s)")
+
+    def upload_files_to_gcs(self, files, max_workers=None, manifest=None, force=False):
+        """
+        複数ファイルをスレッドプールで並列にGCSへアップロード
+
+        Args:
+            files: (ローカルパス, GCSパス) のリスト
+            max_workers: 同時アップロード数（デフォルトはコンストラクタの値）
+            manifest: RunManifest。指定時は内容とGCS上の世代番号が記録と一致するファイルを省略し、
+                アップロード結果を記録する
+            force: Trueの場合、マニフェストに関係なく全ファイルをアップロード
+
+        Returns:
+            dict: ローカルパス（filesで指定したもの） → GCS URI
+        """
+        if not self.bucket:
+            raise ValueError(
+                "GCS bucket not initialized. Call setup_gcs_bucket() first.")
+
+        max_workers = max_workers or self.max_workers
+        start_time = time.perf_counter()
+
+        gcs_uris = {}
+        if manifest and not force:
+            # シャードが多い場合に備え、GCS上の世代番号の確認もアップロードと同じ同時数で行う
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                generations = list(executor.map(self.get_generation, [gcs_path for _, gcs_path in files]))
+            unchanged = [
+                (local_path, gcs_path) for (local_path, gcs_path), generation in zip(files, generations)
+                if manifest.is_uploaded(local_path, generation)
+            ]
+            for local_path, gcs_path in unchanged:
+                print(f"Skipping unchanged file: {local_path}")
+                gcs_uris[local_path] = f"gs://{GCS_BUCKET_NAME}/{gcs_path}"
+            files = [file for file in files if file not in unchanged]
+
+        failed_files = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                local_path: executor.submit(self.upload_to_gcs, local_path, gcs_path)
+                for local_path, gcs_path in files
+            }
+            # 一部が失敗しても残りのアップロードは完了させる
+            for local_path, future in futures.items():
+                try:
+                    gcs_uris[local_path] = future.result()
+                except Exception as e:
+                    print(f"❌ Upload failed for {local_path}: {e}")
+                    failed_files.append(local_path)
+
+        # 成功した分を記録し、再実行時は失敗したファイルだけをアップロードする
+        if manifest:
+            for local_path, gcs_path in files:
+                if local_path in gcs_uris:
+                    manifest.record_upload(local_path, gcs_uris[local_path], self.generations[gcs_path])
+            manifest.save()
+
+        if failed_files:
+            raise RuntimeError(f"Failed to upload: {', '.join(failed_files)}")
+
+        elapsed = time.perf_counter() - start_time
+        total_bytes = sum(os.path.getsize(local_path) for local_path, _ in files)
+        print(f"Uploaded {len(files)} files ({total_bytes / 1024 / 1024:.1f} MiB) "
+              f"in {elapsed:.2f}s with {max_workers} workers")
+
+        return gcs_uris
+
 
 if __name__ == "__main__":
     # テスト用コード
@@ -0,0 +1,140 @@
+import json
+import os
+from config import *
+from bigquery_schemas import BigQuerySchemas
+from output_writers import TableWriter, get_output_file_name, find_table_files
+
+# 日付カラムを持たず、親テーブルの新規行に紐づく行だけを取り込む子テーブル
+# 子テーブル名 → (親テーブル名, 結合キー)
+CHILD_TABLES = {
+    'order_items': ('orders', 'order_id'),
+}
+
+
+class WatermarkStore:
+    """テーブルごとに取り込み済みの最新パーティション日付（high-watermark）を保存するストア"""
+
+    def __init__(self, path=WATERMARK_FILE):
+        self.path = path
+        self.watermarks = {}
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.watermarks = json.load(f)
+
+    def get(self, table_name):
+        """取り込み済みの最新パーティション日付（'YYYY-MM-DD'）を返す。未取り込みならNone"""
+        return self.watermarks.get(table_name)
+
+    def set(self, table_name, partition_date):
+        """最新パーティション日付を更新（save()を呼ぶまでファイルには書き込まない）"""
+        self.watermarks[table_name] = partition_date
+
+    def clear(self, table_name):
+        """ウォーターマークを削除し、次回の差分ロードを全件での作り直しにする（save()を呼ぶまでファイルには書き込まない）"""
+        self.watermarks.pop(table_name, None)
+
+    def save(self):
+        """ウォーターマークをファイルに保存"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.watermarks, f, ensure_ascii=False, indent=2)
+
+
+def get_incremental_file_name(table_name, output_format=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION):
+    """差分ファイル名を返す（例: orders.incremental.csv、gzip圧縮時は orders.incremental.csv.gz）"""
+    base_name, extension = get_output_file_name(table_name, output_format, compression=compression).split('.', 1)
+    return f'{base_name}.incremental.{extension}'
+
+
+def is_incremental_table(table_name):
+    """差分ロードの対象テーブルか（パーティション列を持つテーブルとその子テーブル）"""
+    return BigQuerySchemas.get_partition_field(table_name) is not None or table_name in CHILD_TABLES
+
+
+def get_watermark_table(table_name):
+    """ウォーターマークを管理するテーブル名を返す（子テーブルは親テーブルのウォーターマークに従う）"""
+    return CHILD_TABLES[table_name][0] if table_name in CHILD_TABLES else table_name
+
+
+def prepare_incremental_files(watermark_store, output_format=OUTPUT_FORMAT, chunk_size=STREAMING_CHUNK_SIZE,
+                              compression=OUTPUT_COMPRESSION):
+    """
+    ウォーターマークより新しい日付パーティションの行だけを抽出した差分ファイルを作成
+
+    生成済みファイル（シャード形式では全シャード）をchunk_size行ずつ読み、パーティション列の日付（UTC）が
+    ウォーターマークより後の行を差分ファイルに書き出す。子テーブルは親テーブルの
+    新規行のキーに一致する行を書き出す。gzip圧縮時は圧縮されたファイルを読み、差分ファイルも圧縮する。
+
+    ウォーターマークの日付の行は取り込み済みとみなすため、その日に後から届いた行は取り込まれない。
+    差分ロードには行が出揃った日までのデータを渡すこと（遅れて届いた行は全件ロードで取り込み直す）。
+
+    Returns:
+        dict: テーブル名 → {'file_name', 'rows', 'uncompressed_bytes', 'watermark', 'max_partition'}
+    """
+    import pandas as pd
+
+    parent_keys = {parent: key for parent, key in CHILD_TABLES.values()}
+    new_keys = {}
+    results = {}
+
+    for table_name in BigQuerySchemas.get_available_tables():
+        if not is_incremental_table(table_name):
+            continue
+
+        source_paths = [f'{RAW_DATA_DIR}/{source_file}'
+                        for source_file in find_table_files(table_name, output_format, compression)]
+        if not source_paths:
+            raise FileNotFoundError(f"No generated file for {table_name} in {RAW_DATA_DIR}")
+        file_name = get_incremental_file_name(table_name, output_format, compression)
+        partition_field = BigQuerySchemas.get_partition_field(table_name)
+        watermark = watermark_store.get(get_watermark_table(table_name))
+        max_partition = watermark
+
+        with TableWriter(table_name, f'{RAW_DATA_DIR}/{file_name}', output_format, compression) as writer:
+            for chunk in _read_files_chunks(source_paths, table_name, output_format, chunk_size):
+                if partition_field:
+                    partitions = pd.to_datetime(chunk[partition_field], utc=True).dt.strftime('%Y-%m-%d')
+                    mask = partitions > watermark if watermark else pd.Series(True, index=chunk.index)
+                    chunk = chunk[mask]
+                    if len(chunk):
+                        max_partition = max(max_partition or '', partitions[mask].max())
+                else:
+                    parent_table, key = CHILD_TABLES[table_name]
+                    chunk = chunk[chunk[key].isin(new_keys.get(parent_table, set()))]
+
+                if table_name in parent_keys:
+                    new_keys.setdefault(table_name, set()).update(chunk[parent_keys[table_name]])
+
+                writer.write(chunk)
+
+        results[table_name] = {
+            'file_name': file_name,
+            'rows': writer.rows_written,
+            'uncompressed_bytes': writer.uncompressed_bytes,
+            'watermark': watermark,
+            'max_partition': max_partition if partition_field else None
+        }
+
+    return results
+
+
+def _read_files_chunks(paths, table_name, output_format, chunk_size):
+    """複数の生成済みファイルを順にDataFrameのチャンクとして読み込む"""
+    for path in paths:
+        yield from _read_chunks(path, table_name, output_format, chunk_size)
+
+
+def _read_chunks(path, table_name, output_format, chunk_size):
+    """生成済みファイルをDataFrameのチャンクとして読み込む（.gz はpandasが拡張子から判定して展開）"""
+    import pandas as pd
+
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif table_name == 'access_logs':
+        # 日時文字列はそのまま保持して書き戻す
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False, convert_dates=False)
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str)
@@ -0,0 +1,253 @@
+import cProfile
+import json
+import os
+import pstats
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from config import *
+
+METRICS_FORMATS = ('json', 'prometheus')
+PROMETHEUS_PREFIX = 'bigquery_importer'
+
+
+class PipelineMetrics:
+    """
+    パイプラインのステージ・テーブルごとの計測値を記録するクラス
+
+    ステージ単位で経過時間・CPU時間（子プロセス分を含む）・プロセスの最大RSS・
+    tracemallocのピークメモリ（trace_memory有効時）を自動計測し、
+    行数・バイト数はステージ内でrecord_table()により記録する。
+    profile_dirを指定すると、ステージごとのcProfileの結果（.prof と上位関数の .txt）を保存する。
+    """
+
+    def __init__(self, trace_memory=METRICS_TRACE_MEMORY, profile_dir=None):
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.run_id = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        self.started_at = time.time()
+        self.finished_at = None
+        self.success = None
+        self.stages = {}
+        self.transport = None  # TransportStats.snapshot()（HTTPリクエスト・接続・再試行の回数）
+        self._started_tracemalloc = False
+
+    def start(self):
+        """計測を開始（メモリ計測が有効ならtracemallocを開始）"""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def finish(self, success):
+        """計測を終了して実行結果を記録"""
+        self.finished_at = time.time()
+        self.success = success
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name):
+        """ステージの経過時間・CPU時間・ピークメモリを計測するコンテキスト"""
+        stage = self.stages.setdefault(name, {'tables': {}})
+        profiler = cProfile.Profile() if self.profile_dir else None
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+
+        start_time = time.perf_counter()
+        start_cpu = _cpu_seconds()
+        if profiler:
+            profiler.enable()
+        try:
+            yield stage
+        finally:
+            if profiler:
+                profiler.disable()
+            stage['wall_seconds'] = time.perf_counter() - start_time
+            stage['cpu_seconds'] = _cpu_seconds() - start_cpu
+
+            # ステージ内でテーブル単位にピークをリセットした場合に備え、テーブルのピークとの最大値を取る
+            peaks = [table['peak_memory_bytes'] for table in stage['tables'].values()
+                     if table.get('peak_memory_bytes') is not None]
+            if tracing:
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            stage['peak_memory_bytes'] = max(peaks) if peaks else None
+            stage['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # LinuxではKiB単位
+
+            self._summarize_stage(stage)
+            if profiler:
+                self._dump_profile(name, profiler)
+
+    def record_table(self, stage_name, table_name, rows=None, size_bytes=None, seconds=None,
+                     peak_memory=None, cpu_seconds=None, **details):
+        """ステージ内のテーブル1件分の計測値を記録（Noneの項目は記録しない）"""
+        stage = self.stages.setdefault(stage_name, {'tables': {}})
+        table = stage['tables'].setdefault(table_name, {})
+        values = {
+            'rows': rows,
+            'bytes': size_bytes,
+            'wall_seconds': seconds,
+            'cpu_seconds': cpu_seconds,
+            'peak_memory_bytes': peak_memory,
+            **details
+        }
+        table.update({key: value for key, value in values.items() if value is not None})
+        if table.get('rows') is not None and table.get('wall_seconds'):
+            table['rows_per_second'] = table['rows'] / table['wall_seconds']
+
+    def record_transport(self, snapshot):
+        """GCS・BigQueryとのHTTP通信のカウンタ（TransportStats.snapshot()）を記録"""
+        self.transport = snapshot
+
+    def to_dict(self):
+        """計測結果をJSONにできるdictで返す"""
+        return {
+            'run_id': self.run_id,
+            'started_at': datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(timespec='seconds'),
+            'duration_seconds': (self.finished_at or time.time()) - self.started_at,
+            'success': self.success,
+            'stages': self.stages,
+            'transport': self.transport
+        }
+
+    def write(self, metrics_format=METRICS_FORMAT, metrics_dir=METRICS_DIR):
+        """計測結果をJSONまたはPrometheusのtextfile形式で書き出し、ファイルパスを返す"""
+        if metrics_format not in METRICS_FORMATS:
+            raise ValueError(f"Unknown metrics format: {metrics_format}")
+
+        os.makedirs(metrics_dir, exist_ok=True)
+        if metrics_format == 'json':
+            path = f'{metrics_dir}/pipeline_metrics.json'
+            content = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        else:
+            path = f'{metrics_dir}/pipeline_metrics.prom'
+            content = self.to_prometheus()
+
+        # node_exporterのtextfile collectorが書きかけのファイルを読まないよう、一時ファイルから置き換える
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temporary_path, path)
+        return path
+
+    def to_prometheus(self):
+        """計測結果をPrometheusのテキスト形式で返す"""
+        metrics = {
+            'run_success': ('gauge', 'Whether the last pipeline run succeeded', [
+                ({}, 1 if self.success else 0)]),
+            'run_timestamp_seconds': ('gauge', 'Start time of the last pipeline run', [
+                ({}, self.started_at)]),
+            'run_duration_seconds': ('gauge', 'Wall-clock time of the last pipeline run', [
+                ({}, (self.finished_at or time.time()) - self.started_at)]),
+        }
+
+        stage_fields = [
+            ('wall_seconds', 'stage_wall_seconds', 'Wall-clock time per pipeline stage'),
+            ('cpu_seconds', 'stage_cpu_seconds', 'CPU time per pipeline stage including child processes'),
+            ('rows', 'stage_rows', 'Rows processed per pipeline stage'),
+            ('rows_per_second', 'stage_rows_per_second', 'Rows processed per second per pipeline stage'),
+            ('bytes', 'stage_bytes', 'Bytes written or uploaded per pipeline stage'),
+            ('peak_memory_bytes', 'stage_peak_memory_bytes', 'Peak traced Python memory per pipeline stage'),
+            ('max_rss_bytes', 'stage_max_rss_bytes', 'Maximum resident set size of the process at the end of each stage'),
+        ]
+        table_fields = [
+            ('wall_seconds', 'table_wall_seconds', 'Wall-clock time per table and stage'),
+            ('cpu_seconds', 'table_cpu_seconds', 'CPU time per table and stage including child processes'),
+            ('rows', 'table_rows', 'Rows processed per table and stage'),
+            ('rows_per_second', 'table_rows_per_second', 'Rows processed per second per table and stage'),
+            ('bytes', 'table_bytes', 'Bytes written or uploaded per table and stage'),
+            ('peak_memory_bytes', 'table_peak_memory_bytes', 'Peak traced Python memory per table and stage'),
+        ]
+
+        for key, name, help_text in stage_fields:
+            samples = [({'stage': stage_name}, stage[key])
+                       for stage_name, stage in self.stages.items() if stage.get(key) is not None]
+            metrics[name] = ('gauge', help_text, samples)
+        for key, name, help_text in table_fields:
+            samples = [({'stage': stage_name, 'table': table_name}, table[key])
+                       for stage_name, stage in self.stages.items()
+                       for table_name, table in stage['tables'].items() if table.get(key) is not None]
+            metrics[name] = ('gauge', help_text, samples)
+
+        if self.transport:
+            metrics['http_requests_total'] = ('counter', 'HTTP requests sent to GCS and BigQuery', [
+                ({}, self.transport['requests'])])
+            metrics['http_new_connections_total'] = ('counter', 'HTTP connections opened (the rest reused a pooled connection)', [
+                ({}, self.transport['new_connections'])])
+            metrics['http_retries_total'] = ('counter', 'Retries after transient errors per operation', [
+                ({'operation': operation}, count) for operation, count in self.transport['retries'].items()])
+            metrics['http_retries_exhausted_total'] = ('counter', 'Operations that failed after retrying until the deadline', [
+                ({'operation': operation}, count) for operation, count in self.transport['retries_exhausted'].items()])
+
+        lines = []
+        for name, (metric_type, help_text, samples) in metrics.items():
+            if not samples:
+                continue
+            full_name = f'{PROMETHEUS_PREFIX}_{name}'
+            lines.append(f'# HELP {full_name} {help_text}')
+            lines.append(f'# TYPE {full_name} {metric_type}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+                lines.append(f'{full_name}{{{label_text}}} {value}' if label_text else f'{full_name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def print_summary(self):
+        """ステージごとの計測結果を表示"""
+        print("📊 Pipeline metrics:")
+        for stage_name, stage in self.stages.items():
+            if 'wall_seconds' not in stage:
+                continue
+            details = [f"wall {stage['wall_seconds']:.2f}s", f"cpu {stage['cpu_seconds']:.2f}s"]
+            if stage.get('rows') is not None:
+                details.append(f"{stage['rows']} rows")
+            if stage.get('rows_per_second'):
+                details.append(f"{stage['rows_per_second']:,.0f} rows/s")
+            if stage.get('bytes') is not None:
+                details.append(f"{stage['bytes'] / 1024 / 1024:.1f} MiB")
+            if stage.get('peak_memory_bytes') is not None:
+                details.append(f"peak {stage['peak_memory_bytes'] / 1024 / 1024:.1f} MiB")
+            details.append(f"max RSS {stage['max_rss_bytes'] / 1024 / 1024:.1f} MiB")
+            print(f"  {stage_name}: {', '.join(details)}")
+        if self.transport and self.transport['requests']:
+            transport = self.transport
+            print(f"  http: {transport['requests']} requests, {transport['new_connections']} new connections "
+                  f"({transport['reused_connections'] / transport['requests']:.0%} reused), "
+                  f"{sum(transport['retries'].values())} retries")
+
+    @staticmethod
+    def _summarize_stage(stage):
+        """テーブルごとの行数・バイト数をステージの合計にまとめる"""
+        for key in ('rows', 'bytes'):
+            values = [table[key] for table in stage['tables'].values() if table.get(key) is not None]
+            if values:
+                stage[key] = sum(values)
+        if stage.get('rows') is not None and stage['wall_seconds'] > 0:
+            stage['rows_per_second'] = stage['rows'] / stage['wall_seconds']
+
+    def _dump_profile(self, stage_name, profiler):
+        """cProfileの結果を .prof（pstats/snakeviz用）と累積時間上位の .txt で保存"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base_path = f'{self.profile_dir}/{self.run_id}-{stage_name}'
+        profiler.dump_stats(f'{base_path}.prof')
+        with open(f'{base_path}.txt', 'w', encoding='utf-8') as f:
+            pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(30)
+        print(f"Profile for {stage_name} saved to {base_path}.prof")
+
+
+def thread_cpu_seconds():
+    """
+    呼び出したスレッドと終了済みの子プロセスのCPU時間の合計
+
+    パイプライン実行で並行するアップロード等の他のスレッドの分を含まないため、テーブル単位の計測に使う。
+    """
+    times = os.times()
+    return time.thread_time() + times.children_user + times.children_system
+
+
+def _cpu_seconds():
+    """このプロセスと終了済みの子プロセス（並列生成のワーカー等）のCPU時間の合計"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
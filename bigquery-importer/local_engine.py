@@ -0,0 +1,231 @@
+import re
+import time
+from config import *
+from bigquery_schemas import BigQuerySchemas
+from dbt_models import load_models, render_model
+from output_writers import get_output_file_name, find_table_files
+
+# BigQueryの型 → DuckDBの型（BigQueryのTIMESTAMPはUTCのため、UTCの値をそのまま持つTIMESTAMPにする）
+DUCKDB_TYPES = {
+    'STRING': 'VARCHAR',
+    'INTEGER': 'BIGINT',
+    'FLOAT': 'DOUBLE',
+    'DATE': 'DATE',
+    'TIMESTAMP': 'TIMESTAMP',
+}
+
+
+def to_duckdb_sql(sql):
+    """dbtモデルで使っているBigQuery固有の構文をDuckDBの構文に置き換える"""
+    sql = re.sub(r'\b(CURRENT_TIMESTAMP|CURRENT_DATE)\s*\(\s*\)', r'\1', sql, flags=re.IGNORECASE)
+    sql = _replace_function(sql, 'DATE_SUB', lambda argument: '({} - {})'.format(*argument.rsplit(',', 1)))
+    return _replace_function(sql, 'TIMESTAMP', lambda argument: f'CAST({argument} AS TIMESTAMP)')
+
+
+def _replace_function(sql, function, replacement):
+    """function(...) の呼び出しを、括弧の対応を取りながら replacement(引数) に置き換える"""
+    pattern = re.compile(rf'\b{function}\s*\(', re.IGNORECASE)
+    result = []
+    position = 0
+
+    for match in pattern.finditer(sql):
+        if match.start() < position:
+            continue
+        depth, end = 1, match.end()
+        while depth:
+            if end >= len(sql):
+                raise ValueError(f"Unbalanced parentheses after {function}(")
+            if sql[end] in '\'"':
+                # 文字列リテラル内の括弧は数えない
+                end = sql.index(sql[end], end + 1)
+            depth += {'(': 1, ')': -1}.get(sql[end], 0)
+            end += 1
+        result.append(sql[position:match.start()])
+        result.append(replacement(to_duckdb_sql(sql[match.end():end - 1])))
+        position = end
+
+    result.append(sql[position:])
+    return ''.join(result)
+
+
+class LocalDbtRunner:
+    """
+    dbtのstaging / martsモデルを、RAW_DATA_DIRの生成済みファイルに対して組み込みのDuckDBで実行するクラス
+
+    ソースはBigQuerySchemasの型でDuckDBのテーブルに読み込み（ソース名のスキーマ）、
+    モデルはdbtと同じくview / tableとしてDBT_TARGET_DATASETのスキーマに作成する。
+    incrementalモデルは、テーブルが既にあれば増分のSQLで作り直した日付パーティションだけを置き換える
+    （BigQueryのinsert_overwriteと同じ）。
+    GCPへのアクセスなしで、モデルのロジックと実行時間を確認できる。
+    """
+
+    def __init__(self, output_format=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION, database=':memory:',
+                 project_dir=DBT_PROJECT_DIR):
+        import duckdb
+
+        self.output_format = output_format
+        self.compression = compression
+        self.connection = duckdb.connect(database)
+        self.connection.execute("SET TimeZone = 'UTC'")  # BigQueryと同じくDATE()等をUTCで評価
+        self.models = load_models(project_dir)
+        self.source_schema = BIGQUERY_DATASET
+        self.target_schema = DBT_TARGET_DATASET
+
+        for schema in (self.source_schema, self.target_schema):
+            self.connection.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+
+    def load_sources(self, select=None):
+        """
+        モデルが参照するソーステーブルを生成済みファイルから読み込む
+
+        Args:
+            select: 実行するモデル名のリスト（省略時は全モデル）。これらのモデルが参照するソースだけを読み込む
+
+        Returns:
+            list: テーブルごとの結果（name, rows, seconds）
+        """
+        names = self._with_dependencies(select) if select else list(self.models)
+        source_tables = sorted({table for name in names for _, table in self.models[name].sources})
+        results = []
+
+        for table_name in source_tables:
+            start_time = time.perf_counter()
+            self.connection.execute(
+                f'CREATE OR REPLACE TABLE "{self.source_schema}"."{table_name}" AS {self._source_query(table_name)}')
+            rows = self.connection.execute(
+                f'SELECT COUNT(*) FROM "{self.source_schema}"."{table_name}"').fetchone()[0]
+            results.append({'name': table_name, 'rows': rows, 'seconds': time.perf_counter() - start_time})
+
+        return results
+
+    def run_models(self, select=None, full_refresh=False):
+        """
+        モデルを依存関係の順に作成
+
+        Args:
+            select: 実行するモデル名のリスト（省略時は全モデル）。参照先のモデルも合わせて作成する
+            full_refresh: Trueの場合、incrementalモデルも全件で作り直す
+
+        Returns:
+            list: モデルごとの結果（name, layer, materialized, rows, seconds, error）。
+                参照先のモデルが失敗したモデルは実行せずにエラーとする
+        """
+        names = self._with_dependencies(select) if select else list(self.models)
+        failed = set()
+        results = []
+
+        for name in names:
+            model = self.models[name]
+            result = {'name': name, 'layer': model.layer, 'materialized': model.materialized,
+                      'incremental': False, 'rows': None, 'seconds': None, 'error': None}
+            failed_refs = [ref for ref in model.refs if ref in failed]
+            if failed_refs:
+                result['error'] = f"Skipped because {', '.join(failed_refs)} failed"
+                failed.add(name)
+                results.append(result)
+                continue
+
+            start_time = time.perf_counter()
+            try:
+                if model.materialized == 'incremental' and not full_refresh and self._exists(name):
+                    self._insert_overwrite(model)
+                    result['incremental'] = True
+                else:
+                    relation = 'VIEW' if model.materialized == 'view' else 'TABLE'
+                    self.connection.execute(
+                        f'CREATE OR REPLACE {relation} {self._relation(name)} AS {self.compile(name)}')
+                if model.materialized != 'view':
+                    result['rows'] = self.connection.execute(f'SELECT COUNT(*) FROM {self._relation(name)}').fetchone()[0]
+            except Exception as e:
+                result['error'] = str(e)
+                failed.add(name)
+            result['seconds'] = time.perf_counter() - start_time
+            results.append(result)
+
+        return results
+
+    def compile(self, name, incremental=False):
+        """モデルをDuckDBで実行できるSQLに展開"""
+        sql = render_model(
+            self.models[name], self.models,
+            source_relation=lambda source_name, table_name: f'"{self.source_schema}"."{table_name}"',
+            ref_relation=lambda ref_model: self._relation(ref_model.name),
+            incremental=incremental
+        )
+        return to_duckdb_sql(sql)
+
+    def _insert_overwrite(self, model):
+        """
+        増分のSQLの結果で、既存のテーブルの該当する日付パーティションを置き換える
+
+        dbt-bigqueryと同じく、_dbt_max_partition を既存のテーブルの最新パーティションとして展開する。
+        """
+        if model.config.get('incremental_strategy') != 'insert_overwrite' or not model.partition_field:
+            raise ValueError(f"Only insert_overwrite with partition_by is supported locally: {model.name}")
+
+        relation = self._relation(model.name)
+        partition_field = f'"{model.partition_field}"'
+        max_partition = self.connection.execute(f'SELECT MAX({partition_field}) FROM {relation}').fetchone()[0]
+        max_partition_literal = f"DATE '{max_partition}'" if max_partition else 'CAST(NULL AS DATE)'
+        sql = re.sub(r'\b_dbt_max_partition\b', max_partition_literal, self.compile(model.name, incremental=True))
+
+        self.connection.execute(f'CREATE OR REPLACE TEMP TABLE new_partitions AS {sql}')
+        self.connection.execute(
+            f'DELETE FROM {relation} WHERE {partition_field} IN (SELECT DISTINCT {partition_field} FROM new_partitions)')
+        self.connection.execute(f'INSERT INTO {relation} SELECT * FROM new_partitions')
+        self.connection.execute('DROP TABLE new_partitions')
+
+    def _exists(self, name):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = ? AND table_name = ?',
+            [self.target_schema, name]).fetchone()[0] > 0
+
+    def fetch(self, name):
+        """モデルの結果をArrowテーブルで取得"""
+        return self.connection.execute(f'SELECT * FROM {self._relation(name)}').fetch_arrow_table()
+
+    def export(self, name, path):
+        """モデルの結果をParquetファイルに書き出す"""
+        self.connection.execute(f"COPY (SELECT * FROM {self._relation(name)}) TO '{path}' (FORMAT PARQUET)")
+
+    def _relation(self, name):
+        return f'"{self.target_schema}"."{name}"'
+
+    def _with_dependencies(self, select):
+        """選択したモデルと、その参照先のモデルを依存関係の順で返す"""
+        unknown = [name for name in select if name not in self.models]
+        if unknown:
+            raise ValueError(f"Unknown dbt model: {', '.join(unknown)}")
+
+        required = set()
+        pending = list(select)
+        while pending:
+            name = pending.pop()
+            if name not in required:
+                required.add(name)
+                pending.extend(self.models[name].refs)
+        return [name for name in self.models if name in required]
+
+    def _source_query(self, table_name):
+        """生成済みファイル（シャード形式では全シャード）をスキーマの型で読み込むSELECT文"""
+        extension = get_output_file_name(table_name, self.output_format, compression=self.compression).split('.', 1)[1]
+        paths = [f'{RAW_DATA_DIR}/{file_name}'
+                 for file_name in find_table_files(table_name, self.output_format, self.compression)]
+        if not paths:
+            raise FileNotFoundError(f"No generated file for {table_name} in {RAW_DATA_DIR}")
+
+        schema = BigQuerySchemas.get_schema_for_table(table_name)
+        path_list = '[' + ', '.join(f"'{path}'" for path in paths) + ']'
+        if self.output_format == 'parquet':
+            reader = f'read_parquet({path_list})'
+        elif extension.startswith('json'):
+            columns = ', '.join(f"'{field.name}': 'VARCHAR'" for field in schema)
+            reader = f"read_json({path_list}, format='newline_delimited', columns={{{columns}}})"
+        else:
+            reader = f'read_csv({path_list}, header=true, all_varchar=true)'
+
+        # CSV/NDJSONは文字列として読み、BigQueryのロードと同じ型に変換する
+        # （Parquetのタイムスタンプ（UTC）もタイムゾーンなしのUTCの値にそろえる）
+        columns = ', '.join(
+            f'CAST("{field.name}" AS {DUCKDB_TYPES[field.field_type]}) AS "{field.name}"' for field in schema)
+        return f'SELECT {columns} FROM {reader}'
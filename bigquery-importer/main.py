@@ -5,16 +5,25 @@
 """
 
 from inspect import _void
+import argparse
 import os
 import sys
-from data_generator import SampleDataGenerator
+from functools import partial
 from gcs_client import GCSClient
 from bigquery_client import BigQueryClient
 from bigquery_schemas import BigQuerySchemas
+from output_writers import find_table_files, OUTPUT_FORMATS, COMPRESSIONS
+from incremental import WatermarkStore, prepare_incremental_files, is_incremental_table, get_watermark_table
+from manifest import RunManifest
+from instrumentation import PipelineMetrics, METRICS_FORMATS
+from scheduler import TaskScheduler
+from transport import get_shared_transport
 from config import *
 
 
-def main():
+def main(output_format=OUTPUT_FORMAT, incremental=False, force=False, profile=False,
+         metrics_format=METRICS_FORMAT, trace_memory=METRICS_TRACE_MEMORY, compression=OUTPUT_COMPRESSION,
+         pipelined=PIPELINED_EXECUTION):
     """
     パイプラインのメイン処理
 
@@ -27,115 +36,467 @@ def main():
     3. データファイルのGCSアップロード
     4. GCSからBigQueryへのデータロード
 
+    Args:
+        output_format: 'csv'（アクセスログはNDJSON）または 'parquet'
+        incremental: Trueの場合、ウォーターマークより新しい日付パーティションだけを
+            日付パーティション分割テーブルに追記（WRITE_APPEND）する。
+            Falseの場合は全件で作り直し、ロードしたテーブルのウォーターマークを削除する
+        force: Trueの場合、マニフェストで変更なしと判定されたファイルも再アップロード・再ロードする
+        profile: Trueの場合、ステージごとのcProfileの結果をPROFILE_DIRに保存する
+        metrics_format: 実行終了時に書き出す計測結果の形式（'json' または 'prometheus'）
+        trace_memory: Trueの場合、tracemallocでステージ・テーブルごとのピークメモリを計測する
+        compression: 'gzip' の場合、CSV/NDJSONをgzip圧縮したファイルを生成し、そのままアップロード・ロードする
+        pipelined: Trueの場合、ステージを順に実行する代わりに、テーブルごとの生成・アップロード・ロードを
+            依存関係に従って重ねて実行する（差分ロードとは併用できない）
+
     Returns:
         bool: 処理が成功した場合True、失敗した場合False
     """
+    if pipelined and incremental:
+        print("❌ Pipelined execution does not support incremental loads")
+        return False
+
+    # ステージ・テーブルごとの計測値は成否にかかわらず実行終了時に書き出す
+    metrics = PipelineMetrics(trace_memory=trace_memory, profile_dir=PROFILE_DIR if profile else None)
+    metrics.start()
+    success = False
+    try:
+        if pipelined:
+            success = _run_pipelined(metrics, output_format, force, compression)
+        else:
+            success = _run_pipeline(metrics, output_format, incremental, force, compression)
+    finally:
+        metrics.record_transport(get_shared_transport().stats.snapshot())
+        metrics.finish(success)
+        metrics.print_summary()
+        metrics_path = metrics.write(metrics_format)
+        print(f"Metrics written to {metrics_path}")
+
+    return success
+
+
+def _run_pipeline(metrics: PipelineMetrics, output_format: str = OUTPUT_FORMAT,
+                  incremental: bool = False, force: bool = False, compression: str = OUTPUT_COMPRESSION) -> bool:
+    """Step 1〜4をステージごとに計測しながら実行"""
+    from data_generator import SampleDataGenerator  # pandas・Fakerは生成を行う実行時にだけ読み込む
+
     print("=== Data Engineering ETL Pipeline ===\n")
 
     # 1. サンプルデータの生成
     print("Step 1: Generating sample data...")
-    generator = SampleDataGenerator()
-    generator.generate_all_data()
+    with metrics.stage('generate'):
+        generator = SampleDataGenerator(output_format=output_format, compression=compression)
+        generator.generate_all_data()
+        for table_name, rows in generator.row_counts.items():
+            metrics.record_table(
+                'generate', table_name, rows=rows,
+                size_bytes=_written_bytes(table_name, output_format, compression),
+                seconds=generator.table_seconds.get(table_name),
+                cpu_seconds=generator.table_cpu_seconds.get(table_name),
+                peak_memory=generator.peak_memory.get(table_name),
+                shared_with=generator.shared_measurements.get(table_name),
+                uncompressed_bytes=generator.uncompressed_bytes.get(table_name),
+                frame_bytes=generator.frame_bytes.get(table_name))
     print("✅ Sample data generation completed\n")
 
     # 2. GCP環境の確認
     print("Step 2: Verifying GCP environment...")
+    with metrics.stage('verify'):
+        clients = _verify_gcp_environment()
+    if not clients:
+        return False
+    gcs_client, bigquery_client = clients
+
+    # 差分ロードの場合は新しいパーティションだけを抽出
+    table_files = _get_table_files(output_format, compression)
+    uncompressed_bytes = dict(generator.uncompressed_bytes)
+    incremental_files = None
+    watermark_store = WatermarkStore()
+    if incremental:
+        with metrics.stage('extract'):
+            incremental_files = _prepare_incremental_files(watermark_store, output_format, compression)
+            for table_name, info in incremental_files.items():
+                metrics.record_table(
+                    'extract', table_name, rows=info['rows'],
+                    size_bytes=os.path.getsize(f"{RAW_DATA_DIR}/{info['file_name']}"),
+                    uncompressed_bytes=info['uncompressed_bytes'])
+        for table_name, info in incremental_files.items():
+            uncompressed_bytes[table_name] = info['uncompressed_bytes']
+            if info['rows']:
+                table_files[table_name] = [info['file_name']]
+            else:
+                del table_files[table_name]
+
+    manifest = RunManifest()
+
+    # 3. データファイルのGCSアップロード
+    print("Step 3: Uploading files to Google Cloud Storage...")
+    with metrics.stage('upload'):
+        try:
+            gcs_uris = _upload_files_to_gcs(gcs_client, output_format, table_files, manifest, force, metrics)
+        except Exception as e:
+            print(f"❌ GCS upload failed: {e}")
+            return False
+        print("✅ Files uploaded to GCS\n")
+        if compression == 'gzip':
+            _report_compression_savings(gcs_client, table_files, uncompressed_bytes, metrics)
+
+    # 4. GCSからBigQueryへのデータロード
+    print("Step 4: Loading data from GCS to BigQuery...")
+    with metrics.stage('load'):
+        try:
+            _load_data_from_gcs_to_bigquery(bigquery_client, gcs_uris, output_format,
+                                            table_files, incremental_files, manifest, force, metrics,
+                                            watermark_store=None if incremental else watermark_store)
+        except Exception as e:
+            print(f"❌ BigQuery load from GCS failed: {e}")
+            return False
+        finally:
+            # 全件ロードでは、一部のテーブルが失敗しても成功したテーブルのウォーターマークの削除を保存する
+            if not incremental:
+                watermark_store.save()
+    print("✅ Data loaded from GCS to BigQuery\n")
+
+    # ロードが全て成功した場合のみウォーターマークを進める
+    if incremental:
+        for table_name, info in incremental_files.items():
+            if info['max_partition']:
+                watermark_store.set(table_name, info['max_partition'])
+        watermark_store.save()
+        print(f"Watermarks updated: {watermark_store.watermarks}\n")
+
+    print("🎉 ETL Pipeline completed successfully!")
+    print(f"Data is now available in BigQuery dataset: {BIGQUERY_DATASET}")
+    print(f"You can start querying the data using BigQuery console or dbt.")
+
+    return True
+
+
+def _run_pipelined(metrics: PipelineMetrics, output_format: str = OUTPUT_FORMAT,
+                   force: bool = False, compression: str = OUTPUT_COMPRESSION) -> bool:
+    """
+    テーブルごとの生成 → アップロード → ロードをDAGのタスクとして重ねて実行
+
+    生成は外部キーの参照元から順（users → products → orders/order_items → access_logs）に1テーブルずつ
+    チャンク単位で書き出し、ファイルが書き終わったテーブルからアップロード、アップロードが終わったテーブルから
+    ロードジョブを投入する。全体の所要時間は、最も遅いテーブルの生成〜ロードの連鎖（クリティカルパス）に近づく。
+    """
+    from data_generator import SampleDataGenerator, GENERATION_UNITS
+
+    print("=== Data Engineering ETL Pipeline (pipelined) ===\n")
+
+    # GCP環境の確認（生成を始める前に行い、認証エラー等で生成が無駄にならないようにする）
+    print("Step 1: Verifying GCP environment...")
+    with metrics.stage('verify'):
+        clients = _verify_gcp_environment()
+    if not clients:
+        return False
+    gcs_client, bigquery_client = clients
+
+    generator = SampleDataGenerator(output_format=output_format, compression=compression)
+    table_files = {}  # 生成が終わったテーブルから、アップロード時にシャードの一覧を記録する
+    manifest = RunManifest()
+    watermark_store = WatermarkStore()
+    gcs_uris = {}
+
+    def generate(unit):
+        for table_name in generator.generate_table_file(unit):
+            metrics.record_table(
+                'generate', table_name, rows=generator.row_counts[table_name],
+                size_bytes=_written_bytes(table_name, output_format, compression),
+                seconds=generator.table_seconds.get(table_name),
+                cpu_seconds=generator.table_cpu_seconds.get(table_name),
+                peak_memory=generator.peak_memory.get(table_name),
+                shared_with=generator.shared_measurements.get(table_name),
+                uncompressed_bytes=generator.uncompressed_bytes.get(table_name))
+
+    def upload(table_name):
+        table_files.update(_get_table_files(output_format, compression, table_names=[table_name]))
+        gcs_uris.update(_upload_files_to_gcs(
+            gcs_client, output_format, {table_name: table_files[table_name]}, manifest, force, metrics))
+
+    def load(table_name):
+        _load_data_from_gcs_to_bigquery(
+            bigquery_client, gcs_uris, output_format, {table_name: table_files[table_name]},
+            manifest=manifest, force=force, metrics=metrics, watermark_store=watermark_store)
+
+    scheduler = TaskScheduler({
+        'generate': SCHEDULER_GENERATE_WORKERS,
+        'upload': SCHEDULER_UPLOAD_WORKERS,
+        'load': SCHEDULER_LOAD_WORKERS
+    })
+    previous_unit = ()
+    for unit, table_names in GENERATION_UNITS.items():
+        scheduler.add_task(f'generate:{unit}', partial(generate, unit), 'generate', depends_on=previous_unit)
+        previous_unit = (f'generate:{unit}',)
+        for table_name in table_names:
+            scheduler.add_task(f'upload:{table_name}', partial(upload, table_name), 'upload',
+                               depends_on=(f'generate:{unit}',))
+            scheduler.add_task(f'load:{table_name}', partial(load, table_name), 'load',
+                               depends_on=(f'upload:{table_name}',))
+
+    print("Step 2: Generating, uploading and loading tables as soon as their inputs are ready...")
+    with metrics.stage('pipeline') as stage:
+        success = scheduler.run()
+        stage.update(scheduler.summary())
+    scheduler.print_summary()
+    # ロードのタスクは並行に実行されるため、ウォーターマークの削除はまとめて保存する
+    watermark_store.save()
+
+    if compression == 'gzip':
+        _report_compression_savings(gcs_client, table_files, generator.uncompressed_bytes, metrics)
+
+    if not success:
+        print("❌ Pipelined execution failed")
+        return False
+
+    print("\n🎉 ETL Pipeline completed successfully!")
+    print(f"Data is now available in BigQuery dataset: {BIGQUERY_DATASET}")
+    print(f"You can start querying the data using BigQuery console or dbt.")
+
+    return True
+
+
+def _verify_gcp_environment():
+    """GCSバケットとBigQueryデータセットを確認し、(GCSClient, BigQueryClient) を返す（失敗時はNone）"""
     try:
         gcs_client = GCSClient()
         bigquery_client = BigQueryClient()
         gcs_client.setup_gcs_bucket()
         bigquery_client.setup_bigquery_dataset()  # データセット存在確認のみ
         print("✅ GCP environment verification completed\n")
+        return gcs_client, bigquery_client
     except Exception as e:
         print(f"❌ GCP environment verification failed: {e}")
         print("Please check your GCP credentials and ensure the BigQuery dataset is created using Terraform.")
-        return False
+        return None
 
-    # 3. データファイルのGCSアップロード
-    try:
-        gcs_uris = _upload_files_to_gcs(gcs_client)
-    except Exception as e:
-        print(f"❌ GCS upload failed: {e}")
-        return False
 
-    # 4. GCSからBigQueryへのデータロード
-    try:
-        _load_data_from_gcs_to_bigquery(bigquery_client, gcs_uris)
-    except Exception as e:
-        print(f"❌ BigQuery load from GCS failed: {e}")
-        return False
+def _get_table_files(output_format: str = OUTPUT_FORMAT, compression: str = OUTPUT_COMPRESSION,
+                     table_names: list = None) -> dict:
+    """テーブル名 → 生成済みファイル（RAW_DATA_DIRからの相対パス）のリストの対応を返す"""
+    return {
+        table_name: find_table_files(table_name, output_format, compression)
+        for table_name in table_names or BigQuerySchemas.get_available_tables()
+    }
 
-    print("🎉 ETL Pipeline completed successfully!")
-    print(f"Data is now available in BigQuery dataset: {BIGQUERY_DATASET}")
-    print(f"You can start querying the data using BigQuery console or dbt.")
 
-    return True
+def _written_bytes(table_name: str, output_format: str = OUTPUT_FORMAT,
+                   compression: str = OUTPUT_COMPRESSION) -> int:
+    """生成されたテーブルのファイルサイズ（シャード形式では全シャードの合計）"""
+    return sum(os.path.getsize(f'{RAW_DATA_DIR}/{file_name}')
+               for file_name in find_table_files(table_name, output_format, compression))
 
 
-def _upload_files_to_gcs(gcs_client: GCSClient) -> dict:
-    """ローカルファイルをGCSにアップロード"""
-    print("Step 3: Uploading files to Google Cloud Storage...")
+def _table_paths(table_files: dict) -> dict:
+    """ローカルパス → テーブル名の対応を返す"""
+    return {f'{RAW_DATA_DIR}/{file_name}': table_name
+            for table_name, file_names in table_files.items() for file_name in file_names}
 
-    files_to_upload = [
-        ('users.csv', 'raw/users.csv'),
-        ('products.csv', 'raw/products.csv'),
-        ('orders.csv', 'raw/orders.csv'),
-        ('order_items.csv', 'raw/order_items.csv'),
-        ('access_logs.json', 'raw/access_logs.json')
-    ]
-
-    gcs_uris = {}  # GCS URIを保存
-
-    for local_file, gcs_path in files_to_upload:
-        local_path = f"{RAW_DATA_DIR}/{local_file}"
-        if os.path.exists(local_path):
-            gcs_uri = gcs_client.upload_to_gcs(local_path, gcs_path)
-            gcs_uris[local_file] = gcs_uri
-        else:
-            print(f"⚠️  File not found: {local_path}")
 
-    print("✅ Files uploaded to GCS\n")
+def _prepare_incremental_files(watermark_store: WatermarkStore, output_format: str = OUTPUT_FORMAT,
+                               compression: str = OUTPUT_COMPRESSION) -> dict:
+    """ウォーターマークより新しいパーティションの差分ファイルを作成"""
+    print("Extracting new partitions for incremental load...")
+
+    incremental_files = prepare_incremental_files(watermark_store, output_format, compression=compression)
+    for table_name, info in incremental_files.items():
+        since = info['watermark'] or 'beginning'
+        print(f"  {table_name}: {info['rows']} new rows since {since} → {info['file_name']}")
+
+    print("✅ Incremental files prepared\n")
+    return incremental_files
+
+
+def _upload_files_to_gcs(gcs_client: GCSClient, output_format: str = OUTPUT_FORMAT,
+                         table_files: dict = None, manifest: RunManifest = None, force: bool = False,
+                         metrics: PipelineMetrics = None) -> dict:
+    """
+    ローカルファイルをGCSにアップロード（マニフェストで変更なしと判定されたファイルは省略）
+
+    シャード形式では全テーブルのシャードをまとめて並列にアップロードし、
+    raw/<table>/part-00000.csv のようにローカルと同じ構成で配置する。
+    """
+    if table_files is None:
+        table_files = _get_table_files(output_format)
+
+    existing_files = []
+    for table_name, file_names in table_files.items():
+        if not file_names:
+            print(f"⚠️  File not found for: {table_name}")
+        for file_name in file_names:
+            existing_files.append((f"{RAW_DATA_DIR}/{file_name}", f'raw/{file_name}'))
+
+    # GCS URIを保存（ローカルパス → GCS URI）
+    gcs_uris = gcs_client.upload_files_to_gcs(existing_files, manifest=manifest, force=force)
+
+    if metrics:
+        # パイプライン実行ではテーブルごとに呼ばれるため、対象のテーブルの分だけを記録する
+        # （シャードはバイト数・ファイル数を合計し、並列に転送されるため時間は最も遅いシャードとする）
+        tables = _table_paths(table_files)
+        uploads = {}
+        for stats in gcs_client.upload_stats:
+            table_name = tables.get(stats['local_path'])
+            if table_name:
+                upload = uploads.setdefault(table_name, {'size_bytes': 0, 'seconds': 0.0, 'files': 0})
+                upload['size_bytes'] += stats['bytes']
+                upload['seconds'] = max(upload['seconds'], stats['seconds'])
+                upload['files'] += 1
+        for table_name, upload in uploads.items():
+            metrics.record_table('upload', table_name, **upload)
+
     return gcs_uris
 
 
-def _load_data_from_gcs_to_bigquery(bigquery_client: BigQueryClient, gcs_uris: dict) -> None:
-    """GCSからBigQueryにデータをロード"""
-    print("Step 4: Loading data from GCS to BigQuery...")
+def _report_compression_savings(gcs_client: GCSClient, table_files: dict, uncompressed_bytes: dict,
+                                metrics: PipelineMetrics = None) -> None:
+    """gzip圧縮で削減したアップロード量と、実測スループットから推定した削減時間を表示"""
+    tables = _table_paths(table_files)
+    total_uncompressed, total_compressed, total_seconds_saved = 0, 0, 0.0
+
+    # シャードはバイト数をテーブルごとに合計し、並列に転送されるため時間は最も遅いシャードとする
+    # （時間を合計するとスループットを過小に見積もり、削減時間が過大になる）
+    uploads = {}
+    for stats in gcs_client.upload_stats:
+        table_name = tables.get(stats['local_path'])
+        if table_name:
+            upload = uploads.setdefault(table_name, {'bytes': 0, 'seconds': 0.0})
+            upload['bytes'] += stats['bytes']
+            upload['seconds'] = max(upload['seconds'], stats['seconds'])
+
+    print("Compression savings:")
+    for table_name, stats in uploads.items():
+        raw_bytes = uncompressed_bytes.get(table_name)
+        if not raw_bytes:
+            continue
+
+        # 圧縮前のファイルを同じスループットでアップロードした場合との差
+        bytes_saved = raw_bytes - stats['bytes']
+        seconds_saved = bytes_saved / (stats['bytes'] / stats['seconds']) \
+            if stats['bytes'] and stats['seconds'] > 0 else 0.0
+        total_uncompressed += raw_bytes
+        total_compressed += stats['bytes']
+        total_seconds_saved += seconds_saved
+
+        print(f"  {table_name}: {raw_bytes / 1024 / 1024:.1f} MiB → {stats['bytes'] / 1024 / 1024:.1f} MiB "
+              f"({stats['bytes'] / raw_bytes:.0%}), ~{seconds_saved:.2f}s upload time saved")
+        if metrics:
+            metrics.record_table('upload', table_name, uncompressed_bytes=raw_bytes,
+                                 bytes_saved=bytes_saved, estimated_seconds_saved=seconds_saved)
+
+    if total_uncompressed:
+        print(f"  Total: {(total_uncompressed - total_compressed) / 1024 / 1024:.1f} MiB saved "
+              f"({total_compressed / total_uncompressed:.0%} of original), "
+              f"~{total_seconds_saved:.2f}s upload time saved\n")
+
+
+def _load_data_from_gcs_to_bigquery(bigquery_client: BigQueryClient, gcs_uris: dict,
+                                    output_format: str = OUTPUT_FORMAT, table_files: dict = None,
+                                    incremental_files: dict = None, manifest: RunManifest = None,
+                                    force: bool = False, metrics: PipelineMetrics = None,
+                                    watermark_store: WatermarkStore = None) -> None:
+    """
+    GCSからBigQueryにデータをロード（全テーブルのジョブをまとめて投入して待機）
+
+    シャード形式では、テーブルごとに全シャードのURIのリストを1つのロードジョブに渡す
+    （BigQueryがファイル単位で並列に読み込む）。ワイルドカードではなく今回のシャードを列挙するため、
+    前回の実行で残ったGCS上のシャードを取り込むことはない。
 
+    watermark_storeを渡した場合（全件ロード）、作り直したテーブルのウォーターマークを削除する
+    （保存は呼び出し側で行う）。古いウォーターマークが残ると、次回の差分ロードが全件ロードで
+    取り込み済みのパーティションを二重に追記するため。
+    """
     schemas = BigQuerySchemas.get_schemas()
+    if table_files is None:
+        table_files = _get_table_files(output_format)
 
-    # CSVファイルのロード（GCS経由）
-    csv_tables = [
-        ('users.csv', 'users'),
-        ('products.csv', 'products'),
-        ('orders.csv', 'orders'),
-        ('order_items.csv', 'order_items')
-    ]
-
-    for csv_file, table_name in csv_tables:
-        if csv_file in gcs_uris:
-            bigquery_client.load_csv_from_gcs_to_bigquery(
-                gcs_uris[csv_file],
-                table_name,
-                schema=schemas.get(table_name)
-            )
-        else:
-            print(f"⚠️  GCS URI not found for: {csv_file}")
-
-    # JSONファイルのロード（GCS経由）
-    json_file = 'access_logs.json'
-    if json_file in gcs_uris:
-        bigquery_client.load_json_from_gcs_to_bigquery(
-            gcs_uris[json_file],
-            'access_logs',
-            schema=schemas.get('access_logs')
-        )
-    else:
-        print(f"⚠️  GCS URI not found for: {json_file}")
+    load_specs = []
+    for table_name, file_names in table_files.items():
+        missing_files = [file_name for file_name in file_names if f'{RAW_DATA_DIR}/{file_name}' not in gcs_uris]
+        if missing_files or not file_names:
+            print(f"⚠️  GCS URI not found for: {', '.join(missing_files) or table_name}")
+            continue
+        if manifest and not force and all(manifest.is_loaded(file_name, table_name) for file_name in file_names):
+            described = file_names[0] if len(file_names) == 1 else f"{len(file_names)} files"
+            print(f"Skipping already loaded file: {described} → {table_name}")
+            continue
 
-    print("✅ Data loaded from GCS to BigQuery\n")
+        uris = [gcs_uris[f'{RAW_DATA_DIR}/{file_name}'] for file_name in file_names]
+        spec = {
+            'gcs_uri': uris[0] if len(uris) == 1 else uris,
+            'table_name': table_name,
+            'schema': schemas.get(table_name)
+        }
+        if incremental_files and table_name in incremental_files:
+            # 初回（ウォーターマークなし）は全件で作り直し、以降は新しいパーティションを追記
+            first_load = incremental_files[table_name]['watermark'] is None
+            spec['write_disposition'] = 'WRITE_TRUNCATE' if first_load else 'WRITE_APPEND'
+        spec['file_names'] = file_names
+        load_specs.append(spec)
+
+    results = bigquery_client.load_tables_from_gcs(load_specs)
+
+    # 成功したロードを記録し、失敗したテーブルだけを次回再実行する
+    if manifest:
+        loaded_files = {spec['table_name']: spec['file_names'] for spec in load_specs}
+        for result in results:
+            if not result['error']:
+                for file_name in loaded_files[result['table_name']]:
+                    manifest.record_load(file_name, result['table_name'], result['job_id'])
+        manifest.save()
+
+    if watermark_store is not None:
+        reset_tables = sorted({get_watermark_table(result['table_name']) for result in results
+                               if not result['error'] and is_incremental_table(result['table_name'])
+                               and watermark_store.get(get_watermark_table(result['table_name']))})
+        for table_name in reset_tables:
+            watermark_store.clear(table_name)
+        if reset_tables:
+            print(f"Watermarks reset after full load: {', '.join(reset_tables)}")
+
+    if metrics:
+        for result in results:
+            metrics.record_table('load', result['table_name'], rows=result['rows'],
+                                 seconds=result['seconds'], job_id=result['job_id'])
+
+    failed_tables = [result['table_name'] for result in results if result['error']]
+    if failed_tables:
+        raise RuntimeError(f"Load jobs failed for: {', '.join(failed_tables)}")
+
+
+def _parse_args():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(description="Data Engineering ETL Pipeline")
+    parser.add_argument(
+        '--format', dest='output_format', choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+        help="生成ファイルとBigQueryロードの形式（デフォルト: config.OUTPUT_FORMAT）")
+    parser.add_argument(
+        '--compression', choices=COMPRESSIONS, default=OUTPUT_COMPRESSION,
+        help="CSV/NDJSONの圧縮形式（デフォルト: config.OUTPUT_COMPRESSION）")
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="前回の取り込み以降の日付パーティションだけを追記する差分ロード")
+    parser.add_argument(
+        '--force', action='store_true',
+        help="変更のないファイルも再アップロード・再ロードする")
+    parser.add_argument(
+        '--profile', action='store_true',
+        help="ステージごとのcProfileの結果を保存する（出力先: config.PROFILE_DIR）")
+    parser.add_argument(
+        '--metrics-format', choices=METRICS_FORMATS, default=METRICS_FORMAT,
+        help="実行終了時に書き出す計測結果の形式（デフォルト: config.METRICS_FORMAT）")
+    parser.add_argument(
+        '--trace-memory', action='store_true', default=METRICS_TRACE_MEMORY,
+        help="tracemallocでステージ・テーブルごとのピークメモリを計測する（処理は遅くなる）")
+    parser.add_argument(
+        '--pipelined', action='store_true', default=PIPELINED_EXECUTION,
+        help="テーブルごとの生成・アップロード・ロードを依存関係に従って重ねて実行する（--incrementalとは併用不可）")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    success = main()
+    args = _parse_args()
+    success = main(output_format=args.output_format, incremental=args.incremental, force=args.force,
+                   profile=args.profile, metrics_format=args.metrics_format, trace_memory=args.trace_memory,
+                   compression=args.compression, pipelined=args.pipelined)
     sys.exit(0 if success else 1)
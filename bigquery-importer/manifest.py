@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import threading
+from config import *
+
+
+def get_file_name(local_path):
+    """マニフェストのキーにするファイル名（RAW_DATA_DIRからの相対パス。それ以外の場所のファイルはファイル名のみ）"""
+    relative_path = os.path.relpath(local_path, RAW_DATA_DIR)
+    return os.path.basename(local_path) if relative_path.startswith('..') else relative_path
+
+
+class RunManifest:
+    """
+    アップロード・ロード済みファイルを記録するローカルマニフェスト
+
+    ファイル名（RAW_DATA_DIRからの相対パス。シャードは orders/part-00000.csv など）ごとに
+    内容のハッシュ・サイズ・GCSの世代番号（generation）・
+    そのファイルを取り込んだBigQueryロードジョブを保存し、
+    変更のないファイルの再アップロード・再ロードを省略するために使う。
+    パイプライン実行ではテーブルごとのタスクから並行して記録・保存される。
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.RLock()
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def is_uploaded(self, local_path, remote_generation):
+        """ローカルファイルと同じ内容がGCS上の現在の世代としてアップロード済みか"""
+        entry = self.entries.get(get_file_name(local_path))
+        if entry is None or remote_generation is None or entry['generation'] != remote_generation:
+            return False
+        if entry['sha256'] != self._file_hash(local_path, entry):
+            return False
+
+        # 内容が同じまま再生成されたファイルは、次回ハッシュ計算を省略できるよう更新時刻を記録
+        # （別のタスクのsave()がエントリを書き出している間に変更しないようロックを取る）
+        with self._lock:
+            entry['mtime'] = os.stat(local_path).st_mtime
+        return True
+
+    def record_upload(self, local_path, gcs_uri, generation):
+        """アップロード結果を記録（ロード済みの情報はリセット）"""
+        file_name = get_file_name(local_path)
+        stat = os.stat(local_path)
+        sha256 = self._file_hash(local_path, self.entries.get(file_name))
+        with self._lock:
+            self.entries[file_name] = {
+                'sha256': sha256,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'gcs_uri': gcs_uri,
+                'generation': generation,
+                'table_name': None,
+                'load_job_id': None,
+                'loaded_generation': None
+            }
+
+    def is_loaded(self, file_name, table_name):
+        """GCS上の現在の世代のファイルがtable_nameにロード済みか"""
+        entry = self.entries.get(file_name)
+        return (
+            entry is not None
+            and entry['load_job_id'] is not None
+            and entry['table_name'] == table_name
+            and entry['loaded_generation'] == entry['generation']
+        )
+
+    def record_load(self, file_name, table_name, job_id):
+        """ロードジョブの結果を記録"""
+        with self._lock:
+            entry = self.entries[file_name]
+            entry['table_name'] = table_name
+            entry['load_job_id'] = job_id
+            entry['loaded_generation'] = entry['generation']
+
+    def save(self):
+        """マニフェストをファイルに保存（書きかけのファイルを残さないよう一時ファイルから置き換える）"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock:
+            with open(f'{self.path}.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+            os.replace(f'{self.path}.tmp', self.path)
+
+    @staticmethod
+    def _file_hash(local_path, entry=None):
+        """ファイルのSHA-256（サイズと更新時刻が記録と同じなら記録済みの値を再利用）"""
+        stat = os.stat(local_path)
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+            return entry['sha256']
+
+        digest = hashlib.sha256()
+        with open(local_path, 'rb') as f:
+            for block in iter(lambda: f.read(8 * 1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
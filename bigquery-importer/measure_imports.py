@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+エントリポイントの起動時間の計測スクリプト
+各スクリプトを新しいPythonプロセスで `python -X importtime` によりimportし、
+import時間の中央値と、時間のかかったパッケージを表示
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS = ('main', 'upload_only', 'status', 'estimate_models', 'run_models_locally',
+                'bigquery_client', 'gcs_client')
+
+# import時間の目標（秒）。超えたエントリポイントがあれば失敗とする
+STARTUP_TARGETS = {
+    'upload_only': 1.0,
+    'status': 1.0,
+}
+
+
+def measure(module, repeat=5):
+    """
+    moduleを新しいプロセスでrepeat回importし、import時間とプロセス全体の時間の中央値を返す
+
+    Returns:
+        dict: import_seconds, process_seconds, packages（最後の計測でのパッケージ名 → 累積import時間（秒）の上位）
+    """
+    import_times, process_times = [], []
+    packages = {}
+
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        process_times.append(time.perf_counter() - start_time)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Failed to import {module}: {completed.stderr.strip().splitlines()[-1]}")
+
+        # 形式: "import time: self [us] | cumulative | imported package"（ネストは名前の前の空白）
+        # moduleの行は、moduleから読み込まれたパッケージ（より深くネストした直前の行）の後に出力される
+        entries = []
+        for line in completed.stderr.splitlines():
+            if line.startswith('import time:') and 'cumulative' not in line:
+                _, cumulative, name = line[len('import time:'):].split('|')
+                entries.append((len(name) - len(name.lstrip()), name.strip(), int(cumulative) / 1e6))
+
+        index = max(i for i, (_, name, _) in enumerate(entries) if name == module)
+        depth, _, import_seconds = entries[index]
+        import_times.append(import_seconds)
+        packages = {}
+        for nested_depth, name, seconds in reversed(entries[:index]):
+            if nested_depth <= depth:
+                break
+            if '.' not in name:
+                packages[name] = max(packages.get(name, 0.0), seconds)
+
+    top_packages = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        'import_seconds': statistics.median(import_times),
+        'process_seconds': statistics.median(process_times),
+        'packages': dict(top_packages)
+    }
+
+
+def main(entry_points=ENTRY_POINTS, repeat=5, output=None):
+    """
+    エントリポイントごとの起動時間を計測して表示
+
+    Returns:
+        bool: STARTUP_TARGETSの目標を全て満たした場合True
+    """
+    print(f"=== Entry Point Import Times (median of {repeat}) ===\n")
+
+    results = {}
+    missed = []
+    print(f"{'entry point':<20} {'import':>8} {'process':>8}  slowest packages")
+    for module in entry_points:
+        result = measure(module, repeat)
+        target = STARTUP_TARGETS.get(module)
+        result['target_seconds'] = target
+        results[module] = result
+
+        marker = ''
+        if target is not None:
+            marker = '  ✅' if result['import_seconds'] <= target else f'  ❌ target {target:.1f}s'
+            if result['import_seconds'] > target:
+                missed.append(module)
+        slowest = ', '.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in result['packages'].items())
+        print(f"{module:<20} {result['import_seconds']:>7.3f}s {result['process_seconds']:>7.3f}s  {slowest}{marker}")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nResults written to {output}")
+
+    if missed:
+        print(f"\n❌ Startup target missed: {', '.join(missed)}")
+    return not missed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entry Point Import Times")
+    parser.add_argument(
+        'entry_points', nargs='*', default=list(ENTRY_POINTS),
+        help="計測するモジュール名（デフォルト: 全エントリポイント）")
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help="エントリポイントごとの計測回数（デフォルト: 5）")
+    parser.add_argument(
+        '--output',
+        help="計測結果を書き出すJSONファイルのパス")
+    args = parser.parse_args()
+    success = main(entry_points=args.entry_points, repeat=args.repeat, output=args.output)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,425 @@
+import glob
+import gzip
+import json
+import os
+from config import *
+
+try:
+    import orjson  # 高速なJSONエンコーダ（未インストールの場合は標準のjsonで列単位にエンコード）
+except ImportError:
+    orjson = None
+
+OUTPUT_FORMATS = ('csv', 'parquet')
+COMPRESSIONS = ('none', 'gzip')
+
+# IDカラム → (接頭辞, 桁数)。整数の代理キーで保持している場合は書き出す時に 'user_000123' 形式にする
+SURROGATE_ID_FORMATS = {
+    'user_id': ('user_', 6),
+    'product_id': ('prod_', 6),
+    'order_id': ('order_', 8),
+}
+# order_item_id は「注文番号 * ORDER_ITEM_ID_BASE + 注文内の連番」の整数で保持し 'item_00000001_01' 形式で書き出す
+ORDER_ITEM_ID_BASE = 100
+
+
+def format_ids(prefix, numbers, width):
+    """連番の配列を 'prefix_000001' 形式のID配列（object配列）に変換"""
+    import numpy as np
+
+    numbers = np.asarray(numbers)
+    if len(numbers) and numbers.max() >= 10 ** width:
+        # 桁数を超える番号は切り詰めずにそのまま連結する
+        digits = np.char.zfill(numbers.astype(str), width)
+        return np.char.add(prefix, digits).astype(object)
+    chars = _join_chars(prefix, _digit_chars(numbers, width))
+    return chars.view(f'S{chars.shape[1]}').ravel().astype(str).astype(object)
+
+
+def format_surrogate_ids(column_name, values):
+    """
+    整数の代理キーの配列をIDの文字列の配列に変換（欠損値はNone）
+
+    文字列は行ごとのPythonオブジェクトを作らず、ゼロ埋めした数字の文字コードから
+    Arrowの文字列配列として組み立てる。文字列のIDや、代理キーでないカラムの値はそのまま返す。
+    """
+    import numpy as np
+    import pandas as pd
+
+    if not _is_surrogate_id(column_name, values):
+        return values
+
+    missing = np.asarray(pd.isna(values))
+    numbers = pd.array(values).to_numpy(dtype=np.int64, na_value=0)
+    if column_name == 'order_item_id':
+        parts = [('item_', numbers // ORDER_ITEM_ID_BASE, 8), ('_', numbers % ORDER_ITEM_ID_BASE, 2)]
+    else:
+        prefix, width = SURROGATE_ID_FORMATS[column_name]
+        parts = [(prefix, numbers, width)]
+
+    if any(len(part_numbers) and part_numbers.max() >= 10 ** width for _, part_numbers, width in parts):
+        # 桁数を超える番号は切り詰めずにそのまま連結する（Pythonの文字列のobject配列）
+        formatted = format_ids(*parts[0])
+        for part in parts[1:]:
+            formatted = np.char.add(formatted.astype(str), format_ids(*part).astype(str)).astype(object)
+        formatted[missing] = None
+        return formatted
+
+    chars = _join_chars(*[piece for prefix, part_numbers, width in parts
+                          for piece in (prefix, _digit_chars(part_numbers, width))])
+    return _to_string_array(chars, missing)
+
+
+def _digit_chars(numbers, width):
+    """0以上10 ** width未満の整数の配列を、ゼロ埋めした数字の文字コードの2次元配列（行数 x width）に変換"""
+    import numpy as np
+
+    numbers = np.asarray(numbers, dtype=np.int64)
+    chars = np.empty((len(numbers), width), dtype=np.uint8)
+    for position in range(width - 1, -1, -1):
+        numbers, digits = np.divmod(numbers, 10)
+        chars[:, position] = digits
+    return chars + np.uint8(ord('0'))
+
+
+def _join_chars(*parts):
+    """ASCII文字列と文字コードの2次元配列を横に連結した文字コードの2次元配列（行ごとに同じ長さ）"""
+    import numpy as np
+
+    size = next(len(part) for part in parts if not isinstance(part, str))
+    columns = [np.broadcast_to(np.frombuffer(part.encode('ascii'), dtype=np.uint8), (size, len(part)))
+               if isinstance(part, str) else part for part in parts]
+    return np.ascontiguousarray(np.hstack(columns))
+
+
+def _to_string_array(chars, missing):
+    """行ごとに同じ長さの文字コードの2次元配列から、pandasのArrow文字列配列を作成（missingの行は欠損値）"""
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+
+    size, width = chars.shape
+    if (size + 1) * width >= 2 ** 31:
+        # 32ビットのオフセットに収まらない場合はPythonの文字列のobject配列にする
+        formatted = chars.view(f'S{width}').ravel().astype(str).astype(object)
+        formatted[missing] = None
+        return formatted
+    offsets = np.arange(0, (size + 1) * width, width, dtype=np.int32)
+    validity = pa.py_buffer(np.packbits(~missing, bitorder='little')) if missing.any() else None
+    array = pa.StringArray.from_buffers(size, pa.py_buffer(offsets), pa.py_buffer(chars), validity)
+    return pd.arrays.ArrowStringArray(array)
+
+
+def _format_surrogate_id_columns(chunk):
+    """DataFrameの代理キーのカラムをIDの文字列に置き換えたDataFrameを返す（他のカラムはコピーしない）"""
+    if not hasattr(chunk, 'columns'):
+        return chunk
+
+    formatted = {name: format_surrogate_ids(name, chunk[name]) for name in chunk.columns
+                 if _is_surrogate_id(name, chunk[name])}
+    return chunk.assign(**formatted) if formatted else chunk
+
+
+def _is_surrogate_id(column_name, values):
+    """IDカラムを整数の代理キーで保持しているか"""
+    import pandas as pd
+
+    return (column_name in SURROGATE_ID_FORMATS or column_name == 'order_item_id') and \
+        pd.api.types.is_integer_dtype(getattr(values, 'dtype', None))
+
+
+def get_output_file_name(table_name, output_format=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION):
+    """テーブルの出力ファイル名を返す（csv形式ではアクセスログのみNDJSON、gzip圧縮時は .gz を付ける）"""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+
+    if output_format == 'parquet':
+        extension = 'parquet'
+    else:
+        extension = 'json' if table_name == 'access_logs' else 'csv'
+        if compression == 'gzip':
+            extension += '.gz'
+
+    return f'{table_name}.{extension}'
+
+
+def get_shard_file_name(table_name, shard_name, output_format=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION):
+    """シャードの出力ファイル名（RAW_DATA_DIRからの相対パス。例: orders/part-00003.csv）を返す"""
+    extension = get_output_file_name(table_name, output_format, compression).split('.', 1)[1]
+    return f'{table_name}/part-{shard_name}.{extension}'
+
+
+def remove_shard_files(table_name, output_format=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION, shard_prefix=''):
+    """テーブルの既存のシャード（shard_prefixを指定した場合はその接頭辞のシャードのみ）を削除"""
+    pattern = get_shard_file_name(table_name, f'{shard_prefix}*', output_format, compression)
+    for path in glob.glob(f'{RAW_DATA_DIR}/{pattern}'):
+        os.remove(path)
+
+
+def find_table_files(table_name, output_format=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION,
+                     sharded=SHARDED_OUTPUT):
+    """
+    テーブルの生成済みファイル（RAW_DATA_DIRからの相対パス）を名前順に返す
+
+    shardedがTrueの場合は <table>/part-*、Falseの場合は1ファイルのみを対象とする
+    （出力形式を切り替えた後に、前回の形式のファイルを取り込まないようにするため）。
+    """
+    if sharded:
+        pattern = get_shard_file_name(table_name, '*', output_format, compression)
+        return sorted(os.path.relpath(path, RAW_DATA_DIR) for path in glob.glob(f'{RAW_DATA_DIR}/{pattern}'))
+
+    file_name = get_output_file_name(table_name, output_format, compression)
+    return [file_name] if os.path.exists(f'{RAW_DATA_DIR}/{file_name}') else []
+
+
+class TableWriter:
+    """
+    1テーブル分の出力ファイルにチャンク（DataFrameまたは辞書のリスト）を順に書き出すライター
+
+    CSV/NDJSONはcompression='gzip'でgzip圧縮して書き出す（Parquetでは無視）。
+    整数の代理キーで保持しているIDカラム（SURROGATE_ID_FORMATS）は書き出す時にIDの文字列にする。
+    uncompressed_bytesには圧縮前のCSV/NDJSONのバイト数、data_bytesには形式によらない圧縮前のデータ量
+    （CSV/NDJSONはuncompressed_bytesと同じ、ParquetはArrowテーブルのバイト数）を記録する。
+    """
+
+    def __init__(self, table_name, path, output_format=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+
+        self.table_name = table_name
+        self.path = path
+        self.output_format = output_format
+        self.compression = compression
+        self.rows_written = 0
+        self.uncompressed_bytes = 0
+        self.data_bytes = 0
+        self._file = None
+        self._parquet_writer = None
+        self._arrow_schema = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def write(self, chunk):
+        """チャンクを追記"""
+        chunk = _format_surrogate_id_columns(chunk)
+        if self.output_format == 'parquet':
+            self._write_parquet(chunk)
+        elif self.table_name == 'access_logs':
+            self._write_ndjson(chunk)
+        else:
+            self._write_csv(chunk)
+        self.rows_written += len(chunk)
+
+    def close(self):
+        """ファイルを閉じる（1行も書かれていない場合も空ファイルを作成）"""
+        if self.output_format == 'parquet':
+            if self._parquet_writer is None:
+                self._write_parquet([])
+            self._parquet_writer.close()
+        else:
+            self._open_file().close()
+
+    def _open_file(self):
+        """CSV/NDJSONの出力先（gzipまたはバッファ付きのバイナリファイル）を開く"""
+        if self._file is None:
+            if self.compression == 'gzip':
+                # ヘッダーの更新時刻を固定し、同じ内容なら同じバイト列になるようにする（マニフェストの判定用）
+                self._file = gzip.GzipFile(self.path, 'wb', compresslevel=GZIP_COMPRESSION_LEVEL, mtime=0)
+            else:
+                self._file = open(self.path, 'wb', buffering=WRITE_BUFFER_SIZE)
+        return self._file
+
+    def _write_bytes(self, data):
+        self._open_file().write(data)
+        self.uncompressed_bytes += len(data)
+        self.data_bytes += len(data)
+
+    def _write_csv(self, df):
+        # 0行のチャンクでもヘッダーだけは書き出す
+        for start in range(0, max(len(df), 1), WRITE_BATCH_SIZE):
+            batch = df.iloc[start:start + WRITE_BATCH_SIZE]
+            header = self.uncompressed_bytes == 0
+            self._write_bytes(batch.to_csv(header=header, index=False).encode('utf-8'))
+
+    def _write_ndjson(self, chunk):
+        import pandas as pd
+
+        df = chunk if isinstance(chunk, pd.DataFrame) else pd.DataFrame.from_records(chunk)
+        for start in range(0, len(df), WRITE_BATCH_SIZE):
+            self._write_bytes(_encode_ndjson_batch(df.iloc[start:start + WRITE_BATCH_SIZE]))
+
+    def _write_parquet(self, chunk):
+        import pyarrow.parquet as pq
+        from bigquery_schemas import BigQuerySchemas
+
+        if self._parquet_writer is None:
+            self._arrow_schema = BigQuerySchemas.get_arrow_schema(self.table_name)
+            self._parquet_writer = pq.ParquetWriter(
+                self.path, self._arrow_schema, compression=PARQUET_COMPRESSION)
+
+        table = _to_arrow_table(chunk, self._arrow_schema)
+        self._parquet_writer.write_table(table)
+        self.data_bytes += table.nbytes
+
+
+class ShardedTableWriter:
+    """
+    1テーブル分のチャンクを、圧縮前のデータ量がtarget_bytesに達するごとに次のファイルへ分けて書き出すライター
+
+    ファイルは <RAW_DATA_DIR>/<table>/part-<shard_prefix><連番>.<拡張子> で、CSVはファイルごとにヘッダーを持つ。
+    チャンクは最大WRITE_BATCH_SIZE行ずつ書き出して分割を判定する。書き出し済みの1行あたりのバイト数から
+    target_bytesまでの残りの行数を見積もってバッチを切るため、1ファイルの大きさはほぼtarget_bytesに揃う。
+    開いたときに同じ接頭辞の既存のシャードを削除する
+    （前回の実行よりシャード数が減っても古いファイルが残らない）。
+    """
+
+    def __init__(self, table_name, output_format=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION,
+                 target_bytes=OUTPUT_SHARD_SIZE, shard_prefix=''):
+        if target_bytes <= 0:
+            raise ValueError(f"Shard size must be positive: {target_bytes}")
+
+        self.table_name = table_name
+        self.output_format = output_format
+        self.compression = compression
+        self.target_bytes = target_bytes
+        self.shard_prefix = shard_prefix
+        self.paths = []  # 書き出したシャードのパス
+        self.rows_written = 0
+        self.uncompressed_bytes = 0
+        self._writer = None
+        self._shard_rows = 0
+        self._first_batch_rows = 100
+
+        remove_shard_files(table_name, output_format, compression, shard_prefix)
+        os.makedirs(f'{RAW_DATA_DIR}/{table_name}', exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def write(self, chunk):
+        """チャンクを追記（必要に応じて次のシャードに切り替える）"""
+        start = 0
+        while start < len(chunk):
+            if self._writer is None:
+                self._open_next()
+            batch_size = self._next_batch_size()
+            batch = chunk.iloc[start:start + batch_size] if hasattr(chunk, 'iloc') \
+                else chunk[start:start + batch_size]
+            self._writer.write(batch)
+            self.rows_written += len(batch)
+            self._shard_rows += len(batch)
+            start += len(batch)
+            if self._writer.data_bytes >= self.target_bytes:
+                self._close_current()
+
+    def close(self):
+        """書き出し中のシャードを閉じる（1行も書かれていない場合も空のシャードを1つ作成）"""
+        if self._writer is None and not self.paths:
+            self._open_next()
+        self._close_current()
+
+    def _next_batch_size(self):
+        """現在のシャードがtarget_bytesに達するまでの行数の見積もり（最初のバッチは少なめに書いて見積もる）"""
+        if not self._shard_rows:
+            return min(WRITE_BATCH_SIZE, self._first_batch_rows)
+        bytes_per_row = max(self._writer.data_bytes / self._shard_rows, 1)
+        remaining_rows = int((self.target_bytes - self._writer.data_bytes) / bytes_per_row) + 1
+        return max(1, min(WRITE_BATCH_SIZE, remaining_rows))
+
+    def _open_next(self):
+        shard_name = f'{self.shard_prefix}{len(self.paths):05d}'
+        path = f'{RAW_DATA_DIR}/{get_shard_file_name(self.table_name, shard_name, self.output_format, self.compression)}'
+        self._writer = TableWriter(self.table_name, path, self.output_format, self.compression)
+        self._shard_rows = 0
+        self.paths.append(path)
+
+    def _close_current(self):
+        if self._writer is not None:
+            self._writer.close()
+            self.uncompressed_bytes += self._writer.uncompressed_bytes
+            # 直前のシャードの1行あたりのバイト数から、次のシャードの最初のバッチの行数を決める
+            if self._shard_rows:
+                bytes_per_row = max(self._writer.data_bytes / self._shard_rows, 1)
+                self._first_batch_rows = max(1, int(self.target_bytes / bytes_per_row))
+            self._writer = None
+
+
+def _encode_ndjson_batch(df):
+    """
+    DataFrameのバッチをNDJSONのバイト列にエンコード（欠損値はnull）
+
+    orjsonがある場合は列の配列から組み立てた行をorjsonで1行ずつエンコードする。
+    ない場合は列ごとに重複を除いた値だけを標準のjsonでエンコードし、
+    キー部分を埋め込んだテンプレートにインデックス参照で当てはめて行を組み立てる。
+    """
+    import pandas as pd
+    import numpy as np
+
+    keys = [str(name) for name in df.columns]
+    values = [df[name].to_numpy(dtype=object, na_value=None) for name in df.columns]
+
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+        return b''.join([orjson.dumps(dict(zip(keys, row)), option=option, default=str)
+                         for row in zip(*values)])
+
+    columns = []
+    for column in values:
+        codes, uniques = pd.factorize(column)
+        # 欠損値のコードは-1なので、末尾に置いたnullを参照する
+        encoded = np.array([_dumps(value) for value in uniques.tolist()] + ['null'], dtype=object)
+        columns.append(encoded[codes])
+
+    escaped_keys = [_dumps(key).replace('{', '{{').replace('}', '}}') for key in keys]
+    template = '{{' + ','.join(f'{key}:{{}}' for key in escaped_keys) + '}}\n'
+    return ''.join(map(template.format, *columns)).encode('utf-8')
+
+
+def _dumps(value):
+    """値1つを標準のjsonでエンコード（orjsonと同じく区切りの空白なし・非ASCII文字はそのまま）"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+
+
+def _json_default(value):
+    """標準のjsonで扱えない値（NumPyのスカラー等）の変換"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def _to_arrow_table(chunk, arrow_schema):
+    """DataFrameまたは辞書のリストをBigQueryスキーマに沿った型のArrowテーブルに変換"""
+    import pandas as pd
+    import pyarrow as pa
+
+    if isinstance(chunk, pd.DataFrame):
+        df = chunk
+    else:
+        df = pd.DataFrame.from_records(chunk, columns=arrow_schema.names)
+
+    arrays = []
+    for field in arrow_schema:
+        column = df[field.name]
+        if pa.types.is_date32(field.type):
+            column = pd.to_datetime(column).to_numpy().astype('datetime64[D]')
+            arrays.append(pa.array(column, type=field.type))
+        elif pa.types.is_timestamp(field.type):
+            # タイムゾーンなしの日時はUTCとして扱う（BigQueryのCSV/JSONロードと同じ解釈）
+            column = pd.to_datetime(column, utc=True)
+            arrays.append(pa.Array.from_pandas(column, type=field.type))
+        else:
+            arrays.append(pa.Array.from_pandas(column, type=field.type))
+
+    return pa.Table.from_arrays(arrays, schema=arrow_schema)
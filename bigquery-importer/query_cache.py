@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from config import *
+
+# 実行のたびに結果が変わるため、キャッシュしない関数（BigQuery自身のクエリキャッシュと同じ方針）
+NON_DETERMINISTIC_FUNCTIONS = re.compile(
+    r'\b(CURRENT_DATE|CURRENT_DATETIME|CURRENT_TIME|CURRENT_TIMESTAMP|RAND|GENERATE_UUID|SESSION_USER)\b',
+    re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """コメントを除去し、文字列・識別子リテラルの外側の連続する空白を1つにまとめたSQLを返す"""
+    result = []
+    pending_space = False
+    i, length = 0, len(sql)
+
+    while i < length:
+        char = sql[i]
+        if sql.startswith('--', i) or char == '#':
+            end = sql.find('\n', i)
+            i = length if end < 0 else end
+            pending_space = True
+            continue
+        if sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = length if end < 0 else end + 2
+            pending_space = True
+            continue
+        if char.isspace():
+            pending_space = True
+            i += 1
+            continue
+
+        if char in '\'"`':
+            # リテラルはエスケープを含めてそのまま残す
+            end = i + 1
+            while end < length and sql[end] != char:
+                end += 2 if sql[end] == '\\' else 1
+            token = sql[i:end + 1]
+        else:
+            token = char
+            end = i
+
+        if pending_space and result:
+            result.append(' ')
+        pending_space = False
+        result.append(token)
+        i = end + 1
+
+    return ''.join(result).rstrip(';').rstrip()
+
+
+def is_cacheable(sql):
+    """結果をキャッシュできるクエリか（SELECT / WITHで始まり、非決定的な関数を含まない）"""
+    normalized = normalize_sql(sql)
+    return bool(re.match(r'(SELECT|WITH)\b', normalized, re.IGNORECASE)) \
+        and not NON_DETERMINISTIC_FUNCTIONS.search(normalized)
+
+
+class QueryCache:
+    """
+    クエリ結果（Arrowテーブル）のローカルキャッシュ
+
+    正規化したSQLのハッシュをキーに、メモリとディスク（Parquet）の2段で保持する。
+    次の場合はキャッシュを使わずにエントリを破棄する。
+    - 作成からttl_secondsが経過した
+    - 参照テーブルの最終更新日時が、キャッシュ作成時から変わった
+    メモリ・ディスクともに上限サイズを超えた分は、最後に使われてから最も時間が経ったものから削除する。
+    テーブルの最終更新日時はmetadata_ttl_seconds秒間メモリに保持し、その間は再取得しない。
+    """
+
+    def __init__(self, bigquery_client, cache_dir=QUERY_CACHE_DIR, memory_max_bytes=QUERY_CACHE_MEMORY_MAX_BYTES,
+                 disk_max_bytes=QUERY_CACHE_DISK_MAX_BYTES, ttl_seconds=QUERY_CACHE_TTL_SECONDS,
+                 metadata_ttl_seconds=QUERY_CACHE_METADATA_TTL_SECONDS):
+        self.bigquery_client = bigquery_client
+        self.cache_dir = cache_dir
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.metadata_ttl_seconds = metadata_ttl_seconds
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+        self._memory = OrderedDict()  # キー → (Arrowテーブル, メタデータ)
+        self._memory_bytes = 0
+        self._table_modified = {}  # テーブルID → (取得時刻, 最終更新日時)
+        self._lock = threading.RLock()
+
+    def get(self, sql):
+        """キャッシュされた有効な結果のArrowテーブルを返す（なければNone）"""
+        if not is_cacheable(sql):
+            return None
+
+        key = self._make_key(sql)
+        with self._lock:
+            entry = self._memory.get(key) or self._read_from_disk(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+
+            table, metadata = entry
+            if not self._is_valid(metadata):
+                self._remove(key)
+                self.stats['invalidations'] += 1
+                self.stats['misses'] += 1
+                return None
+
+            metadata['last_accessed'] = time.time()
+            self._store_in_memory(key, table, metadata)
+            self._write_metadata(key, metadata)
+            self.stats['hits'] += 1
+            return table
+
+    def put(self, sql, table, referenced_tables, started=None):
+        """
+        クエリ結果をキャッシュに保存
+
+        Args:
+            sql: 実行したSQL
+            table: 結果のArrowテーブル
+            referenced_tables: クエリジョブの参照テーブル（TableReferenceのリスト）
+            started: クエリジョブの開始日時。実行中に参照テーブルが更新された場合は保存しない
+
+        Returns:
+            bool: 保存した場合True
+        """
+        if not is_cacheable(sql):
+            return False
+
+        table_modified = {}
+        for reference in referenced_tables or []:
+            table_id = f"{reference.project}.{reference.dataset_id}.{reference.table_id}"
+            modified = self._get_table_modified(table_id, refresh=True)
+            if modified is None or (started and modified > started.timestamp()):
+                return False
+            table_modified[table_id] = modified
+
+        size_bytes = table.nbytes
+        if size_bytes > self.memory_max_bytes and size_bytes > self.disk_max_bytes:
+            return False
+
+        now = time.time()
+        metadata = {
+            'sql': normalize_sql(sql),
+            'created_at': now,
+            'last_accessed': now,
+            'tables': table_modified,
+            'num_rows': table.num_rows,
+            'size_bytes': size_bytes
+        }
+
+        key = self._make_key(sql)
+        with self._lock:
+            self._write_to_disk(key, table, metadata)
+            self._store_in_memory(key, table, metadata)
+        return True
+
+    def clear(self):
+        """メモリとディスクのキャッシュを全て削除"""
+        with self._lock:
+            for key in list(self._memory) + self._disk_keys():
+                self._remove(key)
+            self._table_modified.clear()
+
+    def _is_valid(self, metadata):
+        """TTL内で、参照テーブルが作成時から更新されていないか"""
+        if time.time() - metadata['created_at'] > self.ttl_seconds:
+            return False
+        return all(
+            self._get_table_modified(table_id) == modified
+            for table_id, modified in metadata['tables'].items()
+        )
+
+    def _get_table_modified(self, table_id, refresh=False):
+        """テーブルの最終更新日時（UNIX時刻）。テーブルが存在しない場合はNone"""
+        from google.cloud.exceptions import NotFound
+
+        checked = self._table_modified.get(table_id)
+        if not refresh and checked and time.time() - checked[0] < self.metadata_ttl_seconds:
+            return checked[1]
+
+        try:
+            modified = self.bigquery_client.get_table(table_id).modified
+        except NotFound:
+            modified = None
+        modified = modified.timestamp() if modified else None
+        self._table_modified[table_id] = (time.time(), modified)
+        return modified
+
+    def _store_in_memory(self, key, table, metadata):
+        """メモリに保存して最近使ったものとして末尾に移動し、上限を超えた分を古い順に削除"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self._memory[key] = (table, metadata)
+            return
+        if metadata['size_bytes'] > self.memory_max_bytes:
+            return
+
+        self._memory[key] = (table, metadata)
+        self._memory_bytes += metadata['size_bytes']
+        while self._memory_bytes > self.memory_max_bytes:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted['size_bytes']
+            self.stats['evictions'] += 1
+
+    def _read_from_disk(self, key):
+        """ディスクのエントリを読み込む（なければNone）"""
+        import pyarrow.parquet as pq
+
+        metadata_path, table_path = self._entry_paths(key)
+        if not (os.path.exists(metadata_path) and os.path.exists(table_path)):
+            return None
+        with open(metadata_path, encoding='utf-8') as f:
+            metadata = json.load(f)
+        return pq.read_table(table_path), metadata
+
+    def _write_to_disk(self, key, table, metadata):
+        """ディスクに保存し、上限を超えた分を最後に使われた日時の古い順に削除"""
+        import pyarrow.parquet as pq
+
+        if metadata['size_bytes'] > self.disk_max_bytes:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        _, table_path = self._entry_paths(key)
+        pq.write_table(table, f'{table_path}.tmp')
+        os.replace(f'{table_path}.tmp', table_path)
+        self._write_metadata(key, metadata)
+
+        entries = []
+        for disk_key in self._disk_keys():
+            metadata_path, table_path = self._entry_paths(disk_key)
+            try:
+                with open(metadata_path, encoding='utf-8') as f:
+                    last_accessed = json.load(f)['last_accessed']
+                entries.append((last_accessed, disk_key, os.path.getsize(table_path)))
+            except (OSError, ValueError, KeyError):
+                continue
+
+        total_bytes = sum(size for _, _, size in entries)
+        for _, disk_key, size in sorted(entries):
+            if total_bytes <= self.disk_max_bytes:
+                break
+            if disk_key != key:
+                self._remove_from_disk(disk_key)
+                total_bytes -= size
+                self.stats['evictions'] += 1
+
+    def _write_metadata(self, key, metadata):
+        """エントリのメタデータ（SQL・作成日時・最終利用日時・参照テーブルの更新日時）を保存"""
+        metadata_path, table_path = self._entry_paths(key)
+        if not os.path.exists(table_path):
+            return
+        with open(f'{metadata_path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False)
+        os.replace(f'{metadata_path}.tmp', metadata_path)
+
+    def _remove(self, key):
+        """メモリとディスクからエントリを削除"""
+        if key in self._memory:
+            _, metadata = self._memory.pop(key)
+            self._memory_bytes -= metadata['size_bytes']
+        self._remove_from_disk(key)
+
+    def _remove_from_disk(self, key):
+        for path in self._entry_paths(key):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _disk_keys(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [name[:-len('.json')] for name in os.listdir(self.cache_dir) if name.endswith('.json')]
+
+    def _entry_paths(self, key):
+        """エントリのメタデータ（.json）と結果（.parquet）のパス"""
+        return f'{self.cache_dir}/{key}.json', f'{self.cache_dir}/{key}.parquet'
+
+    @staticmethod
+    def _make_key(sql):
+        return hashlib.sha256(normalize_sql(sql).encode('utf-8')).hexdigest()
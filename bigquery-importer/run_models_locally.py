@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+dbtモデルのローカル実行スクリプト
+生成済みファイルに対して staging / marts モデルを組み込みのDuckDBで実行し、モデルごとの実行時間を表示
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from local_engine import LocalDbtRunner
+from output_writers import OUTPUT_FORMATS, COMPRESSIONS
+from config import *
+
+
+def main(output_format=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION, select=None, database=':memory:',
+         full_refresh=False, export_dir=None, output=None):
+    """
+    dbtモデルをローカルで実行
+
+    前提条件：
+    - main.py または data_generator.py でRAW_DATA_DIRにファイルが生成されていること
+
+    Args:
+        output_format: 読み込む生成済みファイルの形式（'csv' または 'parquet'）
+        compression: 読み込む生成済みファイルの圧縮形式
+        select: 実行するモデル名のリスト（省略時は全モデル、参照先のモデルも実行）
+        database: DuckDBのデータベースファイル（デフォルトはメモリ上）。
+            ファイルを指定すると、2回目以降はincrementalモデルを増分で更新する
+        full_refresh: Trueの場合、incrementalモデルも全件で作り直す
+        export_dir: 指定するとview以外（table・incremental）のモデルの結果を {モデル名}.parquet として書き出す
+        output: 指定するとソース・モデルごとの実行時間をJSONで書き出す
+
+    Returns:
+        bool: 全モデルが成功した場合True
+    """
+    print("=== Local dbt Model Run (DuckDB) ===\n")
+    start_time = time.perf_counter()
+
+    try:
+        runner = LocalDbtRunner(output_format=output_format, compression=compression, database=database)
+        sources = runner.load_sources(select)
+    except Exception as e:
+        print(f"❌ Loading source files failed: {e}")
+        return False
+
+    for source in sources:
+        print(f"Loaded {source['rows']} rows into {source['name']} in {source['seconds'] * 1000:.1f}ms")
+
+    models = runner.run_models(select, full_refresh=full_refresh)
+    print()
+    for model in models:
+        if model['error']:
+            print(f"❌ {model['name']}: {model['error']}")
+            continue
+        rows = f"{model['rows']} rows" if model['rows'] is not None else model['materialized']
+        if model['incremental']:
+            rows += ' (incremental)'
+        print(f"✅ {model['name']:<28} {model['seconds'] * 1000:>9.1f}ms  {rows}")
+
+    if export_dir:
+        os.makedirs(export_dir, exist_ok=True)
+        for model in models:
+            if model['materialized'] != 'view' and not model['error']:
+                runner.export(model['name'], f"{export_dir}/{model['name']}.parquet")
+        print(f"Table and incremental models exported to {export_dir}")
+
+    total_seconds = time.perf_counter() - start_time
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({'total_seconds': total_seconds, 'sources': sources, 'models': models},
+                      f, ensure_ascii=False, indent=2)
+        print(f"Timings written to {output}")
+
+    failed = [model for model in models if model['error']]
+    print(f"\n{len(models) - len(failed)} succeeded, {len(failed)} failed in {total_seconds:.2f}s")
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local dbt Model Run")
+    parser.add_argument(
+        '--format', dest='output_format', choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+        help="読み込むファイルの形式（デフォルト: config.OUTPUT_FORMAT）")
+    parser.add_argument(
+        '--compression', choices=COMPRESSIONS, default=OUTPUT_COMPRESSION,
+        help="読み込むファイルの圧縮形式（デフォルト: config.OUTPUT_COMPRESSION）")
+    parser.add_argument(
+        '--select', action='append',
+        help="実行するモデル名（複数指定可、参照先のモデルも実行）")
+    parser.add_argument(
+        '--database', default=':memory:',
+        help="DuckDBのデータベースファイル（指定すると実行後も結果を参照できる）")
+    parser.add_argument(
+        '--full-refresh', action='store_true',
+        help="incrementalモデルも全件で作り直す")
+    parser.add_argument(
+        '--export-dir',
+        help="view以外（table・incremental）のモデルの結果をParquetで書き出すディレクトリ")
+    parser.add_argument(
+        '--output',
+        help="実行時間を書き出すJSONファイルのパス")
+    args = parser.parse_args()
+    success = main(output_format=args.output_format, compression=args.compression, select=args.select,
+                   database=args.database, full_refresh=args.full_refresh, export_dir=args.export_dir,
+                   output=args.output)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,197 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from config import *
+
+
+class Task:
+    """スケジューラのタスク1件（依存先のタスク名と、実行に使うリソース名を持つ）"""
+
+    def __init__(self, name, function, resource, depends_on=()):
+        self.name = name
+        self.function = function
+        self.resource = resource
+        self.depends_on = tuple(depends_on)
+        self.state = 'pending'  # pending / running / succeeded / failed / skipped
+        self.result = None
+        self.error = None
+        self.ready_at = None  # 依存先が全て完了した時刻
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def seconds(self):
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+class TaskScheduler:
+    """
+    依存関係（DAG）のあるタスクを、依存先が全て完了したものから順に実行するスケジューラ
+
+    タスクはリソース（'generate' / 'upload' / 'load' など）ごとの同時実行数の上限の範囲でスレッドプールで実行する。
+    失敗したタスクに依存するタスクは実行せずにスキップし、それ以外のタスクは最後まで実行する。
+    実行後はcritical_path()で、全体の所要時間を決めたタスクの連鎖を確認できる。
+    """
+
+    def __init__(self, resource_limits):
+        """
+        Args:
+            resource_limits: リソース名 → 同時に実行できるタスク数
+        """
+        invalid = [resource for resource, limit in resource_limits.items() if limit < 1]
+        if invalid:
+            raise ValueError(f"Concurrency limit must be at least 1: {', '.join(invalid)}")
+
+        self.resource_limits = dict(resource_limits)
+        self.tasks = {}  # タスク名 → Task（追加順）
+        self.started_at = None
+        self.finished_at = None
+
+    def add_task(self, name, function, resource, depends_on=()):
+        """
+        タスクを追加（依存先のタスクは先に追加しておくこと。これにより循環参照は作れない）
+
+        Returns:
+            Task: 追加したタスク
+        """
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task: {name}")
+        if resource not in self.resource_limits:
+            raise ValueError(f"Unknown resource for task {name}: {resource}")
+        unknown = [dependency for dependency in depends_on if dependency not in self.tasks]
+        if unknown:
+            raise ValueError(f"Task {name} depends on unknown task: {', '.join(unknown)}")
+
+        task = Task(name, function, resource, depends_on)
+        self.tasks[name] = task
+        return task
+
+    def run(self):
+        """
+        全タスクを実行
+
+        Returns:
+            bool: 全タスクが成功した場合True
+        """
+        self.started_at = time.perf_counter()
+        pending = list(self.tasks.values())
+        running = {}  # Future → Task
+        in_use = {resource: 0 for resource in self.resource_limits}
+
+        with ThreadPoolExecutor(max_workers=sum(self.resource_limits.values())) as executor:
+            while pending or running:
+                # 依存関係の順に追加されているため、1回の走査でスキップが後続のタスクまで伝わる
+                for task in list(pending):
+                    dependencies = [self.tasks[name] for name in task.depends_on]
+                    failed = [dependency.name for dependency in dependencies
+                              if dependency.state in ('failed', 'skipped')]
+                    if failed:
+                        task.state = 'skipped'
+                        task.error = f"Skipped because {', '.join(failed)} failed"
+                        pending.remove(task)
+                        continue
+                    if any(dependency.state != 'succeeded' for dependency in dependencies):
+                        continue
+
+                    if task.ready_at is None:
+                        task.ready_at = max((dependency.finished_at for dependency in dependencies),
+                                            default=self.started_at)
+                    if in_use[task.resource] < self.resource_limits[task.resource]:
+                        in_use[task.resource] += 1
+                        task.state = 'running'
+                        pending.remove(task)
+                        running[executor.submit(self._execute, task)] = task
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    in_use[task.resource] -= 1
+                    if task.state == 'failed':
+                        print(f"❌ Task {task.name} failed: {task.error}")
+
+        self.finished_at = time.perf_counter()
+        return all(task.state == 'succeeded' for task in self.tasks.values())
+
+    @staticmethod
+    def _execute(task):
+        """ワーカースレッドでタスクを実行し、開始・終了時刻と結果を記録"""
+        task.started_at = time.perf_counter()
+        try:
+            task.result = task.function()
+        except Exception as e:
+            task.error = str(e) or type(e).__name__
+        # 状態はスケジューラのスレッドが参照するため、終了時刻を記録してから最後に更新する
+        task.finished_at = time.perf_counter()
+        task.state = 'failed' if task.error else 'succeeded'
+
+    def critical_path(self):
+        """
+        最後に終了したタスクから、依存先のうち最後に終了したタスクをたどった連鎖（実行順）
+
+        この連鎖のタスクの所要時間と、リソースの空き待ち時間の合計が全体の所要時間になる。
+        """
+        finished = [task for task in self.tasks.values() if task.finished_at is not None]
+        if not finished:
+            return []
+
+        task = max(finished, key=lambda task: task.finished_at)
+        path = [task]
+        while True:
+            dependencies = [self.tasks[name] for name in task.depends_on
+                            if self.tasks[name].finished_at is not None]
+            if not dependencies:
+                break
+            task = max(dependencies, key=lambda dependency: dependency.finished_at)
+            path.append(task)
+        return path[::-1]
+
+    def summary(self):
+        """
+        実行結果をJSONにできるdictで返す
+
+        各タスクの開始・終了は実行開始からの経過秒数、wait_secondsは依存先の完了からリソースの空きを待った時間。
+        """
+        def offset(value):
+            return value - self.started_at if value is not None else None
+
+        tasks = {
+            task.name: {
+                'resource': task.resource,
+                'state': task.state,
+                'start_seconds': offset(task.started_at),
+                'end_seconds': offset(task.finished_at),
+                'seconds': task.seconds,
+                'wait_seconds': task.started_at - task.ready_at if task.started_at is not None else None,
+                'error': task.error
+            }
+            for task in self.tasks.values()
+        }
+        return {
+            'wall_seconds': offset(self.finished_at),
+            'serial_seconds': sum(task.seconds or 0.0 for task in self.tasks.values()),
+            'resource_limits': self.resource_limits,
+            'critical_path': [task.name for task in self.critical_path()],
+            'tasks': tasks
+        }
+
+    def print_summary(self):
+        """クリティカルパスと、タスクを重ねて実行したことによる短縮時間を表示"""
+        summary = self.summary()
+        path = self.critical_path()
+
+        print("🧭 Critical path:")
+        for task in path:
+            task_summary = summary['tasks'][task.name]
+            wait_text = f", waited {task_summary['wait_seconds']:.2f}s for {task.resource}" \
+                if task_summary['wait_seconds'] and task_summary['wait_seconds'] >= 0.01 else ""
+            print(f"  {task.name}: {task_summary['start_seconds']:.2f}s → {task_summary['end_seconds']:.2f}s "
+                  f"({task.seconds:.2f}s{wait_text})")
+
+        path_seconds = sum(task.seconds for task in path)
+        print(f"  Critical path tasks: {path_seconds:.2f}s of {summary['wall_seconds']:.2f}s wall-clock")
+        print(f"  Sum of all tasks: {summary['serial_seconds']:.2f}s "
+              f"(overlap saved {max(summary['serial_seconds'] - summary['wall_seconds'], 0.0):.2f}s)")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+取り込み状況の確認スクリプト
+生成済みファイル・マニフェスト・ウォーターマーク・前回の実行結果をローカルの状態ファイルから表示
+（GCPへのアクセスやpandas等の読み込みを行わないため、すぐに結果が出る）
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from bigquery_schemas import BigQuerySchemas
+from output_writers import find_table_files, OUTPUT_FORMATS, COMPRESSIONS
+from manifest import RunManifest, get_file_name
+from incremental import WatermarkStore
+from config import *
+
+
+def main(output_format=OUTPUT_FORMAT, compression=OUTPUT_COMPRESSION):
+    """
+    テーブルごとの取り込み状況を表示
+
+    Returns:
+        bool: 常にTrue（状態ファイルがない場合もその旨を表示する）
+    """
+    print("=== Import Status ===\n")
+
+    manifest = RunManifest()
+    watermark_store = WatermarkStore()
+
+    print(f"{'table':<12} {'files':>5} {'MiB':>9}  {'generated':<19}  {'state':<13} {'watermark':<10}")
+    for table_name in BigQuerySchemas.get_available_tables():
+        paths = _generated_paths(table_name, output_format, compression)
+        size_bytes = sum(os.path.getsize(path) for path in paths)
+        generated = datetime.fromtimestamp(max(os.path.getmtime(path) for path in paths)) \
+            .strftime('%Y-%m-%d %H:%M:%S') if paths else '-'
+        state = _table_state(manifest, table_name, paths)
+        watermark = watermark_store.get(table_name) or '-'
+        print(f"{table_name:<12} {len(paths):>5} {size_bytes / 1024 / 1024:>9.1f}  {generated:<19}  "
+              f"{state:<13} {watermark:<10}")
+
+    metrics_path = f'{METRICS_DIR}/pipeline_metrics.json'
+    if os.path.exists(metrics_path):
+        with open(metrics_path, encoding='utf-8') as f:
+            metrics = json.load(f)
+        result = '✅ succeeded' if metrics.get('success') else '❌ failed'
+        print(f"\nLast run: {metrics.get('run_id')} {result} in {metrics.get('duration_seconds', 0):.1f}s")
+    else:
+        print(f"\nNo pipeline metrics found in {METRICS_DIR}")
+
+    return True
+
+
+def _generated_paths(table_name, output_format, compression):
+    """テーブルの生成済みファイル（シャード形式では全シャード）"""
+    return [f'{RAW_DATA_DIR}/{file_name}' for file_name in find_table_files(table_name, output_format, compression)]
+
+
+def _table_state(manifest, table_name, paths):
+    """
+    マニフェストの記録から、生成済みファイルの取り込み状況を判定
+
+    内容のハッシュは計算せず、サイズと更新時刻が記録と異なるファイルを変更ありとみなす。
+    """
+    if not paths:
+        return 'not generated'
+
+    states = []
+    for path in paths:
+        file_name = get_file_name(path)
+        entry = manifest.entries.get(file_name)
+        stat = os.stat(path)
+        if entry is None:
+            states.append('generated')
+        elif entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            states.append('changed')
+        elif manifest.is_loaded(file_name, table_name):
+            states.append('loaded')
+        else:
+            states.append('uploaded')
+
+    # ファイルごとの状態のうち、最も取り込みが進んでいないものをテーブルの状態とする
+    for state in ('generated', 'changed', 'uploaded', 'loaded'):
+        if state in states:
+            return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import Status")
+    parser.add_argument(
+        '--format', dest='output_format', choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+        help="確認するファイルの形式（デフォルト: config.OUTPUT_FORMAT）")
+    parser.add_argument(
+        '--compression', choices=COMPRESSIONS, default=OUTPUT_COMPRESSION,
+        help="確認するファイルの圧縮形式（デフォルト: config.OUTPUT_COMPRESSION）")
+    args = parser.parse_args()
+    success = main(output_format=args.output_format, compression=args.compression)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+GCS・BigQueryのローカルスタブサーバー（障害注入付き）
+パイプラインが使うGCSのJSON API（アップロード・compose・一覧・削除）とBigQueryのロードジョブAPIを
+メモリ上で再現し、指定した割合で429/5xxの応答・応答なしの切断・処理後の応答の消失を起こす
+
+使い方:
+    python stub_server.py --port 9023 --fault-rate 0.1 &
+    STORAGE_EMULATOR_HOST=http://localhost:9023 BIGQUERY_API_ENDPOINT=http://localhost:9023 \\
+        GCP_PROJECT_ID=stub-project python main.py
+"""
+
+import argparse
+import base64
+import fnmatch
+import gzip
+import hashlib
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# 障害注入で返すHTTPステータスと、BigQueryのクライアントが判定に使うエラー理由
+FAULT_REASONS = {
+    429: 'rateLimitExceeded',
+    500: 'internalError',
+    502: 'badGateway',
+    503: 'backendError',
+    504: 'backendError',
+}
+
+DATASET_LOCATION = 'asia-northeast1'
+
+
+class StubState:
+    """スタブサーバーのメモリ上の状態（バケット・オブジェクト・アップロード中のセッション・ジョブ・カウンタ）"""
+
+    def __init__(self, fault_rate=0.0, fault_statuses=(429, 503), drop_rate=0.0, lost_response_rate=0.0,
+                 job_latency=0.5, upload_latency=0.0, seed=None):
+        self.fault_rate = fault_rate
+        self.fault_statuses = tuple(fault_statuses)
+        self.drop_rate = drop_rate
+        self.lost_response_rate = lost_response_rate
+        self.job_latency = job_latency
+        self.upload_latency = upload_latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.buckets = set()
+        self.objects = {}  # (バケット名, オブジェクト名) → オブジェクトのリソースとデータ
+        self.uploads = {}  # upload_id → アップロード中の再開可能アップロード
+        self.jobs = {}  # ジョブID → ジョブのリソースと完了時刻
+        self.next_generation = int(time.time() * 1e6)
+        self.stats = {'requests': 0, 'connections': 0, 'faults': {}}
+
+    def choose_fault(self):
+        """リクエスト1件に注入する障害（'drop' / 'lost' / HTTPステータス / None）を決める"""
+        with self.lock:
+            value = self.random.random()
+            if value < self.drop_rate:
+                fault = 'drop'
+            elif value < self.drop_rate + self.fault_rate:
+                fault = self.random.choice(self.fault_statuses)
+            elif value < self.drop_rate + self.fault_rate + self.lost_response_rate:
+                fault = 'lost'
+            else:
+                fault = None
+            if fault is not None:
+                self.stats['faults'][str(fault)] = self.stats['faults'].get(str(fault), 0) + 1
+            return fault
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def store_object(self, bucket_name, object_name, data, content_type):
+        """
+        オブジェクトを保存（上書き時は世代番号を更新）し、オブジェクトのリソースを返す
+
+        upload_latencyを指定すると、書き込み（アップロード・compose）1件ごとにその秒数だけ待機する（ネットワーク往復の模擬）。
+        """
+        import google_crc32c
+
+        if self.upload_latency:
+            time.sleep(self.upload_latency)
+        with self.lock:
+            self.next_generation += 1
+            updated = datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+            resource = {
+                'kind': 'storage#object',
+                'id': f'{bucket_name}/{object_name}/{self.next_generation}',
+                'bucket': bucket_name,
+                'name': object_name,
+                'generation': str(self.next_generation),
+                'metageneration': '1',
+                'contentType': content_type or 'application/octet-stream',
+                'size': str(len(data)),
+                'crc32c': base64.b64encode(google_crc32c.value(data).to_bytes(4, 'big')).decode('ascii'),
+                'md5Hash': base64.b64encode(hashlib.md5(data).digest()).decode('ascii'),
+                'timeCreated': updated,
+                'updated': updated,
+            }
+            self.objects[(bucket_name, object_name)] = {'resource': resource, 'data': bytes(data)}
+            return resource
+
+    def read_source_rows(self, source_uris, load_config):
+        """ロード元のオブジェクト（ワイルドカード可）の行数を数える。見つからない場合はエラーメッセージを返す"""
+        rows = 0
+        for source_uri in source_uris:
+            bucket_name, _, pattern = source_uri[len('gs://'):].partition('/')
+            with self.lock:
+                matched = [entry['data'] for (bucket, name), entry in sorted(self.objects.items())
+                           if bucket == bucket_name and fnmatch.fnmatchcase(name, pattern)]
+            if not matched:
+                return None, f"Not found: URI {source_uri}"
+            for data in matched:
+                if load_config.get('sourceFormat') == 'PARQUET':
+                    import pyarrow.parquet as pq
+                    rows += pq.ParquetFile(io.BytesIO(data)).metadata.num_rows
+                else:
+                    if data[:2] == b'\x1f\x8b':
+                        data = gzip.decompress(data)
+                    rows += data.count(b'\n') - int(load_config.get('skipLeadingRows') or 0)
+        return rows, None
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """GCS・BigQueryのAPIを処理するハンドラ（HTTP/1.1のキープアライブで接続を使い回せる）"""
+
+    protocol_version = 'HTTP/1.1'
+    state = None  # StubState（サーバーの作成時に設定）
+
+    def setup(self):
+        super().setup()
+        self.state.count('connections')
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        segments = [unquote(segment) for segment in url.path.split('/')[1:]]
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        if segments[:1] == ['stub']:
+            with self.state.lock:
+                self._send_json(200, {**self.state.stats, 'objects': len(self.state.objects),
+                                      'jobs': len(self.state.jobs)})
+            return
+
+        self.state.count('requests')
+        fault = self.state.choose_fault()
+        if fault == 'drop':
+            # 応答を返さずに接続を切る（クライアントからは接続エラーに見える）
+            self.close_connection = True
+            return
+        if isinstance(fault, int):
+            self._send_error(fault, 'Injected fault')
+            return
+
+        status, payload, headers = self._route(method, segments, query, body)
+        if fault == 'lost':
+            # 処理（オブジェクトの保存・ジョブの作成）は行ったうえで、応答だけを失う
+            self._send_error(503, 'Injected fault after the request was applied')
+        elif isinstance(payload, bytes):
+            self._send(status, payload, headers)
+        else:
+            self._send_json(status, payload, headers)
+
+    def _route(self, method, segments, query, body):
+        """リクエストを処理し、(ステータス, 応答（dictまたはbytes）, 追加のヘッダー) を返す"""
+        if segments[:3] == ['upload', 'storage', 'v1'] and segments[3:4] == ['b'] and segments[5:6] == ['o']:
+            return self._upload(method, segments[4], query, body)
+        if segments[:3] == ['storage', 'v1', 'b']:
+            return self._storage(method, segments[3:], query, body)
+        if segments[:3] == ['bigquery', 'v2', 'projects'] and len(segments) >= 5:
+            return self._bigquery(method, segments[3], segments[4:], query, body)
+        return self._error_payload(404, f"Not implemented by the stub: {method} {self.path}")
+
+    def _storage(self, method, segments, query, body):
+        """GCSのバケット・オブジェクトのAPI"""
+        if not segments:
+            if method == 'POST':
+                bucket_name = json.loads(body)['name']
+                with self.state.lock:
+                    self.state.buckets.add(bucket_name)
+                return 200, {'kind': 'storage#bucket', 'name': bucket_name, 'id': bucket_name}, {}
+            return self._error_payload(404, 'Not found')
+
+        bucket_name = segments[0]
+        with self.state.lock:
+            bucket_exists = bucket_name in self.state.buckets
+        if not bucket_exists:
+            return self._error_payload(404, f"The specified bucket does not exist: {bucket_name}")
+        if len(segments) == 1:
+            return 200, {'kind': 'storage#bucket', 'name': bucket_name, 'id': bucket_name,
+                         'location': DATASET_LOCATION.upper()}, {}
+
+        if len(segments) == 2 and method == 'GET':
+            prefix = query.get('prefix', '')
+            with self.state.lock:
+                items = [entry['resource'] for (bucket, name), entry in sorted(self.state.objects.items())
+                         if bucket == bucket_name and name.startswith(prefix)]
+            return 200, {'kind': 'storage#objects', 'items': items}, {}
+
+        object_name = segments[2]
+        if len(segments) == 4 and segments[3] == 'compose' and method == 'POST':
+            request = json.loads(body)
+            with self.state.lock:
+                sources = [self.state.objects.get((bucket_name, source['name']))
+                           for source in request['sourceObjects']]
+            if any(source is None for source in sources):
+                return self._error_payload(404, 'Compose source object not found')
+            content_type = (request.get('destination') or {}).get('contentType')
+            data = b''.join(source['data'] for source in sources)
+            return 200, self.state.store_object(bucket_name, object_name, data, content_type), {}
+
+        with self.state.lock:
+            entry = self.state.objects.get((bucket_name, object_name))
+            if entry and method == 'DELETE':
+                del self.state.objects[(bucket_name, object_name)]
+        if entry is None:
+            return self._error_payload(404, f"No such object: {bucket_name}/{object_name}")
+        if method == 'DELETE':
+            return 204, b'', {}
+        if query.get('alt') == 'media':
+            return 200, entry['data'], {'Content-Type': entry['resource']['contentType']}
+        return 200, entry['resource'], {}
+
+    def _upload(self, method, bucket_name, query, body):
+        """GCSのmultipart・再開可能アップロード"""
+        if method == 'POST' and query.get('uploadType') == 'multipart':
+            boundary = re.search(r'boundary="?([^";]+)"?', self.headers['Content-Type']).group(1).encode()
+            parts = body.split(b'--' + boundary)
+            metadata = json.loads(parts[1].split(b'\r\n\r\n', 1)[1])
+            data = parts[2].split(b'\r\n\r\n', 1)[1][:-len(b'\r\n')]
+            name = metadata.get('name') or query['name']
+            return 200, self.state.store_object(bucket_name, name, data, metadata.get('contentType')), {}
+
+        if method == 'POST' and query.get('uploadType') == 'resumable':
+            metadata = json.loads(body) if body else {}
+            upload_id = uuid.uuid4().hex
+            with self.state.lock:
+                self.state.uploads[upload_id] = {
+                    'name': metadata.get('name') or query['name'],
+                    'content_type': metadata.get('contentType') or self.headers.get('X-Upload-Content-Type'),
+                    'data': b''
+                }
+            host = self.headers.get('Host')
+            location = f"http://{host}/upload/storage/v1/b/{bucket_name}/o?uploadType=resumable&upload_id={upload_id}"
+            return 200, b'', {'Location': location}
+
+        if method == 'PUT' and query.get('upload_id'):
+            with self.state.lock:
+                upload = self.state.uploads.get(query['upload_id'])
+            if upload is None:
+                return self._error_payload(404, 'Upload session not found')
+            match = re.match(r'bytes (?:(\d+)-\d+|\*)/(\d+|\*)', self.headers.get('Content-Range', ''))
+            if match and match.group(1) is not None:
+                upload['data'] = upload['data'][:int(match.group(1))] + body
+            total = match.group(2) if match else str(len(upload['data']))
+            if total != '*' and len(upload['data']) >= int(total):
+                with self.state.lock:
+                    self.state.uploads.pop(query['upload_id'], None)
+                return 200, self.state.store_object(
+                    bucket_name, upload['name'], upload['data'], upload['content_type']), {}
+            headers = {'Range': f"bytes=0-{len(upload['data']) - 1}"} if upload['data'] else {}
+            return 308, b'', headers
+
+        return self._error_payload(400, f"Unsupported upload request: {method} {self.path}")
+
+    def _bigquery(self, method, project_id, segments, query, body):
+        """BigQueryのデータセット確認とロードジョブのAPI"""
+        if segments[0] == 'datasets' and len(segments) == 2 and method == 'GET':
+            return 200, {
+                'kind': 'bigquery#dataset',
+                'id': f'{project_id}:{segments[1]}',
+                'datasetReference': {'projectId': project_id, 'datasetId': segments[1]},
+                'location': DATASET_LOCATION
+            }, {}
+
+        if segments[0] != 'jobs':
+            return self._error_payload(404, f"Not implemented by the stub: {method} {self.path}")
+
+        if method == 'POST' and len(segments) == 1:
+            request = json.loads(body)
+            job_reference = {'projectId': project_id, 'location': DATASET_LOCATION,
+                             **request.get('jobReference', {})}
+            job_id = job_reference.setdefault('jobId', uuid.uuid4().hex)
+            load_config = request.get('configuration', {}).get('load')
+            if load_config is None:
+                return self._error_payload(400, 'Only load jobs are supported by the stub')
+
+            rows, error = self.state.read_source_rows(load_config.get('sourceUris', []), load_config)
+            with self.state.lock:
+                if job_id in self.state.jobs:
+                    return self._error_payload(409, f"Already Exists: Job {project_id}:{job_id}")
+                self.state.jobs[job_id] = {
+                    'resource': {
+                        'kind': 'bigquery#job',
+                        'id': f'{project_id}:{job_reference["location"]}.{job_id}',
+                        'jobReference': job_reference,
+                        'configuration': request['configuration'],
+                        'statistics': {'creationTime': str(int(time.time() * 1000))}
+                    },
+                    'rows': rows,
+                    'error': error,
+                    'done_at': time.monotonic() + self.state.job_latency
+                }
+            return 200, self._job_resource(job_id), {}
+
+        if method == 'GET' and len(segments) == 2:
+            with self.state.lock:
+                exists = segments[1] in self.state.jobs
+            if not exists:
+                return self._error_payload(404, f"Not found: Job {project_id}:{segments[1]}")
+            return 200, self._job_resource(segments[1]), {}
+
+        return self._error_payload(404, f"Not implemented by the stub: {method} {self.path}")
+
+    def _job_resource(self, job_id):
+        """ジョブのリソース（作成から job_latency 秒後に完了）"""
+        with self.state.lock:
+            job = self.state.jobs[job_id]
+            resource = json.loads(json.dumps(job['resource']))
+        if time.monotonic() < job['done_at']:
+            resource['status'] = {'state': 'RUNNING'}
+            return resource
+
+        resource['status'] = {'state': 'DONE'}
+        if job['error']:
+            resource['status']['errorResult'] = {'reason': 'notFound', 'message': job['error']}
+            resource['status']['errors'] = [resource['status']['errorResult']]
+        else:
+            resource['statistics']['load'] = {'outputRows': str(job['rows'])}
+        return resource
+
+    @staticmethod
+    def _error_payload(status, message):
+        reason = FAULT_REASONS.get(status, {400: 'invalid', 404: 'notFound', 409: 'duplicate'}.get(status, 'error'))
+        return status, {'error': {'code': status, 'message': message,
+                                  'errors': [{'reason': reason, 'message': message}]}}, {}
+
+    def _send_error(self, status, message):
+        _, payload, headers = self._error_payload(status, message)
+        self._send_json(status, payload, headers)
+
+    def _send_json(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload).encode('utf-8'), {'Content-Type': 'application/json', **(headers or {})})
+
+    def _send(self, status, data, headers):
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def create_server(host='127.0.0.1', port=9023, **options):
+    """スタブサーバーを作成（port=0の場合は空いているポートを使う。serve_forever()で起動する）"""
+    handler = type('BoundStubRequestHandler', (StubRequestHandler,), {'state': StubState(**options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(host='127.0.0.1', port=9023, **options):
+    """
+    スタブサーバーを起動（Ctrl+Cで停止し、注入した障害の件数を表示）
+
+    Returns:
+        bool: 常にTrue
+    """
+    server = create_server(host, port, **options)
+    state = server.RequestHandlerClass.state
+    address = f"http://{host}:{server.server_address[1]}"
+    print(f"🧪 Stub server listening on {address} "
+          f"(faults {state.fault_rate:.0%} {list(state.fault_statuses)}, drops {state.drop_rate:.0%}, "
+          f"lost responses {state.lost_response_rate:.0%})")
+    print(f"   STORAGE_EMULATOR_HOST={address} BIGQUERY_API_ENDPOINT={address}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    print(f"\nServed {state.stats['requests']} requests over {state.stats['connections']} connections, "
+          f"injected faults: {state.stats['faults'] or 'none'}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GCS / BigQuery Stub Server")
+    parser.add_argument('--host', default='127.0.0.1', help="待ち受けるアドレス（デフォルト: 127.0.0.1）")
+    parser.add_argument('--port', type=int, default=9023, help="待ち受けるポート（デフォルト: 9023）")
+    parser.add_argument(
+        '--fault-rate', type=float, default=0.0,
+        help="--fault-statuses のいずれかのエラーを返すリクエストの割合（デフォルト: 0）")
+    parser.add_argument(
+        '--fault-statuses', default='429,503',
+        help="注入するHTTPステータス（カンマ区切り。デフォルト: 429,503）")
+    parser.add_argument(
+        '--drop-rate', type=float, default=0.0,
+        help="応答を返さずに接続を切るリクエストの割合（デフォルト: 0）")
+    parser.add_argument(
+        '--lost-response-rate', type=float, default=0.0,
+        help="処理を行ったうえで応答の代わりに503を返すリクエストの割合（デフォルト: 0）")
+    parser.add_argument(
+        '--job-latency', type=float, default=0.5,
+        help="ロードジョブの投入から完了までの秒数（デフォルト: 0.5）")
+    parser.add_argument(
+        '--upload-latency', type=float, default=0.0,
+        help="オブジェクトの書き込み1件ごとに加える待ち時間（秒。デフォルト: 0）")
+    parser.add_argument('--seed', type=int, help="障害注入の乱数シード")
+    args = parser.parse_args()
+    success = main(host=args.host, port=args.port, fault_rate=args.fault_rate,
+                   fault_statuses=[int(status) for status in args.fault_statuses.split(',')],
+                   drop_rate=args.drop_rate, lost_response_rate=args.lost_response_rate,
+                   job_latency=args.job_latency, upload_latency=args.upload_latency, seed=args.seed)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,201 @@
+import os
+import random
+import threading
+import time
+from config import *
+
+# 再試行するHTTPステータス（タイムアウト・レート制限・サーバー側の一時的なエラー）
+TRANSIENT_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+# GCSとBigQueryの両方に使えるスコープ
+CLOUD_PLATFORM_SCOPE = 'https://www.googleapis.com/auth/cloud-platform'
+
+
+def is_transient_error(error):
+    """再試行で回復する見込みのあるエラーか（429・5xxのAPIエラーと接続・タイムアウトのエラー）"""
+    from google.api_core import exceptions as api_exceptions
+    from google.auth import exceptions as auth_exceptions
+    import requests
+
+    if isinstance(error, api_exceptions.GoogleAPICallError):
+        return error.code in TRANSIENT_STATUS_CODES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, auth_exceptions.TransportError,
+                              ConnectionError, TimeoutError))
+
+
+class TransportStats:
+    """HTTPリクエスト・新規接続・再試行の回数を数えるカウンタ（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.retries = {}  # 操作名 → 再試行回数
+        self.errors = {}  # エラーの種類（HTTPステータスまたは例外名） → 再試行した回数
+        self.exhausted = {}  # 操作名 → 期限内に成功しなかった回数
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def record_retry(self, operation, error):
+        kind = str(getattr(error, 'code', None) or type(error).__name__)
+        with self._lock:
+            self.retries[operation] = self.retries.get(operation, 0) + 1
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def record_exhausted(self, operation):
+        with self._lock:
+            self.exhausted[operation] = self.exhausted.get(operation, 0) + 1
+
+    def snapshot(self):
+        """現在の値をJSONにできるdictで返す（reused_connectionsは既存の接続を使い回したリクエスト数）"""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': max(self.requests - self.new_connections, 0),
+                'retries': dict(self.retries),
+                'retry_errors': dict(self.errors),
+                'retries_exhausted': dict(self.exhausted)
+            }
+
+
+class RetryPolicy:
+    """
+    一時的なエラーをジッター付きの指数バックオフで再試行する方針
+
+    n回目の再試行の前に 0〜min(max_delay, initial_delay * multiplier ** n) 秒のランダムな時間だけ待つ
+    （full jitter。多数のスレッドが同時に失敗しても再試行のタイミングが分散する）。
+    最初の試行からdeadline秒を超える場合は再試行せずに最後のエラーを送出する。
+    """
+
+    def __init__(self, initial_delay=RETRY_INITIAL_DELAY, max_delay=RETRY_MAX_DELAY, multiplier=RETRY_MULTIPLIER,
+                 deadline=RETRY_DEADLINE, stats=None, sleep=time.sleep):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.deadline = deadline
+        self.stats = stats or TransportStats()
+        self.sleep = sleep
+        # ジッターはモジュールの乱数状態を使わない（pythonエンジンのデータ生成がシードして消費しており、
+        # 別スレッドの再試行で生成されるデータが変わってしまうため）
+        self.random = random.Random()
+
+    def call(self, operation, function, *args, **kwargs):
+        """
+        functionを呼び出し、一時的なエラーの場合は期限まで再試行
+
+        Args:
+            operation: カウンタとログに使う操作名（'upload'、'job_insert'、'job_poll' など）
+        """
+        start_time = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                if not is_transient_error(e):
+                    raise
+                delay = self.random.uniform(0, min(self.max_delay, self.initial_delay * self.multiplier ** attempt))
+                if time.monotonic() - start_time + delay > self.deadline:
+                    self.stats.record_exhausted(operation)
+                    raise
+                self.stats.record_retry(operation, e)
+                print(f"⚠️  {operation} failed ({type(e).__name__}: {e}); "
+                      f"retrying in {delay:.2f}s (attempt {attempt + 2})")
+                self.sleep(delay)
+                attempt += 1
+
+
+class Transport:
+    """
+    GCSClientとBigQueryClientで共有するHTTPセッション・認証情報・再試行方針・カウンタ
+
+    セッションは接続プール（pool_size）を持つAuthorizedSessionで、初回の利用時に作成する。
+    アダプタで全リクエストと新規接続の数を数えるため、接続の使い回しの状況がわかる。
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, retry_policy=None, credentials=None):
+        self.pool_size = pool_size
+        self.stats = retry_policy.stats if retry_policy else TransportStats()
+        self.retry_policy = retry_policy or RetryPolicy(stats=self.stats)
+        self._credentials = credentials
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def credentials(self):
+        """認証情報（エミュレータ・スタブサーバーに接続する場合は認証なし）"""
+        with self._lock:
+            if self._credentials is None:
+                if os.getenv('STORAGE_EMULATOR_HOST') or BIGQUERY_API_ENDPOINT:
+                    from google.auth.credentials import AnonymousCredentials
+                    self._credentials = AnonymousCredentials()
+                else:
+                    import google.auth
+                    self._credentials, _ = google.auth.default(scopes=[CLOUD_PLATFORM_SCOPE])
+            return self._credentials
+
+    @property
+    def session(self):
+        """スレッド間で共有する接続プール付きのHTTPセッション"""
+        credentials = self.credentials
+        with self._lock:
+            if self._session is None:
+                from google.auth.transport.requests import AuthorizedSession
+
+                session = AuthorizedSession(credentials)
+                adapter = _create_counting_adapter(self.pool_size, self.stats)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+            return self._session
+
+    def call(self, operation, function, *args, **kwargs):
+        """再試行方針に従ってfunctionを呼び出す"""
+        return self.retry_policy.call(operation, function, *args, **kwargs)
+
+
+def _create_counting_adapter(pool_size, stats):
+    """リクエスト数と新規接続数をstatsに記録する、接続プール付きのHTTPアダプタを作成"""
+    import requests
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    def counting(pool_class):
+        class CountingConnectionPool(pool_class):
+            def _new_conn(self):
+                stats.record_new_connection()
+                return super()._new_conn()
+        return CountingConnectionPool
+
+    class CountingAdapter(requests.adapters.HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': counting(HTTPConnectionPool),
+                'https': counting(HTTPSConnectionPool)
+            }
+
+        def send(self, request, **kwargs):
+            stats.record_request()
+            return super().send(request, **kwargs)
+
+    return CountingAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+
+
+_shared_transport = None
+_shared_transport_lock = threading.Lock()
+
+
+def get_shared_transport():
+    """プロセスで共有するTransport（初回の呼び出し時に作成）"""
+    global _shared_transport
+    with _shared_transport_lock:
+        if _shared_transport is None:
+            _shared_transport = Transport()
+        return _shared_transport
@@ -4,13 +4,17 @@ GCSアップロード専用スクリプト
 ローカルファイルをGCSにアップロードするだけの処理
 """
 
+import argparse
 import os
 import sys
 from gcs_client import GCSClient
+from bigquery_schemas import BigQuerySchemas
+from output_writers import find_table_files, OUTPUT_FORMATS, COMPRESSIONS
+from manifest import RunManifest
 from config import *
 
 
-def main():
+def main(output_format=OUTPUT_FORMAT, force=False, compression=OUTPUT_COMPRESSION):
     print("=== GCS Upload Only ===\n")
 
     # GCP環境のセットアップ
@@ -27,30 +31,24 @@ def main():
     # データファイルのGCSアップロード
     print("Uploading files to Google Cloud Storage...")
     try:
-        files_to_upload = [
-            ('users.csv', 'raw/users.csv'),
-            ('products.csv', 'raw/products.csv'),
-            ('orders.csv', 'raw/orders.csv'),
-            ('order_items.csv', 'raw/order_items.csv'),
-            ('access_logs.json', 'raw/access_logs.json')
-        ]
+        # シャード形式（SHARDED_OUTPUT）では raw/<table>/part-* の全シャードをアップロード
+        existing_files = []
+        for table_name in BigQuerySchemas.get_available_tables():
+            file_names = find_table_files(table_name, output_format, compression)
+            if not file_names:
+                print(f"⚠️  File not found for: {table_name}")
+            for file_name in file_names:
+                existing_files.append((f"{RAW_DATA_DIR}/{file_name}", f'raw/{file_name}'))
 
-        uploaded_files = []
-
-        for local_file, gcs_path in files_to_upload:
-            local_path = f"{RAW_DATA_DIR}/{local_file}"
-            if os.path.exists(local_path):
-                gcs_uri = gcs_client.upload_to_gcs(local_path, gcs_path)
-                uploaded_files.append((local_file, gcs_uri))
-            else:
-                print(f"⚠️  File not found: {local_path}")
+        gcs_uris = gcs_client.upload_files_to_gcs(existing_files, manifest=RunManifest(), force=force)
+        uploaded_files = list(gcs_uris.items())
 
         print("✅ Files uploaded to GCS\n")
 
         # アップロード結果の表示
         print("Uploaded files:")
-        for filename, uri in uploaded_files:
-            print(f"  {filename} → {uri}")
+        for local_path, uri in uploaded_files:
+            print(f"  {os.path.relpath(local_path, RAW_DATA_DIR)} → {uri}")
 
         print(f"\n🎉 Upload completed successfully!")
         print(f"Files are now available in GCS bucket: {GCS_BUCKET_NAME}")
@@ -63,5 +61,16 @@ def main():
 
 
 if __name__ == "__main__":
-    success = main()
+    parser = argparse.ArgumentParser(description="GCS Upload Only")
+    parser.add_argument(
+        '--format', dest='output_format', choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+        help="アップロードするファイルの形式（デフォルト: config.OUTPUT_FORMAT）")
+    parser.add_argument(
+        '--compression', choices=COMPRESSIONS, default=OUTPUT_COMPRESSION,
+        help="アップロードするファイルの圧縮形式（デフォルト: config.OUTPUT_COMPRESSION）")
+    parser.add_argument(
+        '--force', action='store_true',
+        help="変更のないファイルも再アップロードする")
+    args = parser.parse_args()
+    success = main(output_format=args.output_format, force=args.force, compression=args.compression)
     sys.exit(0 if success else 1)
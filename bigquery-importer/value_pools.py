@@ -0,0 +1,91 @@
+import numpy as np
+from config import *
+
+
+class FakerValuePool:
+    """Fakerの語彙を一度だけ生成し、インデックス配列でサンプリングするプール"""
+
+    def __init__(self, faker, rng, pool_size=VALUE_POOL_SIZE):
+        self.faker = faker
+        self.rng = rng
+        self.pool_size = pool_size
+        self._pools = {}
+
+    def pool(self, provider):
+        """Fakerのプロバイダ名（'name', 'city' など）に対応する値の配列を返す（初回のみ生成）"""
+        if provider not in self._pools:
+            generate = getattr(self.faker, provider)
+            self._pools[provider] = np.array(
+                [generate() for _ in range(self.pool_size)], dtype=object)
+        return self._pools[provider]
+
+    def sample(self, provider, size):
+        """プールからsize件をランダムに抽出"""
+        values = self.pool(provider)
+        return values[self.rng.integers(0, len(values), size=size)]
+
+
+def choice(rng, values, size):
+    """候補リストからsize件をランダムに抽出（object配列で返す）"""
+    values = np.array(values, dtype=object)
+    return values[rng.integers(0, len(values), size=size)]
+
+
+def choice_categorical(rng, values, size):
+    """
+    候補リストからsize件をランダムに抽出し、候補をカテゴリとするCategoricalで返す
+
+    choiceと同じ乱数の使い方のため、同じシードならchoiceと同じ値になる。候補のNoneは欠損値になる。
+    """
+    import pandas as pd
+
+    categories = [value for value in values if value is not None]
+    codes = np.array([categories.index(value) if value is not None else -1 for value in values], dtype=np.int8)
+    return pd.Categorical.from_codes(codes[rng.integers(0, len(values), size=size)], categories=categories)
+
+
+def concat(*parts):
+    """文字列配列・文字列を要素ごとに連結（object配列で返す）"""
+    result = np.asarray(parts[0], dtype=str)
+    for part in parts[1:]:
+        result = np.char.add(result, np.asarray(part, dtype=str))
+    return result.astype(object)
+
+
+def random_dates(rng, start_date, end_date, size):
+    """期間内のランダムな日付を 'YYYY-MM-DD' 形式で生成"""
+    start = np.datetime64(start_date, 'D').astype(np.int64)
+    end = np.datetime64(end_date, 'D').astype(np.int64)
+    days = rng.integers(start, end, size=size, endpoint=True)
+    return np.datetime_as_string(days.astype('datetime64[D]'), unit='D').astype(object)
+
+
+def random_datetimes(rng, start_date, end_date, size, unit='s'):
+    """期間内のランダムな日時をdatetime64配列で生成（整数のエポック値から変換）"""
+    start = np.datetime64(start_date, unit).astype(np.int64)
+    end = np.datetime64(end_date, unit).astype(np.int64)
+    values = rng.integers(start, end, size=size, endpoint=True)
+    return values.astype(f'datetime64[{unit}]')
+
+
+def random_uuid4(rng, size):
+    """UUID version 4 の文字列をまとめて生成"""
+    raw = np.frombuffer(rng.bytes(16 * size), dtype=np.uint8).reshape(size, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # variant RFC 4122
+
+    hex_chars = np.frombuffer(raw.tobytes().hex().encode('ascii'), dtype=np.uint8).reshape(size, 32)
+    dash_positions = [8, 13, 18, 23]
+    hex_positions = [i for i in range(36) if i not in dash_positions]
+
+    uuid_chars = np.empty((size, 36), dtype=np.uint8)
+    uuid_chars[:, dash_positions] = ord('-')
+    uuid_chars[:, hex_positions] = hex_chars
+    return uuid_chars.view('S36').ravel().astype(str).astype(object)
+
+
+def random_ipv4(rng, size):
+    """IPv4アドレス文字列をまとめて生成（先頭オクテットはクラスA〜Cの範囲）"""
+    octets = rng.integers(0, 256, size=(size, 4))
+    octets[:, 0] = rng.integers(1, 224, size=size)
+    return concat(octets[:, 0], '.', octets[:, 1], '.', octets[:, 2], '.', octets[:, 3])
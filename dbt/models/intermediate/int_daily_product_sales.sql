@@ -0,0 +1,20 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy='insert_overwrite',
+    partition_by={'field': 'order_date', 'data_type': 'date'},
+    cluster_by=['product_id']
+) }}
+
+-- 注文日・商品ごとの販売実績（注文ステータスを問わず、全ての注文明細を集計）
+SELECT
+    DATE(o.order_date) AS order_date,
+    oi.product_id,
+    COUNT(DISTINCT oi.order_id) AS total_orders,
+    SUM(oi.quantity) AS total_quantity_sold,
+    SUM(oi.line_total) AS total_revenue
+FROM {{ ref('stg_order_items') }} oi
+INNER JOIN {{ ref('stg_orders') }} o ON oi.order_id = o.order_id
+{% if is_incremental() %}
+WHERE o.order_date >= TIMESTAMP(DATE_SUB(_dbt_max_partition, INTERVAL {{ var('incremental_lookback_days') }} DAY))
+{% endif %}
+GROUP BY 1, 2
@@ -0,0 +1,23 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy='insert_overwrite',
+    partition_by={'field': 'activity_date', 'data_type': 'date'},
+    cluster_by=['user_id']
+) }}
+
+-- 日・ユーザー・セッションごとのページビュー数
+-- 増分実行では、既存の最新パーティションから incremental_lookback_days 日前以降のアクセスログだけを集計し直す
+SELECT
+    DATE(access_timestamp) AS activity_date,
+    user_id,
+    session_id,
+    COUNT(*) AS page_views,
+    COUNT(CASE WHEN page_url LIKE '%/product/%' THEN 1 END) AS product_page_views,
+    COUNT(CASE WHEN page_url = '/cart' THEN 1 END) AS cart_views,
+    COUNT(CASE WHEN page_url = '/checkout' THEN 1 END) AS checkout_views
+FROM {{ ref('stg_access_logs') }}
+WHERE user_id IS NOT NULL
+{% if is_incremental() %}
+    AND access_timestamp >= TIMESTAMP(DATE_SUB(_dbt_max_partition, INTERVAL {{ var('incremental_lookback_days') }} DAY))
+{% endif %}
+GROUP BY 1, 2, 3
@@ -0,0 +1,19 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy='insert_overwrite',
+    partition_by={'field': 'order_date', 'data_type': 'date'},
+    cluster_by=['user_id']
+) }}
+
+-- 日・ユーザーごとの完了済み注文（1注文は1日にだけ属するため、日ごとの件数を合計すれば全期間の件数になる）
+SELECT
+    DATE(order_date) AS order_date,
+    user_id,
+    COUNT(DISTINCT order_id) AS total_orders,
+    SUM(total_amount) AS total_amount
+FROM {{ ref('stg_orders') }}
+WHERE status = '完了'
+{% if is_incremental() %}
+    AND order_date >= TIMESTAMP(DATE_SUB(_dbt_max_partition, INTERVAL {{ var('incremental_lookback_days') }} DAY))
+{% endif %}
+GROUP BY 1, 2
@@ -1,5 +1,10 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    incremental_strategy='insert_overwrite',
+    partition_by={'field': 'order_date', 'data_type': 'date'}
+) }}
 
+-- 増分実行では、既存の最新パーティションから incremental_lookback_days 日前以降の日だけを作り直す
 WITH daily_metrics AS (
     SELECT
         DATE(o.order_date) AS order_date,
@@ -9,18 +14,53 @@ WITH daily_metrics AS (
         COALESCE(AVG(o.total_amount), 0) AS avg_order_value
     FROM {{ ref('stg_orders') }} o
     WHERE o.status = '完了'
+    {% if is_incremental() %}
+        AND o.order_date >= TIMESTAMP(DATE_SUB(_dbt_max_partition, INTERVAL {{ var('incremental_lookback_days') }} DAY))
+    {% endif %}
     GROUP BY 1
+),
+
+{% if is_incremental() %}
+-- 作り直す最初の日の7日間移動平均（6行前まで）と前日比（1行前）に必要な、
+-- それより前の直近6行を既存のテーブルから取る
+previous_metrics AS (
+    SELECT
+        order_date,
+        total_orders,
+        unique_customers,
+        total_revenue,
+        avg_order_value
+    FROM {{ this }}
+    WHERE order_date < DATE_SUB(_dbt_max_partition, INTERVAL {{ var('incremental_lookback_days') }} DAY)
+    QUALIFY ROW_NUMBER() OVER (ORDER BY order_date DESC) <= 6
+),
+{% endif %}
+
+windowed_metrics AS (
+    SELECT
+        *,
+        -- 7日間移動平均
+        AVG(total_revenue) OVER (
+            ORDER BY order_date 
+            ROWS BETWEEN 6 PRECEDING AND CURRENT ROW
+        ) AS revenue_7day_avg,
+        -- 前日比
+        LAG(total_revenue) OVER (ORDER BY order_date) AS prev_day_revenue
+    FROM (
+        SELECT * FROM daily_metrics
+        {% if is_incremental() %}
+        UNION ALL
+        SELECT * FROM previous_metrics
+        {% endif %}
+    )
 )
 
 SELECT
     *,
-    -- 7日間移動平均
-    AVG(total_revenue) OVER (
-        ORDER BY order_date 
-        ROWS BETWEEN 6 PRECEDING AND CURRENT ROW
-    ) AS revenue_7day_avg,
-    -- 前日比
-    LAG(total_revenue) OVER (ORDER BY order_date) AS prev_day_revenue,
     CURRENT_TIMESTAMP() AS processed_at
-FROM daily_metrics
+FROM windowed_metrics
+{% if is_incremental() %}
+-- 既存のテーブルから取った行は書き戻さない
+WHERE order_date >= DATE_SUB(_dbt_max_partition, INTERVAL {{ var('incremental_lookback_days') }} DAY)
+{% endif %}
 ORDER BY order_date
@@ -1,17 +1,17 @@
 {{ config(materialized='table') }}
 
 WITH product_sales AS (
+    -- 注文明細ではなく、増分更新される日次の集計から全期間の実績を求める
     SELECT
         p.product_id,
         p.name AS product_name,
         p.category,
         p.price,
-        COUNT(DISTINCT oi.order_id) AS total_orders,
-        COALESCE(SUM(oi.quantity), 0) AS total_quantity_sold,
-        COALESCE(SUM(oi.line_total), 0) AS total_revenue
+        COALESCE(SUM(s.total_orders), 0) AS total_orders,
+        COALESCE(SUM(s.total_quantity_sold), 0) AS total_quantity_sold,
+        COALESCE(SUM(s.total_revenue), 0) AS total_revenue
     FROM {{ ref('stg_products') }} p
-    LEFT JOIN {{ ref('stg_order_items') }} oi ON p.product_id = oi.product_id
-    LEFT JOIN {{ ref('stg_orders') }} o ON oi.order_id = o.order_id AND o.status = '完了'
+    LEFT JOIN {{ ref('int_daily_product_sales') }} s ON p.product_id = s.product_id
     GROUP BY 1, 2, 3, 4
 )
 
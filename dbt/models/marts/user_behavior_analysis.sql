@@ -1,26 +1,25 @@
 {{ config(materialized='table') }}
 
+-- アクセスログ・注文ではなく、増分更新される日次の集計から全期間の行動を求める
 WITH user_web_activity AS (
     SELECT
         user_id,
-        COUNT(*) AS total_page_views,
+        SUM(page_views) AS total_page_views,
         COUNT(DISTINCT session_id) AS total_sessions,
-        COUNT(DISTINCT DATE(access_timestamp)) AS active_days,
-        COUNT(CASE WHEN page_url LIKE '%/product/%' THEN 1 END) AS product_page_views,
-        COUNT(CASE WHEN page_url = '/cart' THEN 1 END) AS cart_views,
-        COUNT(CASE WHEN page_url = '/checkout' THEN 1 END) AS checkout_views
-    FROM {{ ref('stg_access_logs') }}
-    WHERE user_id IS NOT NULL
+        COUNT(DISTINCT activity_date) AS active_days,
+        SUM(product_page_views) AS product_page_views,
+        SUM(cart_views) AS cart_views,
+        SUM(checkout_views) AS checkout_views
+    FROM {{ ref('int_daily_user_activity') }}
     GROUP BY 1
 ),
 
 user_purchase_activity AS (
     SELECT
         user_id,
-        COUNT(DISTINCT order_id) AS total_orders,
+        SUM(total_orders) AS total_orders,
         COALESCE(SUM(total_amount), 0) AS total_spent
-    FROM {{ ref('stg_orders') }}
-    WHERE status = '完了'
+    FROM {{ ref('int_daily_user_orders') }}
     GROUP BY 1
 )
 
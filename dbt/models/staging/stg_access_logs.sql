@@ -2,7 +2,7 @@
 
 WITH source_data AS (
     SELECT
-        TIMESTAMP(timestamp) AS access_timestamp,
+        timestamp AS access_timestamp,
         user_id,
         page_url,
         session_id,